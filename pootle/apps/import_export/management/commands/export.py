@@ -10,10 +10,10 @@
 import os
 os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
 from optparse import make_option
-from zipfile import ZipFile
 
 from django.core.management.base import CommandError
 
+from import_export.utils import iterzip_stores
 from pootle_app.management.commands import PootleCommand
 from pootle_language.models import Language
 from pootle_project.models import Project
@@ -30,10 +30,11 @@ class Command(PootleCommand):
 
 
     def _create_zip(self, stores, prefix):
+        stores = stores.select_related("translation_project__language") \
+                       .order_by("pootle_path")
         with open("%s.zip" % (prefix), "wb") as f:
-            with ZipFile(f, "w") as zf:
-                for store in stores:
-                    zf.writestr(prefix + store.pootle_path, store.serialize())
+            for chunk in iterzip_stores(stores.iterator(), prefix):
+                f.write(chunk)
 
         self.stdout.write("Created %s\n" % (f.name))
 
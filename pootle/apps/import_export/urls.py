@@ -10,5 +10,7 @@
 from django.conf.urls import patterns, url
 
 urlpatterns = patterns("import_export.views",
-    url(r"^export/$", "export", name="pootle-export")
+    url(r"^export/$", "export", name="pootle-export"),
+    url(r"^import/(?P<import_id>[0-9a-f]{32})/$", "import_status",
+        name="pootle-import-status"),
 )
@@ -7,13 +7,123 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+import json
+import logging
+from collections import deque
+from multiprocessing.pool import ThreadPool
+from uuid import uuid4
+from zipfile import ZipFile
+
 from translate.storage import po
 
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
 from django.utils.translation import ugettext as _
 
+from django_rq import get_connection, job
+
 from pootle_store.models import Store
 
 
+POOTLE_IMPORT_PREFIX = "pootle:import:"
+
+# Seconds for which the progress of an import is kept around
+IMPORT_STATUS_TIMEOUT = 24 * 60 * 60
+
+
+class ImportStatus(object):
+    QUEUED = "queued"
+    IMPORTING = "importing"
+    DONE = "done"
+    FAILED = "failed"
+
+    FINISHED = (DONE, FAILED)
+
+
+class ZipStream(object):
+    """Write-only file-like object to create ZIP archives on the fly.
+
+    `ZipFile.writestr()` only needs to know the current position of the
+    output, so the data written so far can be handed over to the client
+    and dropped from memory."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(data)
+        self._position += len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        """Return the data written since the last call."""
+        data = "".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _serialize_store(store):
+    try:
+        return store.serialize()
+    finally:
+        # Threads get their own DB connection, don't leave them open
+        connection.close()
+
+
+def iterserialize_stores(stores, workers=None):
+    """Yield `(store, contents)` tuples for `stores`, in order.
+
+    :param workers: number of threads serializing stores ahead of the
+        consumer. Defaults to `settings.POOTLE_EXPORT_WORKERS`; `0`
+        serializes stores in the calling thread.
+    """
+    if workers is None:
+        workers = settings.POOTLE_EXPORT_WORKERS
+
+    if not workers:
+        for store in stores:
+            yield store, store.serialize()
+        return
+
+    pool = ThreadPool(workers)
+    try:
+        # Keep a bounded window of pending results so that memory use
+        # doesn't grow when the consumer is slower than the workers
+        pending = deque()
+        for store in stores:
+            pending.append(
+                (store, pool.apply_async(_serialize_store, (store, )))
+            )
+            if len(pending) > 2 * workers:
+                store, result = pending.popleft()
+                yield store, result.get()
+
+        while pending:
+            store, result = pending.popleft()
+            yield store, result.get()
+    finally:
+        pool.terminate()
+
+
+def iterzip_stores(stores, prefix, workers=None):
+    """Yield the chunks of a ZIP archive containing the serialized
+    `stores`, as each of them gets serialized."""
+    stream = ZipStream()
+    with ZipFile(stream, "w", allowZip64=True) as zf:
+        for store, contents in iterserialize_stores(stores, workers=workers):
+            zf.writestr(prefix + store.pootle_path, contents)
+            yield stream.pop()
+
+    yield stream.pop()
+
+
 def import_file(file):
     pofile = po.pofile(file.read())
     header = pofile.parseheader()
@@ -28,19 +138,101 @@ def import_file(file):
         )
     rev = int(rev)
 
-    try:
-        store, created = Store.objects.get_or_create(pootle_path=pootle_path)
-        if rev < store.get_max_unit_revision():
-            # TODO we could potentially check at the unit level and only reject
-            # units older than most recent. But that's in store.update().
+    # Each store is updated in its own transaction
+    with transaction.atomic():
+        try:
+            store, created = Store.objects.get_or_create(pootle_path=pootle_path)
+            if rev < store.get_max_unit_revision():
+                # TODO we could potentially check at the unit level and only
+                # reject units older than most recent. But that's in
+                # store.update().
+                raise ValueError(
+                    _("File %r was rejected because its X-Pootle-Revision is "
+                      "too old.") % (file.name)
+                )
+        except Exception as e:
             raise ValueError(
-                _("File %r was rejected because its X-Pootle-Revision is too old.")
-                % (file.name)
+                _("Could not create %r. Missing Project/Language? (%s)")
+                % (file.name, e)
             )
-    except Exception as e:
-        raise ValueError(
-            _("Could not create %r. Missing Project/Language? (%s)")
-            % (file.name, e)
-        )
 
-    store.update(overwrite=True, store=pofile)
+        store.update(overwrite=True, store=pofile)
+
+
+def start_import(user, files):
+    """Queue background jobs importing `files` on behalf of `user`.
+
+    :param files: list of `(name, contents)` tuples.
+    :return: the ID to poll the progress of the import with.
+    """
+    import_id = uuid4().hex
+    key = POOTLE_IMPORT_PREFIX + import_id
+
+    r_con = get_connection()
+    pipe = r_con.pipeline()
+    pipe.hset(key, "user", user.id)
+    for name, contents in files:
+        pipe.hset(key, "file:" + name,
+                  json.dumps({"status": ImportStatus.QUEUED}))
+    pipe.expire(key, IMPORT_STATUS_TIMEOUT)
+    pipe.execute()
+
+    # One job per file, so that files get imported in parallel by as many
+    # workers as available
+    for name, contents in files:
+        import_file_job.delay(import_id, name, contents)
+
+    return import_id
+
+
+def set_import_file_status(import_id, name, status, error=None):
+    value = {"status": status}
+    if error is not None:
+        value["error"] = error
+
+    r_con = get_connection()
+    r_con.hset(POOTLE_IMPORT_PREFIX + import_id, "file:" + name,
+               json.dumps(value))
+
+
+def get_import_status(import_id):
+    """Return the progress of the import identified by `import_id`, or
+    `None` if it doesn't exist (anymore)."""
+    r_con = get_connection()
+    values = r_con.hgetall(POOTLE_IMPORT_PREFIX + import_id)
+    if not values:
+        return None
+
+    files = []
+    for field, value in sorted(values.items()):
+        if not field.startswith("file:"):
+            continue
+
+        file_status = json.loads(value)
+        file_status["name"] = field[len("file:"):].decode("utf-8")
+        files.append(file_status)
+
+    statuses = [f["status"] for f in files]
+    return {
+        "user": int(values["user"]),
+        "files": files,
+        "total": len(files),
+        "done": statuses.count(ImportStatus.DONE),
+        "failed": statuses.count(ImportStatus.FAILED),
+        "finished": all(status in ImportStatus.FINISHED
+                        for status in statuses),
+    }
+
+
+@job("default", timeout=3600)
+def import_file_job(import_id, name, contents):
+    """RQ job importing a single uploaded file."""
+    set_import_file_status(import_id, name, ImportStatus.IMPORTING)
+    try:
+        import_file(ContentFile(contents, name=name))
+    except Exception as e:
+        logging.exception(u"Failed to import %s", name)
+        set_import_file_status(import_id, name, ImportStatus.FAILED,
+                               error=unicode(e))
+    else:
+        set_import_file_status(import_id, name, ImportStatus.DONE)
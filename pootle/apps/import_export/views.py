@@ -11,16 +11,20 @@ import os
 from io import BytesIO
 from zipfile import ZipFile, is_zipfile
 
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 
+from pootle_misc.util import ajax_required, jsonify
 from pootle_store.models import Store
 
 from .forms import UploadForm
-from .utils import import_file
+from .utils import get_import_status, iterzip_stores, start_import
 
 
-def download(contents, name, content_type):
-    response = HttpResponse(contents, content_type=content_type)
+def download(contents, name, content_type, streaming=False):
+    if streaming:
+        response = StreamingHttpResponse(contents, content_type=content_type)
+    else:
+        response = HttpResponse(contents, content_type=content_type)
     response["Content-Disposition"] = "attachment; filename=%s" % (name)
     return response
 
@@ -43,21 +47,20 @@ def export(request):
         contents.seek(0)
         return download(contents.read(), name, "application/octet-stream")
 
-    # zip all the stores together
-    f = BytesIO()
+    # zip all the stores together, sending them as they get serialized
     prefix = path.strip("/").replace("/", "-")
     if not prefix:
         prefix = "export"
-    with BytesIO() as f:
-        with ZipFile(f, "w") as zf:
-            for store in stores:
-                zf.writestr(prefix + store.pootle_path, store.serialize())
 
-        return download(f.getvalue(), "%s.zip" % (prefix), "application/zip")
+    stores = stores.select_related("translation_project__language") \
+                   .order_by("pootle_path")
+    contents = iterzip_stores(stores.iterator(), prefix)
+    return download(contents, "%s.zip" % (prefix), "application/zip",
+                    streaming=True)
 
 
 def handle_upload_form(request):
-    """Process the upload form."""
+    """Process the upload form, queueing the import of the uploaded files."""
     if request.method == "POST" and "file" in request.FILES:
         upload_form = UploadForm(request.POST, request.FILES)
 
@@ -65,25 +68,42 @@ def handle_upload_form(request):
             django_file = request.FILES["file"]
             try:
                 if is_zipfile(django_file):
+                    files = []
                     with ZipFile(django_file, "r") as zf:
                         for path in zf.namelist():
                             if path.endswith("/"):
                                 # is a directory
                                 continue
-                            with zf.open(path, "r") as f:
-                                import_file(f)
+                            files.append((path, zf.read(path)))
                 else:
                     # It is necessary to seek to the beginning because
                     # is_zipfile fucks the file, and thus cannot be read.
                     django_file.seek(0)
-                    import_file(django_file)
+                    files = [(django_file.name, django_file.read())]
+
+                import_id = start_import(request.user, files)
             except Exception as e:
                 upload_form.add_error("file", e.message)
                 return {
                     "upload_form": upload_form,
                 }
 
+            return {
+                "upload_form": UploadForm(),
+                "import_id": import_id,
+            }
+
     # Always return a blank upload form unless the upload form is not valid.
     return {
         "upload_form": UploadForm(),
     }
+
+
+@ajax_required
+def import_status(request, import_id):
+    """Report the progress of an import started by the current user."""
+    status = get_import_status(import_id)
+    if status is None or status.pop("user") != request.user.id:
+        raise Http404
+
+    return HttpResponse(jsonify(status), content_type="application/json")
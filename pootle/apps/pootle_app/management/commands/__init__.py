@@ -15,7 +15,6 @@ from optparse import make_option
 from django.core.management.base import BaseCommand, NoArgsCommand
 
 from pootle_project.models import Project
-from pootle_translationproject.models import TranslationProject
 
 
 class PootleCommand(NoArgsCommand):
@@ -82,10 +81,9 @@ class PootleCommand(NoArgsCommand):
         # reduce size of parse pool early on
         self.name = self.__class__.__module__.split('.')[-1]
         from pootle_store.fields import TranslationStoreFieldFile
-        TranslationStoreFieldFile._store_cache.maxsize = 2
-        TranslationStoreFieldFile._store_cache.cullsize = 2
-        TranslationProject._non_db_state_cache.maxsize = 2
-        TranslationProject._non_db_state_cache.cullsize = 2
+        TranslationStoreFieldFile._store_cache.max_entries = 2
+        from pootle_misc.match import term_indexes
+        term_indexes.max_entries = 2
 
         self.projects = options.get('projects', [])
         self.languages = options.get('languages', [])
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import os
+os.environ['DJANGO_SETTINGS_MODULE'] = 'pootle.settings'
+
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from django.utils import timezone
+
+from pootle_store.models import Unit
+from pootle_store.search_index import get_search_index
+from pootle_store.trigram_index import trigram_index
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', type='int', default=1000,
+                    dest='chunk_size',
+                    help='Number of units to index at a time.'),
+    )
+
+    help = "Build the full-text and trigram indexes used by the editor search."
+
+    def handle_noargs(self, **options):
+        started = timezone.now()
+
+        search_index = get_search_index()
+        if search_index is None:
+            self.stdout.write("The database backend in use has no full-text "
+                              "search support, only building the trigram "
+                              "index.")
+        else:
+            search_index.create()
+
+        trigram_index.clear()
+
+        chunk_size = options['chunk_size']
+        units = Unit.objects.order_by('id')
+        self.index_units(units, chunk_size, search_index, verbose=True)
+
+        if search_index is not None:
+            search_index.mark_built()
+        trigram_index.mark_built()
+
+        # Processes which didn't know about the index until now skipped the
+        # units saved meanwhile, possibly after their chunk was indexed
+        count = self.index_units(units.filter(mtime__gte=started),
+                                 chunk_size, search_index)
+        self.stdout.write("Reindexed %d units changed while building" % count)
+
+    def index_units(self, units, chunk_size, search_index, verbose=False):
+        # Existing entries are replaced, other processes may have indexed
+        # some units already
+        count = 0
+        last_id = 0
+        while True:
+            chunk = list(units.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+
+            with transaction.atomic():
+                if search_index is not None:
+                    search_index.index_units(chunk)
+                trigram_index.index_units(chunk)
+
+            last_id = chunk[-1].id
+            count += len(chunk)
+            if verbose:
+                self.stdout.write("Indexed %d units" % count)
+
+        return count
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import os
+os.environ['DJANGO_SETTINGS_MODULE'] = 'pootle.settings'
+
+import multiprocessing
+from optparse import make_option
+
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import connection
+from django.db.models import Max, Min
+
+from pootle.core import tmserver
+from pootle_store.models import Unit
+from pootle_store.util import TRANSLATED
+
+
+def get_translated_units():
+    return Unit.objects.filter(state=TRANSLATED)
+
+
+def init_worker():
+    # Forked processes must not share the parent's connections
+    connection.close()
+    tmserver.reset_engine()
+
+
+def index_chunk(id_range):
+    """Index the translated units whose IDs are within `id_range`, returning
+    their number."""
+    first_id, last_id = id_range
+    units = get_translated_units().filter(
+        id__gte=first_id,
+        id__lte=last_id,
+    ).select_related(
+        'store__translation_project__language',
+        'store__translation_project__project',
+        'submitted_by',
+    )
+
+    items = [(unit.store.translation_project.language.code,
+              unit.get_tmserver_doc())
+             for unit in units.iterator()]
+    tmserver.index_documents(items)
+
+    return len(items)
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--rebuild', action='store_true', dest='rebuild',
+                    default=False,
+                    help='Remove all the TM contents before filling it again.'),
+        make_option('--chunk-size', type='int', default=1000,
+                    dest='chunk_size',
+                    help='Range of unit IDs indexed at a time.'),
+        make_option('--processes', type='int',
+                    default=multiprocessing.cpu_count(), dest='processes',
+                    help='Number of processes indexing chunks in parallel.'),
+    )
+
+    help = "Index all the translated units in the TM server."
+
+    def handle_noargs(self, **options):
+        engine = tmserver.get_engine()
+        if engine is None:
+            raise CommandError("No TM server is configured.")
+
+        # Queued updates are superseded by the current DB contents
+        tmserver.get_connection().delete(tmserver.POOTLE_TM_QUEUE)
+
+        if options['rebuild']:
+            engine.clear()
+
+        bounds = get_translated_units().aggregate(first=Min('id'),
+                                                  last=Max('id'))
+        if bounds['first'] is None:
+            return
+
+        chunk_size = options['chunk_size']
+        id_ranges = [(first_id, first_id + chunk_size - 1)
+                     for first_id in range(bounds['first'],
+                                           bounds['last'] + 1, chunk_size)]
+
+        if options['processes'] > 1:
+            connection.close()
+            pool = multiprocessing.Pool(options['processes'],
+                                        initializer=init_worker)
+            counts = pool.imap_unordered(index_chunk, id_ranges)
+        else:
+            pool = None
+            counts = (index_chunk(id_range) for id_range in id_ranges)
+
+        total = 0
+        try:
+            for count in counts:
+                total += count
+                self.stdout.write("Indexed %d units" % total)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
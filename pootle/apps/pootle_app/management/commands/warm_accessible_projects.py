@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import os
+os.environ['DJANGO_SETTINGS_MODULE'] = 'pootle.settings'
+
+from datetime import timedelta
+from optparse import make_option
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import NoArgsCommand
+from django.utils import timezone
+
+from pootle_project.models import Project
+
+
+class Command(NoArgsCommand):
+    help = "Cache the projects accessible by recently active users."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--days', type='int', dest='days', default=30,
+                    help='Consider users who logged in within this number '
+                         'of days.'),
+        make_option('--chunk-size', type='int', dest='chunk_size',
+                    default=1000,
+                    help='Number of users whose permissions are retrieved '
+                         'in a single query.'),
+    )
+
+    def handle_noargs(self, **options):
+        User = get_user_model()
+        since = timezone.now() - timedelta(days=options['days'])
+        usernames = User.objects.filter(
+            is_active=True,
+            last_login__gte=since,
+        ).values_list('username', flat=True)
+
+        usernames = list(usernames)
+        Project.warm_accessible_by_user(usernames,
+                                        chunk_size=options['chunk_size'])
+
+        self.stdout.write('Cached accessible projects for %d users.' %
+                          len(usernames))
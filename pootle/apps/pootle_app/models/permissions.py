@@ -8,11 +8,22 @@
 # AUTHORS file for copyright and authorship information.
 
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.conf import settings
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
-from django.core.cache import cache
-from django.utils.encoding import iri_to_uri
+from django.dispatch import receiver
+
+from django_rq import get_connection
+
+from pootle.core.parsepool import ParsePool
+
+
+# Redis key holding a counter incremented whenever any permission set changes
+POOTLE_PERMISSIONS_VERSION = 'pootle:permissions:version'
+
+# Number of users whose permissions are kept in memory by each process
+RESOLVERS_POOL_SIZE = 1000
 
 
 def get_permission_contenttype():
@@ -42,42 +53,116 @@ def get_pootle_permissions(codenames=None):
     return dict((permission.codename, permission) for permission in permissions)
 
 
-def get_permissions_by_username(username, directory):
-    pootle_path = directory.pootle_path
-    path_parts = filter(None, pootle_path.split('/'))
-    key = iri_to_uri('Permissions:%s' % username)
-    permissions_cache = cache.get(key, {})
-
-    if pootle_path not in permissions_cache:
-        try:
-            permissionset = PermissionSet.objects.filter(
-                directory__in=directory.trail(only_dirs=False),
-                user__username=username) \
-                        .order_by('-directory__pootle_path')[0]
-        except IndexError:
-            permissionset = None
+class PermissionNode(object):
+
+    __slots__ = ('children', 'permissions')
+
+    def __init__(self):
+        self.children = {}
+        #: Positive permissions keyed by codename, or `None` if there is no
+        #: permission set for this directory
+        self.permissions = None
+
+
+class PermissionResolver(object):
+    """Resolve the permissions of a user in any directory.
+
+    All the permission sets of the user are loaded at once into a trie of
+    path segments, so resolving the permissions for a path needs no queries.
+
+    :param version: Value of the permissions version when loading them.
+    """
+
+    def __init__(self, username, version=None):
+        self.username = username
+        self.version = version
+        self.root = PermissionNode()
+
+        permission_sets = PermissionSet.objects.filter(
+            user__username=username,
+            directory__obsolete=False,
+        ).values_list('id', 'directory__pootle_path')
+
+        nodes = {}
+        for permissionset_id, pootle_path in permission_sets:
+            node = self.root
+            for part in filter(None, pootle_path.split('/')):
+                node = node.children.setdefault(part, PermissionNode())
+
+            node.permissions = {}
+            nodes[permissionset_id] = node
+
+        if nodes:
+            positive_permissions = PermissionSet.positive_permissions.through \
+                                                .objects \
+                                                .filter(permissionset__in=nodes) \
+                                                .select_related('permission')
+            for item in positive_permissions:
+                permission = item.permission
+                nodes[item.permissionset_id].permissions[permission.codename] = \
+                    permission
+
+    def _get_node(self, path_parts):
+        node = self.root
+        for part in path_parts:
+            node = node.children.get(part)
+            if node is None:
+                break
+
+        return node
+
+    def resolve(self, pootle_path):
+        """Return the permissions in `pootle_path`, keyed by codename, or
+        `None` if no permission set applies."""
+        path_parts = filter(None, pootle_path.split('/'))
+
+        # The permission set of the closest directory applies
+        node = self.root
+        permissions, depth = node.permissions, 0
+        for i, part in enumerate(path_parts):
+            node = node.children.get(part)
+            if node is None:
+                break
+            if node.permissions is not None:
+                permissions, depth = node.permissions, i + 1
 
         if (len(path_parts) > 1 and path_parts[0] != 'projects' and
-            (permissionset is None or
-            len(filter(None, permissionset.directory.pootle_path.split('/'))) < 2)):
-                # Active permission at language level or higher, check project
-                # level permission
-                try:
-                    project_path = '/projects/%s/' % path_parts[1]
-                    permissionset = PermissionSet.objects \
-                            .get(directory__pootle_path=project_path,
-                                 user__username=username)
-                except PermissionSet.DoesNotExist:
-                    pass
+            depth < 2):
+            # Active permission at language level or higher, check project
+            # level permission
+            node = self._get_node(['projects', path_parts[1]])
+            if node is not None and node.permissions is not None:
+                permissions = node.permissions
 
-        if permissionset:
-            permissions_cache[pootle_path] = permissionset.to_dict()
-        else:
-            permissions_cache[pootle_path] = None
+        return permissions
 
-        cache.set(key, permissions_cache, settings.OBJECT_CACHE_TIMEOUT)
 
-    return permissions_cache[pootle_path]
+resolvers = ParsePool('permissions', RESOLVERS_POOL_SIZE)
+
+
+def get_permissions_version():
+    return get_connection().get(POOTLE_PERMISSIONS_VERSION)
+
+
+def incr_permissions_version():
+    """Invalidate the permissions loaded by every process."""
+    get_connection().incr(POOTLE_PERMISSIONS_VERSION)
+
+
+def get_permission_resolver(username):
+    """Return the permission resolver for `username`, loading it again if
+    any permission set changed since it was loaded."""
+    version = get_permissions_version()
+    resolver = resolvers.get(username)
+    if resolver is None or resolver.version != version:
+        resolver = PermissionResolver(username, version)
+        resolvers[username] = resolver
+
+    return resolver
+
+
+def get_permissions_by_username(username, directory):
+    return get_permission_resolver(username).resolve(directory.pootle_path)
 
 
 def get_matching_permissions(user, directory, check_default=True):
@@ -172,16 +257,15 @@ class PermissionSet(models.Model):
         permissions_iterator = self.positive_permissions.iterator()
         return dict((perm.codename, perm) for perm in permissions_iterator)
 
-    def save(self, *args, **kwargs):
-        super(PermissionSet, self).save(*args, **kwargs)
-        # FIXME: can we use `post_save` signals or invalidate caches in
-        # model managers, please?
-        key = iri_to_uri('Permissions:%s' % self.user.username)
-        cache.delete(key)
-
-    def delete(self, *args, **kwargs):
-        super(PermissionSet, self).delete(*args, **kwargs)
-        # FIXME: can we use `post_delete` signals or invalidate caches in
-        # model managers, please?
-        key = iri_to_uri('Permissions:%s' % self.user.username)
-        cache.delete(key)
+
+# Signals are also sent for permission sets deleted along with their user or
+# directory, unlike `save()` and `delete()` calls
+@receiver([post_delete, post_save], sender=PermissionSet)
+def invalidate_permission_set(sender, **kwargs):
+    incr_permissions_version()
+
+
+@receiver(m2m_changed, sender=PermissionSet.positive_permissions.through)
+def invalidate_permissions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        incr_permissions_version()
@@ -24,6 +24,7 @@ from redis.exceptions import ConnectionError
 
 from pootle.core.decorators import admin_required
 from pootle.core.markup import get_markup_filter
+from pootle.core.parsepool import get_pool_stats
 from pootle_misc.aggregate import sum_column
 from pootle_statistics.models import Submission
 from pootle_store.models import Unit, Suggestion
@@ -121,6 +122,19 @@ def rq_stats():
     return result
 
 
+def parse_pool_stats():
+    pool_names = {
+        'stores': _('Translation files'),
+        'termmatchers': _('Terminology matchers'),
+    }
+    result = []
+    for stats in get_pool_stats():
+        stats['title'] = pool_names.get(stats['name'], stats['name'])
+        result.append(stats)
+
+    return result
+
+
 def checks():
     from django.core.checks.registry import registry
 
@@ -132,6 +146,7 @@ def view(request):
     ctx = {
         'server_stats': server_stats(),
         'rq_stats': rq_stats(),
+        'parse_pool_stats': parse_pool_stats(),
         'checks': checks(),
     }
     return render(request, "admin/dashboard.html", ctx)
@@ -103,6 +103,82 @@ check_names = {
 
 excluded_filters = ['hassuggestion', 'spellcheck']
 
+#: Bit of each quality check in the `Unit.check_flags` mask. Masks are
+#: stored in the database, so bits must never be reassigned: new checks get
+#: unused bits, and bits of removed checks are left unused. The mask is a
+#: signed 64-bit integer, so up to 63 checks are tracked in it; filtering by
+#: any other check queries the `QualityCheck` table instead.
+CHECK_FLAG_BITS = {
+    # Pootle checks
+    'accelerators': 0,
+    'android_format': 1,
+    'broken_entities': 2,
+    'c_format': 3,
+    'changed_attributes': 4,
+    'date_format': 5,
+    'dollar_sign_closure_placeholders': 6,
+    'dollar_sign_placeholders': 7,
+    'double_quotes_in_tags': 8,
+    'doublequoting': 9,
+    'incorrectly_escaped_ampersands': 10,
+    'java_format': 11,
+    'javaencoded_unicode': 12,
+    'mustache_like_placeholder_pairs': 13,
+    'mustache_placeholder_pairs': 14,
+    'mustache_placeholders': 15,
+    'non_printable': 16,
+    'objective_c_format': 17,
+    'percent_brace_placeholders': 18,
+    'percent_sign_closure_placeholders': 19,
+    'percent_sign_placeholders': 20,
+    'potential_unwanted_placeholders': 21,
+    'tags_differ': 22,
+    'template_format': 23,
+    'unbalanced_curly_braces': 24,
+    'unbalanced_tag_braces': 25,
+    'unescaped_ampersands': 26,
+    'uppercase_placeholders': 27,
+    'whitespace': 28,
+    # Translate Toolkit checks
+    'acronyms': 29,
+    'brackets': 30,
+    'doublespacing': 31,
+    'doublewords': 32,
+    'emails': 33,
+    'endpunc': 34,
+    'endwhitespace': 35,
+    'escapes': 36,
+    'filepaths': 37,
+    'functions': 38,
+    'long': 39,
+    'musttranslatewords': 40,
+    'newlines': 41,
+    'notranslatewords': 42,
+    'nplurals': 43,
+    'numbers': 44,
+    'options': 45,
+    'printf': 46,
+    'puncspacing': 47,
+    'purepunc': 48,
+    'sentencecount': 49,
+    'short': 50,
+    'simplecaps': 51,
+    'simpleplurals': 52,
+    'singlequoting': 53,
+    'startcaps': 54,
+    'startpunc': 55,
+    'startwhitespace': 56,
+    'tabs': 57,
+    'unchanged': 58,
+    'urls': 59,
+    'validchars': 60,
+    'variables': 61,
+    'xmltags': 62,
+}
+
+_check_flags = dict((name, 1 << bit)
+                    for name, bit in CHECK_FLAG_BITS.iteritems())
+
 # pre-compile all regexps
 
 fmt = u"\{\d+(?:,(?:number|date|time|choice))\}"
@@ -976,6 +1052,25 @@ def get_qualitychecks():
     return sc.categories
 
 
+def get_check_flags():
+    """Return the mapping of quality check names to their flag in the
+    `Unit.check_flags` mask, as set in `CHECK_FLAG_BITS`."""
+    return _check_flags
+
+
+def get_check_mask(names):
+    """Return the `Unit.check_flags` mask matching any of the `names`
+    checks, or `None` if some of them aren't tracked in the mask."""
+    flags = get_check_flags()
+    mask = 0
+    for name in names:
+        if name not in flags:
+            return None
+        mask |= flags[name]
+
+    return mask
+
+
 def get_qualitycheck_schema(path_obj=None):
     d = {}
     checks = get_qualitychecks()
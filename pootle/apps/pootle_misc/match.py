@@ -7,72 +7,246 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+"""Terminology matching.
+
+The terms of each terminology store are kept in a token trie: every node
+maps the next lowercased word of a term to its child node, and nodes where
+a term ends hold its translations. Words in the text match the term words
+they start with, so `file` matches `files`. All the glossary hits of a text
+are found in a single pass over its words, walking the trie from each of
+them.
+
+Term indexes are shared by all the translation projects using a store and
+are updated incrementally, with the units changed since they were built.
+"""
+
 import re
+import sys
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+
+from pootle.core.mixins import CachedMethods
+from pootle.core.parsepool import ParsePool, UNIT_OVERHEAD
+
+
+word_re = re.compile(u"\w+", re.U)
+
+# Context information following terms, e.g. `file (noun)`
+context_re = re.compile(u"\s+\(.*\)\s*$")
+
+#: Terms shorter or longer than this are ignored
+MIN_TERM_LENGTH = 3
+MAX_TERM_LENGTH = 500
+
+
+Term = namedtuple('Term', ['source', 'target'])
+
+
+def tokenize(text):
+    """Return the `(word, start, end)` tuples of the lowercased words of
+    `text`."""
+    return [(m.group(), m.start(), m.end())
+            for m in word_re.finditer(unicode(text).lower())]
+
+
+def is_term(unit):
+    """Whether `unit` can be used as a glossary entry."""
+    if not unit.istranslated():
+        return False
+
+    length = len(context_re.sub(u"", unicode(unit.source)))
+    return MIN_TERM_LENGTH <= length <= MAX_TERM_LENGTH
+
+
+class TrieNode(object):
+    __slots__ = ('children', 'lengths', 'terms')
+
+    def __init__(self):
+        self.children = {}
+        # Lengths of the words leading to children, used for prefix lookups
+        self.lengths = set()
+        # Terms ending at this node, keyed by unit ID
+        self.terms = {}
+
+    def get_matching_children(self, word):
+        """Return the child nodes reached by the term words `word` starts
+        with."""
+        children = []
+        for length in self.lengths:
+            if length <= len(word):
+                child = self.children.get(word[:length])
+                if child is not None:
+                    children.append(child)
+
+        return children
+
+
+class TermIndex(object):
+    """Token trie of the terms of a terminology store."""
+
+    def __init__(self):
+        self.root = TrieNode()
+        # Unit ID -> term words, to remove entries
+        self.entries = {}
+        #: Estimated memory footprint, in bytes
+        self.size = 0
+        #: Store mtime the index is up to date with
+        self.mtime = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
 
-from translate.search import match, terminology
-
-delimiters = re.compile(u"[\W]+", re.U)
-
-class Matcher(match.terminologymatcher):
-    def __init__(self, store, max_candidates=10, min_similarity=75,
-                 max_length=500, comparer=None):
-        comparer = TerminologyComparer(max_length)
-        super(Matcher, self).__init__(store, max_candidates,
-                                      min_similarity=10,
-                                      max_length=max_length,
-                                      comparer=comparer)
-
-    def inittm(self, store):
-        match.matcher.inittm(self, store)
-        for cand in self.candidates.units:
-            cand.source = cand.source.lower()
-
-
-class TerminologyComparer(terminology.TerminologyComparer):
-
-    def __init__(self, max_len=500):
-        self.match_info = {}
-        self.MAX_LEN = max_len
-
-    def similarity(self, text, term, stoppercentage=40):
-        text_list = delimiters.split(text)
-        term_list = delimiters.split(term)
-        #text_list = text.split()
-        #term_list = term.split()
-        match_info = {}
-        matched_count = 0
-        match_gap = 0
-        pos = 0
-        term_count = len(term_list)
-        matched_index = 0
-
-        for i, term_word in enumerate(term_list):
-            for j, text_word in enumerate(text_list[matched_index:],
-                                          start=matched_index):
-                text_word_len = len(text_word)
-                text_word = text_word[:len(term_word)]
-                if text_word == term_word:
-                    if matched_count == 0:
-                        match_info = {'pos': pos}
-                    matched_count += 1
-                    matched_index = j + 1
+    def add(self, unit_id, source, target):
+        words = [word for word, start, end in tokenize(source)]
+        if not words:
+            return
+
+        term = Term(unicode(source).lower(), unicode(target))
+        with self._lock:
+            self.remove(unit_id)
+
+            node = self.root
+            for word in words:
+                child = node.children.get(word)
+                if child is None:
+                    child = node.children[word] = TrieNode()
+                    node.lengths.add(len(word))
+                node = child
+
+            node.terms[unit_id] = term
+            self.entries[unit_id] = (words, term)
+            self.size += self._get_entry_size(term)
+
+    def remove(self, unit_id):
+        with self._lock:
+            try:
+                words, term = self.entries.pop(unit_id)
+            except KeyError:
+                return
+
+            path = [self.root]
+            for word in words:
+                path.append(path[-1].children[word])
+            del path[-1].terms[unit_id]
+            self.size -= self._get_entry_size(term)
+
+            # Prune the branch nodes left empty
+            for word, parent, node in reversed(zip(words, path, path[1:])):
+                if node.children or node.terms:
                     break
+                del parent.children[word]
+
+    def update(self, units):
+        """Add, replace or remove the entries of `units`."""
+        with self._lock:
+            for unit in units:
+                if is_term(unit):
+                    self.add(unit.id, unit.source, unit.target)
                 else:
-                    if matched_count > 0:
-                        match_gap += 1
+                    self.remove(unit.id)
+
+    def refresh(self, store, mtime):
+        """Bring the index up to date with `store`, whose units were last
+        modified at `mtime`, re-indexing only the units changed since the
+        last refresh."""
+        with self._lock:
+            units = store.unit_set.all()
+            if self.mtime is not None:
+                units = units.filter(mtime__gt=self.mtime)
+
+                # Drop the entries of deleted units
+                unit_ids = set(store.unit_set.values_list('id', flat=True))
+                for unit_id in set(self.entries) - unit_ids:
+                    self.remove(unit_id)
+
+            self.update(units.iterator())
+            self.mtime = mtime
+
+    def find(self, tokens):
+        """Yield the `(first, last, term)` tuples of the terms found in the
+        text split in `tokens`, where `first` and `last` are the indexes of
+        the first and last matched tokens."""
+        with self._lock:
+            for first in range(len(tokens)):
+                nodes = [self.root]
+                for last in range(first, len(tokens)):
+                    word = tokens[last][0]
+                    nodes = [child for node in nodes
+                             for child in node.get_matching_children(word)]
+                    if not nodes:
+                        break
+
+                    for node in nodes:
+                        for term in node.terms.itervalues():
+                            yield first, last, term
+
+    def _get_entry_size(self, term):
+        return (UNIT_OVERHEAD + sys.getsizeof(term.source) +
+                sys.getsizeof(term.target))
+
+
+# Term indexes by store ID, shared by all the translation projects of the
+# process
+term_indexes = ParsePool('termmatchers', settings.PARSE_POOL_SIZE,
+                         settings.PARSE_POOL_MAX_BYTES,
+                         sizeof=lambda index: index.size)
+
+
+def get_term_index(store):
+    """Return the up to date term index of `store`."""
+    mtime = store.get_cached_value(CachedMethods.MTIME)
+
+    index = term_indexes.get(store.id)
+    if index is None:
+        index = TermIndex()
+        index.refresh(store, mtime)
+        term_indexes[store.id] = index
+    elif index.mtime != mtime:
+        index.refresh(store, mtime)
+        term_indexes.resize(store.id)
+
+    return index
+
+
+class Matcher(object):
+    """Find the glossary entries of a set of term indexes in texts."""
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def matches(self, text):
+        """Return the terms found in `text`.
+
+        Terms are sorted by position, preferring longer terms when they
+        overlap. Other translations of a matched term follow it.
+        """
+        if len(text) < MIN_TERM_LENGTH:
+            return []
+
+        tokens = tokenize(text)
+        hits = []
+        known = set()
+        for index in self.indexes:
+            for first, last, term in index.find(tokens):
+                if term not in known:
+                    known.add(term)
+                    hits.append((tokens[first][1], tokens[last][2], term))
 
-                    if match_gap > 2:
-                        matched_count = 0
-                        match_gap = 0
-                        matched_index = 0
+        hits.sort(key=lambda (start, end, term): (start, -(end - start),
+                                                  -len(term.source)))
 
-                pos += text_word_len + 1
+        matches = []
+        last_span = None
+        for start, end, term in hits:
+            if last_span is not None and start < last_span[1]:
+                if (start, end) == last_span:
+                    matches.append(term)
+                continue
 
-            if matched_count == 0:
-                break
+            matches.append(term)
+            last_span = (start, end)
 
-        if matched_count == term_count:
-            self.match_info[term] = match_info
-            return 100
-        else:
-            return 0
+        return matches
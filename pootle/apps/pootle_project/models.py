@@ -9,16 +9,16 @@
 
 import logging
 import os
+import time
 from collections import OrderedDict
 
 from django.conf import settings
-from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.urlresolvers import reverse
 from django.db import connection, models
 from django.db.models import Q
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.utils.encoding import iri_to_uri
 from django.utils.functional import cached_property
@@ -41,6 +41,22 @@ from pootle_store.util import absolute_real_path
 RESERVED_PROJECT_CODES = ('admin', 'translate', 'settings')
 
 
+def get_accessible_projects_key(key):
+    return iri_to_uri(make_method_key('Project', 'accessible_by_user', key))
+
+
+def get_accessible_projects_version():
+    """Return the version of the cached accessible projects, replaced
+    whenever projects or permission sets change."""
+    version_key = get_accessible_projects_key('version')
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time(), None)
+        version = cache.get(version_key)
+
+    return version
+
+
 class ProjectManager(models.Manager):
 
     def get_queryset(self):
@@ -207,15 +223,15 @@ class Project(models.Model, CachedTreeItem, ProjectURLMixin):
 
         :param user: The ``User`` instance to get accessible projects for.
         """
-        username = 'nobody' if user.is_anonymous() else user.username
-        key = iri_to_uri('projects:accessible:%s' % username)
-        user_projects = cache.get(key, None)
-
-        if user_projects is not None:
-            return user_projects
+        # FIXME: use `cls.objects.cached_dict().keys()`, but that needs
+        # to use the `LiveProjectManager` first, as it only considers
+        # `enabled()` projects
+        ALL_PROJECTS = cls.get_cached_codes()
 
-        logging.debug(u'Cache miss for %s', key)
+        if user.is_superuser:
+            return list(ALL_PROJECTS)
 
+        username = 'nobody' if user.is_anonymous() else user.username
         if user.is_anonymous():
             allow_usernames = [username]
             forbid_usernames = [username, 'default']
@@ -223,50 +239,133 @@ class Project(models.Model, CachedTreeItem, ProjectURLMixin):
             allow_usernames = list(set([username, 'default', 'nobody']))
             forbid_usernames = list(set([username, 'default']))
 
-        # FIXME: use `cls.objects.cached_dict().keys()`, but that needs
-        # to use the `LiveProjectManager` first, as it only considers
-        # `enabled()` projects
-        ALL_PROJECTS = cls.objects.values_list('code', flat=True)
+        permissions = cls.get_cached_view_permissions(
+            set(allow_usernames + forbid_usernames)
+        )
 
-        if user.is_superuser:
-            user_projects = ALL_PROJECTS
+        # Check root for `view` permissions
+        if any(permissions[name]['root'] for name in allow_usernames):
+            user_projects = set(ALL_PROJECTS)
         else:
-            ALL_PROJECTS = set(ALL_PROJECTS)
+            user_projects = set()
 
-            # Check root for `view` permissions
+        # Check specific permissions at the project level
+        allow_projects = set()
+        for name in allow_usernames:
+            allow_projects.update(permissions[name]['view'])
 
-            root_permissions = PermissionSet.objects.filter(
-                directory__pootle_path='/',
-                user__username__in=allow_usernames,
-                positive_permissions__codename='view',
-            )
-            if root_permissions.count():
-                user_projects = ALL_PROJECTS
-            else:
-                user_projects = set()
+        forbid_projects = set()
+        for name in forbid_usernames:
+            forbid_projects.update(permissions[name]['hide'])
+        forbid_projects -= allow_projects
+
+        user_projects = \
+            (user_projects.union(allow_projects)).difference(forbid_projects)
+
+        return list(user_projects)
+
+    @classmethod
+    def get_view_permissions(cls, usernames):
+        """Returns the permissions deciding which projects `usernames` can
+        access, retrieved using a single query.
+
+        :param usernames: Names of the users to get permissions for.
+        :return: A dictionary keyed by username, whose values are
+            dictionaries telling whether the user has `view` permissions at
+            the root (`root`), and the sets of codes of the projects the
+            user has `view` (`view`) or negative `hide` (`hide`) permissions
+            for.
+        """
+        permissions = dict(
+            (username, {'root': False, 'view': set(), 'hide': set()})
+            for username in usernames
+        )
 
+        permission_sets = PermissionSet.objects.filter(
+            Q(directory__pootle_path='/') |
+            Q(directory__pootle_path__startswith='/projects/'),
+            Q(positive_permissions__codename='view') |
+            Q(negative_permissions__codename='hide'),
+            user__username__in=usernames,
+        ).values_list(
+            'user__username', 'directory__pootle_path',
+            'positive_permissions__codename', 'negative_permissions__codename',
+        ).distinct()
+
+        for username, pootle_path, positive, negative in permission_sets:
+            user_permissions = permissions[username]
+            if pootle_path == '/':
+                if positive == 'view':
+                    user_permissions['root'] = True
+                continue
+
+            path_parts = filter(None, pootle_path.split('/'))
+            if len(path_parts) != 2:
+                # Not a project directory
+                continue
+
+            if positive == 'view':
+                user_permissions['view'].add(path_parts[1])
+            if negative == 'hide':
+                user_permissions['hide'].add(path_parts[1])
+
+        return permissions
 
-            # Check specific permissions at the project level
+    @classmethod
+    def get_cached_view_permissions(cls, usernames):
+        """Same as :meth:`get_view_permissions`, but only retrieving from the
+        DB the permissions not cached since projects or permission sets last
+        changed."""
+        version = get_accessible_projects_version()
+        keys = dict(
+            (get_accessible_projects_key({'username': username}), username)
+            for username in usernames
+        )
 
-            accessible_projects = cls.objects.filter(
-                directory__permission_sets__positive_permissions__codename='view',
-                directory__permission_sets__user__username__in=allow_usernames,
-            ).values_list('code', flat=True)
+        permissions = {}
+        for key, (cached_version, value) in cache.get_many(keys).iteritems():
+            if cached_version == version:
+                permissions[keys[key]] = value
+
+        missing_usernames = set(usernames) - set(permissions)
+        if missing_usernames:
+            logging.debug(u'Cache miss for the accessible projects of %s',
+                          u', '.join(missing_usernames))
+            missing_permissions = cls.get_view_permissions(missing_usernames)
+            cache.set_many(dict(
+                (get_accessible_projects_key({'username': username}),
+                 (version, value))
+                for username, value in missing_permissions.iteritems()
+            ), None)
+            permissions.update(missing_permissions)
+
+        return permissions
 
-            forbidden_projects = cls.objects.filter(
-                directory__permission_sets__negative_permissions__codename='hide',
-                directory__permission_sets__user__username__in=forbid_usernames,
-            ).values_list('code', flat=True)
+    @classmethod
+    def get_cached_codes(cls):
+        """Returns the codes of all the projects, cached until projects
+        change."""
+        version = get_accessible_projects_version()
+        key = get_accessible_projects_key('codes')
+        cached = cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
 
-            allow_projects = set(accessible_projects)
-            forbid_projects = set(forbidden_projects) - allow_projects
-            user_projects = \
-                (user_projects.union(allow_projects)).difference(forbid_projects)
+        codes = list(cls.objects.values_list('code', flat=True))
+        cache.set(key, (version, codes), None)
 
-        user_projects = list(user_projects)
-        cache.set(key, user_projects, settings.OBJECT_CACHE_TIMEOUT)
+        return codes
 
-        return user_projects
+    @classmethod
+    def warm_accessible_by_user(cls, usernames, chunk_size=1000):
+        """Caches the permissions needed to get the projects accessible by
+        `usernames`, retrieving them in chunks of `chunk_size` users."""
+        usernames = list(usernames) + ['default', 'nobody']
+        cls.get_cached_codes()
+        for begin in range(0, len(usernames), chunk_size):
+            cls.get_cached_view_permissions(
+                usernames[begin:begin+chunk_size]
+            )
 
     ############################ Properties ###################################
 
@@ -526,12 +625,17 @@ def invalidate_resources_cache(sender, instance, **kwargs):
 
 
 @receiver([post_delete, post_save])
+@receiver(m2m_changed, sender=PermissionSet.positive_permissions.through)
+@receiver(m2m_changed, sender=PermissionSet.negative_permissions.through)
 def invalidate_accessible_projects_cache(sender, instance, **kwargs):
     # XXX: maybe use custom signals or simple function calls?
     if (instance.__class__.__name__ not in
         ['Project', 'TranslationProject', 'PermissionSet']):
         return
 
+    if kwargs.get('action') in ('pre_add', 'pre_remove', 'pre_clear'):
+        return
+
     # FIXME: use Redis directly to clear these caches effectively
 
     cache.delete_many([
@@ -539,6 +643,5 @@ def invalidate_accessible_projects_cache(sender, instance, **kwargs):
         make_method_key('Project', 'cached_dict', {'is_admin': True}),
     ])
 
-    User = get_user_model()
-    users_list = User.objects.values_list('username', flat=True)
-    cache.delete_many(map(lambda x: 'projects:accessible:%s' % x, users_list))
+    # Cached accessible projects of all users are outdated now
+    cache.delete(get_accessible_projects_key('version'))
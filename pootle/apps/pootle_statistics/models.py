@@ -139,6 +139,11 @@ class Submission(models.Model):
             int(self.old_value) == UNTRANSLATED):
             return False
 
+        # Editing comments doesn't change scores either
+        if (self.field == SubmissionFields.COMMENT and
+            self.type in SubmissionTypes.EDIT_TYPES):
+            return False
+
         return True
 
 
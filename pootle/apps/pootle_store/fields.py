@@ -11,12 +11,15 @@
 
 import logging
 import os
+from collections import deque
 
+from django.conf import settings
 from django.db import models
 from django.db.models.fields.files import FieldFile, FileField
 
 from translate.misc.multistring import multistring
 
+from pootle.core.parsepool import FILE_SIZE_FACTOR, UNIT_OVERHEAD, ParsePool
 from pootle_store.signals import translation_file_updated
 
 ################# String #############################
@@ -105,23 +108,29 @@ class MultiStringField(models.Field):
 
 
 class StoreTuple(object):
-    """Encapsulates toolkit stores in the in memory cache, needed
-    since LRUCachingDict is based on a weakref.WeakValueDictionary
-    which cannot reference normal tuples"""
+    """Encapsulates toolkit stores in the in memory cache, allowing to
+    update the modification info of a cached store in place."""
     def __init__(self, store, mod_info, realpath):
         self.store = store
         self.mod_info = mod_info
         self.realpath = realpath
 
 
+def estimate_store_size(store_tuple):
+    """Estimate the memory taken by a parsed store from its size on disk
+    and its number of units."""
+    file_size = store_tuple.mod_info[1]
+    return (file_size * FILE_SIZE_FACTOR +
+            len(store_tuple.store.units) * UNIT_OVERHEAD)
+
+
 class TranslationStoreFieldFile(FieldFile):
     """FieldFile is the file-like object of a FileField, that is found in a
     TranslationStoreField."""
-    from translate.misc.lru import LRUCachingDict
-    from django.conf import settings
 
-    _store_cache = LRUCachingDict(settings.PARSE_POOL_SIZE,
-                                  settings.PARSE_POOL_CULL_FREQUENCY)
+    _store_cache = ParsePool('stores', settings.PARSE_POOL_SIZE,
+                             settings.PARSE_POOL_MAX_BYTES,
+                             sizeof=estimate_store_size)
 
     def getpomtime(self):
         file_stat = os.stat(self.realpath)
@@ -183,6 +192,7 @@ class TranslationStoreFieldFile(FieldFile):
             mod_info = self.getpomtime()
             if self._store_tuple.mod_info != mod_info:
                 self._store_tuple.mod_info = mod_info
+                self._store_cache.resize(self.path)
                 translation_file_updated.send(sender=self, path=self.path)
         else:
             #FIXME: do we really need that?
@@ -227,6 +237,60 @@ class TranslationStoreFieldFile(FieldFile):
             super(TranslationStoreFieldFile, self).delete(save)
 
 
+class StoreFileWriter(object):
+    """Saves translation files in a pool of threads, so that writing files
+    to disk overlaps with the work done by the calling thread.
+
+    Files are still saved with :meth:`TranslationStoreFieldFile.savestore`,
+    thus atomically replaced. Callbacks run in the calling thread, in the
+    same order files were submitted, once each file has been saved.
+
+    :param workers: number of threads. With `0`, files are saved
+        synchronously.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pending = deque()
+        self._pool = None
+        if workers:
+            from multiprocessing.pool import ThreadPool
+            self._pool = ThreadPool(workers)
+
+    def write(self, field_file, callback=None):
+        if self._pool is None:
+            field_file.savestore()
+            if callback is not None:
+                callback()
+            return
+
+        result = self._pool.apply_async(field_file.savestore)
+        self._pending.append((result, callback))
+
+        # Don't keep more parsed stores than needed waiting to be saved
+        while (len(self._pending) > 2 * self.workers or
+               (self._pending and self._pending[0][0].ready())):
+            self._complete_next()
+
+    def close(self):
+        """Wait for all the pending files to be saved."""
+        try:
+            while self._pending:
+                self._complete_next()
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+    def _complete_next(self):
+        result, callback = self._pending.popleft()
+        # Re-raises any exception raised while saving
+        result.get()
+        if callback is not None:
+            callback()
+
+
 class TranslationStoreField(FileField):
     """This is the field class to represent a FileField in a model that
     represents a translation store."""
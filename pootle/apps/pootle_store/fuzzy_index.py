@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Fuzzy matching of unit sources against the translations of a store.
+
+Candidate translations are bucketed by source length and indexed by the
+trigrams of their sources. A text is only compared with the candidates
+whose length could reach the minimum similarity and that share enough
+trigrams with it: each edit changes at most `N` trigrams, so candidates
+within the allowed edit distance share all the others.
+
+Indexes hold plain data, so that they can be cached.
+"""
+
+from collections import namedtuple
+
+from translate.misc.multistring import multistring
+from translate.storage import po
+
+from pootle.core.utils.distance import get_similarity
+
+from .trigram_index import N, get_trigrams
+
+
+Candidate = namedtuple('Candidate', ['source', 'target', 'notes', 'fuzzy'])
+
+
+def get_strings(text):
+    return list(getattr(text, 'strings', [text]))
+
+
+def to_multistring(strings):
+    if len(strings) > 1:
+        return multistring(strings)
+
+    return strings[0]
+
+
+class FuzzyIndex(object):
+
+    def __init__(self, max_length, min_similarity):
+        self.max_length = max_length
+        self.min_similarity = min_similarity
+
+        self.candidates = []
+        #: Source length -> positions of the candidates in `candidates`
+        self.lengths = {}
+        #: Trigram -> positions of the candidates having it in their source
+        self.postings = {}
+        # Source -> target of the last candidate added for a source
+        self._existing = {}
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def add(self, unit):
+        """Add `unit` as a candidate if it is usable for fuzzy matching:
+        both its source and target are set, and no candidate with the same
+        translation was added before."""
+        source = unicode(unit.source)
+        target = unicode(unit.target)
+        if (not source or not target or len(source) < 2 or
+            len(source) > self.max_length):
+            return
+
+        if self._existing.get(source) == target:
+            return
+        self._existing[source] = target
+
+        position = len(self.candidates)
+        self.candidates.append(Candidate(
+            get_strings(unit.source), get_strings(unit.target),
+            unit.getnotes(origin="translator"), unit.isfuzzy(),
+        ))
+        self.lengths.setdefault(len(source), []).append(position)
+        for trigram in get_trigrams(source):
+            self.postings.setdefault(trigram, []).append(position)
+
+    def extend(self, units):
+        for unit in units:
+            self.add(unit)
+
+    def get_candidates(self, text):
+        """Return the positions of the candidates that might be similar
+        enough to `text`, shortest sources first."""
+        ratio = self.min_similarity / 100.0
+        start_length = max(len(text) * ratio, 1)
+        stop_length = min(len(text) / ratio, self.max_length)
+
+        positions = []
+        for length in sorted(self.lengths):
+            if start_length <= length <= stop_length:
+                positions.extend(self.lengths[length])
+
+        trigrams = get_trigrams(text)
+        min_shared = len(trigrams) - N * int((1 - ratio) * stop_length)
+        if min_shared <= 0:
+            return positions
+
+        shared = {}
+        for trigram in trigrams:
+            for position in self.postings.get(trigram, ()):
+                shared[position] = shared.get(position, 0) + 1
+
+        return [position for position in positions
+                if shared.get(position, 0) >= min_shared]
+
+    def matches(self, text):
+        """Return a list with a unit built from the candidate most similar
+        to `text`, or an empty list if none is similar enough."""
+        text = unicode(text)
+        ratio = self.min_similarity / 100.0
+
+        best_score, best = 0, None
+        for position in self.get_candidates(text):
+            candidate = self.candidates[position]
+            source = candidate.source[0]
+            limit = int((1 - ratio) * max(len(text), len(source)))
+            score = get_similarity(text, source, limit)
+            if score >= self.min_similarity and score > best_score:
+                best_score, best = score, candidate
+                if score >= 100:
+                    break
+
+        if best is None:
+            return []
+
+        return [self.build_unit(best)]
+
+    def build_unit(self, candidate):
+        unit = po.pounit(to_multistring(candidate.source))
+        unit.target = to_multistring(candidate.target)
+        unit.markfuzzy(candidate.fuzzy)
+        if candidate.notes.strip():
+            unit.addnote(candidate.notes.strip())
+
+        return unit
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def set_filter_flags(apps, schema_editor):
+    from pootle_misc.checks import get_check_flags
+
+    Unit = apps.get_model('pootle_store', 'Unit')
+    Suggestion = apps.get_model('pootle_store', 'Suggestion')
+    QualityCheck = apps.get_model('pootle_store', 'QualityCheck')
+
+    suggestion_counts = Suggestion.objects.filter(state='pending') \
+                                          .values('unit') \
+                                          .annotate(count=models.Count('id')) \
+                                          .order_by()
+    for row in suggestion_counts.iterator():
+        Unit.objects.filter(id=row['unit']) \
+                    .update(suggestion_count=row['count'])
+
+    flags = get_check_flags()
+    check_flags = {}
+    checks = QualityCheck.objects.filter(false_positive=False) \
+                                 .values_list('unit', 'name')
+    for unit_id, name in checks.iterator():
+        check_flags[unit_id] = check_flags.get(unit_id, 0) | flags.get(name, 0)
+
+    for unit_id, unit_check_flags in check_flags.iteritems():
+        if unit_check_flags:
+            Unit.objects.filter(id=unit_id).update(check_flags=unit_check_flags)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pootle_store', '0002_unittrigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unit',
+            name='check_flags',
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='suggestion_count',
+            field=models.PositiveIntegerField(default=0, editable=False, db_index=True),
+            preserve_default=True,
+        ),
+        migrations.RunPython(set_filter_flags),
+    ]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def set_unit_location(apps, schema_editor):
+    Unit = apps.get_model('pootle_store', 'Unit')
+    Store = apps.get_model('pootle_store', 'Store')
+    TranslationProject = apps.get_model('pootle_translationproject',
+                                        'TranslationProject')
+
+    tps = TranslationProject.objects.values_list('id', 'project',
+                                                 'language', 'pootle_path')
+    tp_paths = {}
+    for tp_id, project_id, language_id, pootle_path in tps.iterator():
+        tp_paths[tp_id] = pootle_path
+        Unit.objects.filter(store__translation_project=tp_id).update(
+            translation_project=tp_id,
+            project=project_id,
+            language=language_id,
+        )
+
+    stores = Store.objects.values_list('id', 'translation_project',
+                                       'pootle_path')
+    for store_id, tp_id, pootle_path in stores.iterator():
+        store_path = pootle_path[len(tp_paths[tp_id]):]
+        Unit.objects.filter(store=store_id).update(store_path=store_path)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pootle_language', '0001_initial'),
+        ('pootle_project', '0001_initial'),
+        ('pootle_translationproject', '0002_remove_translationproject_disabled'),
+        ('pootle_store', '0003_unit_filter_flags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unit',
+            name='language',
+            field=models.ForeignKey(related_name='+', editable=False, to='pootle_language.Language', null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='project',
+            field=models.ForeignKey(related_name='+', editable=False, to='pootle_project.Project', null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='store_path',
+            field=models.CharField(default='', max_length=255, editable=False, db_index=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='translation_project',
+            field=models.ForeignKey(related_name='+', editable=False, to='pootle_translationproject.TranslationProject', null=True),
+            preserve_default=True,
+        ),
+        migrations.AlterIndexTogether(
+            name='unit',
+            index_together=set([('translation_project', 'store_path'), ('project', 'store_path')]),
+        ),
+        migrations.RunPython(set_unit_location),
+    ]
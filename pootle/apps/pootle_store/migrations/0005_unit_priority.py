@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pootle_store', '0004_unit_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unit',
+            name='priority',
+            field=models.FloatField(default=1, editable=False, db_index=True),
+            preserve_default=True,
+        ),
+    ]
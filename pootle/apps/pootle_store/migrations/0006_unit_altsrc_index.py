@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pootle_store', '0005_unit_priority'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='unit',
+            index_together=set([('translation_project', 'store_path'), ('project', 'store_path'), ('project', 'unitid_hash', 'store_path')]),
+        ),
+    ]
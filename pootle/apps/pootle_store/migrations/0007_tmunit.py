@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pootle_store', '0006_unit_altsrc_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TMUnit',
+            fields=[
+                ('id', models.IntegerField(serialize=False, primary_key=True)),
+                ('language', models.CharField(max_length=50)),
+                ('source', models.TextField()),
+                ('source_length', models.PositiveIntegerField()),
+                ('target', models.TextField()),
+                ('revision', models.IntegerField(default=0)),
+                ('project', models.CharField(default=b'', max_length=255)),
+                ('path', models.CharField(default=b'', max_length=255)),
+                ('username', models.CharField(default=b'', max_length=30)),
+                ('fullname', models.CharField(default=b'', max_length=255)),
+                ('email_md5', models.CharField(default=b'', max_length=32)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='TMTrigram',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('language', models.CharField(max_length=50)),
+                ('source_length', models.PositiveIntegerField()),
+                ('trigram', models.CharField(max_length=3)),
+                ('tm_unit', models.ForeignKey(to='pootle_store.TMUnit')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterIndexTogether(
+            name='tmtrigram',
+            index_together=set([('language', 'trigram', 'source_length')]),
+        ),
+    ]
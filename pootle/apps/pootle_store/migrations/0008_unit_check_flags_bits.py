@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def update_check_flags(apps, schema_editor):
+    """Recompute the check masks with the fixed `CHECK_FLAG_BITS`, as they
+    used to be set from bits assigned at runtime."""
+    from pootle_misc.checks import get_check_flags
+
+    Unit = apps.get_model('pootle_store', 'Unit')
+    QualityCheck = apps.get_model('pootle_store', 'QualityCheck')
+
+    flags = get_check_flags()
+    check_flags = {}
+    checks = QualityCheck.objects.filter(false_positive=False,
+                                         name__in=flags.keys()) \
+                                 .values_list('unit', 'name')
+    for unit_id, name in checks.iterator():
+        check_flags[unit_id] = check_flags.get(unit_id, 0) | flags[name]
+
+    Unit.objects.exclude(check_flags=0).update(check_flags=0)
+
+    units_by_flags = {}
+    for unit_id, unit_check_flags in check_flags.iteritems():
+        units_by_flags.setdefault(unit_check_flags, []).append(unit_id)
+
+    for unit_check_flags, unit_ids in units_by_flags.iteritems():
+        for i in range(0, len(unit_ids), 500):
+            Unit.objects.filter(id__in=unit_ids[i:i+500]) \
+                        .update(check_flags=unit_check_flags)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pootle_store', '0007_tmunit'),
+    ]
+
+    operations = [
+        migrations.RunPython(update_check_flags),
+    ]
@@ -15,9 +15,12 @@ from hashlib import md5
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
 from django.db import models, transaction, IntegrityError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.template.defaultfilters import escape, truncatechars
 from django.utils import dateformat, timezone
 from django.utils.functional import cached_property
@@ -28,6 +31,7 @@ from django.utils.translation import ugettext_lazy as _
 from translate.filters.decorators import Category
 from translate.storage import base
 
+from pootle.core.cache import make_method_key
 from pootle.core.log import (TRANSLATION_ADDED, TRANSLATION_CHANGED,
                              TRANSLATION_DELETED, UNIT_ADDED, UNIT_DELETED,
                              UNIT_OBSOLETE, UNIT_RESURRECTED,
@@ -42,7 +46,8 @@ from pootle.core.tmserver import (update as update_tmserver,
 from pootle.core.url_helpers import get_editor_filter, split_pootle_path
 from pootle.core.utils.timezone import make_aware
 from pootle_misc.aggregate import max_column
-from pootle_misc.checks import check_names, run_given_filters, get_checker
+from pootle_misc.checks import (check_names, get_checker, get_check_flags,
+                                run_given_filters)
 from pootle_misc.util import datetime_min, import_func
 from pootle_statistics.models import (SubmissionFields,
                                       SubmissionTypes, Submission)
@@ -50,6 +55,9 @@ from pootle_statistics.models import (SubmissionFields,
 from .fields import (TranslationStoreField, MultiStringField,
                      PLURAL_PLACEHOLDER, SEPARATOR)
 from .filetypes import factory_classes
+from .fuzzy_index import FuzzyIndex
+from .search_index import get_search_index
+from .trigram_index import trigram_index
 from .util import (calc_total_wordcount, calc_translated_wordcount,
                    calc_fuzzy_wordcount, OBSOLETE, UNTRANSLATED,
                    FUZZY, TRANSLATED, get_change_str)
@@ -70,6 +78,13 @@ PARSED = 1
 CHECKED = 2
 
 
+def get_timeline_cache_key(unit_id, submission_id):
+    """Return the cache key of the timeline of the unit `unit_id`, as of its
+    latest submission `submission_id`."""
+    return make_method_key('Unit', 'timeline',
+                           '%s:%s' % (unit_id, submission_id))
+
+
 ############### Quality Check #############
 
 class QualityCheckManager(models.Manager):
@@ -104,8 +119,79 @@ class QualityCheck(models.Model):
     def delete_unknown_checks(cls):
         unknown_checks = QualityCheck.objects \
             .exclude(name__in=check_names.keys())
+
+        # Units flagged for any of these checks need their mask updated
+        flagged_unit_ids = list(
+            unknown_checks.filter(false_positive=False,
+                                  name__in=get_check_flags().keys())
+                          .values_list('unit', flat=True).distinct()
+        )
+
         unknown_checks.delete()
 
+        for unit in Unit.objects.filter(id__in=flagged_unit_ids).iterator():
+            unit.update_check_flags()
+
+################# UnitTrigram ################
+
+class UnitTrigram(models.Model):
+    """Posting of a trigram of the normalized source or target text of a
+    unit, used to narrow down substring searches."""
+    SOURCE = 0
+    TARGET = 1
+
+    FIELDS = {
+        'source': SOURCE,
+        'target': TARGET,
+    }
+
+    unit = models.ForeignKey("pootle_store.Unit", db_index=True)
+    field = models.PositiveSmallIntegerField()
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        index_together = [('trigram', 'field', 'unit')]
+
+    def __unicode__(self):
+        return self.trigram
+
+################# TMUnit ################
+
+class TMUnit(models.Model):
+    """Translation stored in the TM of the local TM engine.
+
+    Its primary key is the ID of the unit it was indexed from.
+    """
+    id = models.IntegerField(primary_key=True)
+    language = models.CharField(max_length=50)
+    source = models.TextField()
+    source_length = models.PositiveIntegerField()
+    target = models.TextField()
+    revision = models.IntegerField(default=0)
+    project = models.CharField(max_length=255, default='')
+    path = models.CharField(max_length=255, default='')
+    username = models.CharField(max_length=30, default='')
+    fullname = models.CharField(max_length=255, default='')
+    email_md5 = models.CharField(max_length=32, default='')
+
+    def __unicode__(self):
+        return self.source
+
+
+class TMTrigram(models.Model):
+    """Posting of a trigram of the normalized source text of a `TMUnit`,
+    used to find the TM candidates similar to a text."""
+    tm_unit = models.ForeignKey(TMUnit, db_index=True)
+    language = models.CharField(max_length=50)
+    source_length = models.PositiveIntegerField()
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        index_together = [('language', 'trigram', 'source_length')]
+
+    def __unicode__(self):
+        return self.trigram
+
 ################# Suggestion ################
 
 class SuggestionManager(models.Manager):
@@ -231,43 +317,34 @@ class UnitManager(models.Manager):
         """
         lang, proj, dir_path, filename = split_pootle_path(pootle_path)
 
+        # Lookups use the location columns denormalized on units rather than
+        # matching `pootle_path` with `LIKE` patterns through the store join
         units_qs = super(UnitManager, self).get_queryset().filter(
             state__gt=OBSOLETE,
-            store__translation_project__project__disabled=False,
+            project__disabled=False,
         )
 
+        # /<lang_code>/translate/*
+        if lang is not None:
+            units_qs = units_qs.filter(language__code=lang)
+
         # /projects/<project_code>/translate/*
-        if lang is None and proj is not None:
-            if dir_path and filename:
-                units_path = ''.join(['/%/', proj, '/', dir_path, filename])
-            elif dir_path:
-                units_path = ''.join(['/%/', proj, '/', dir_path, '%'])
-            elif filename:
-                units_path = ''.join(['/%/', proj, '/', filename])
-            else:
-                units_path = ''.join(['/%/', proj, '/%'])
-        # /projects/translate/*
-        elif lang is None and proj is None:
-            units_path = '/%'
         # /<lang_code>/<project_code>/translate/*
-        # /<lang_code>/translate/*
-        else:
-            units_path = ''.join([pootle_path, '%'])
+        if proj is not None:
+            units_qs = units_qs.filter(project__code=proj)
 
-        units_qs = units_qs.extra(
-            where=[
-                'pootle_store_store.pootle_path LIKE %s',
-                'pootle_store_store.pootle_path NOT LIKE %s',
-            ], params=[units_path, '/templates/%']
-        )
+            if filename:
+                units_qs = units_qs.filter(store_path=dir_path + filename)
+            elif dir_path:
+                units_qs = units_qs.filter(store_path__startswith=dir_path)
+
+        units_qs = units_qs.exclude(language__code='templates')
 
         # Non-superusers are limited to the projects they have access to
         if not user.is_superuser:
             from pootle_project.models import Project
             user_projects = Project.accessible_by_user(user)
-            units_qs = units_qs.filter(
-                store__translation_project__project__code__in=user_projects,
-            )
+            units_qs = units_qs.filter(project__code__in=user_projects)
 
         return units_qs
 
@@ -299,6 +376,25 @@ class Unit(models.Model, base.TranslationUnit):
     state = models.IntegerField(null=False, default=UNTRANSLATED, db_index=True)
     revision = models.IntegerField(null=False, default=0, db_index=True, blank=True)
 
+    # Denormalized data used by the editor filters
+    suggestion_count = models.PositiveIntegerField(default=0, db_index=True,
+                                                   editable=False)
+    check_flags = models.BigIntegerField(default=0, editable=False)
+    # Highest priority of the virtual folders the unit belongs to
+    priority = models.FloatField(default=1, db_index=True, editable=False)
+
+    # Denormalized location of the store, used to look units up by path
+    translation_project = models.ForeignKey(
+        "pootle_translationproject.TranslationProject", null=True,
+        editable=False, related_name='+')
+    project = models.ForeignKey("pootle_project.Project", null=True,
+                                editable=False, related_name='+')
+    language = models.ForeignKey("pootle_language.Language", null=True,
+                                 editable=False, related_name='+')
+    # Path of the store relative to its translation project
+    store_path = models.CharField(max_length=255, default='', db_index=True,
+                                  editable=False)
+
     # Metadata
     creation_time = models.DateTimeField(auto_now_add=True, db_index=True,
                                          editable=False, null=True)
@@ -326,6 +422,12 @@ class Unit(models.Model, base.TranslationUnit):
     class Meta:
         ordering = ['store', 'index']
         unique_together = ('store', 'unitid_hash')
+        index_together = [
+            ('translation_project', 'store_path'),
+            ('project', 'store_path'),
+            # Lookup of equivalent units in other languages
+            ('project', 'unitid_hash', 'store_path'),
+        ]
         get_latest_by = 'mtime'
 
     ############################ Properties ###################################
@@ -418,6 +520,8 @@ class Unit(models.Model, base.TranslationUnit):
             self._save_action = UNIT_ADDED
             self.store.mark_dirty(CachedMethods.WORDCOUNT_STATS,
                                   CachedMethods.LAST_UPDATED)
+            for field, value in self.store.get_units_location().iteritems():
+                setattr(self, field, value)
 
         if self._source_updated:
             # update source related fields
@@ -503,6 +607,19 @@ class Unit(models.Model, base.TranslationUnit):
             if self.istranslated():
                 self.update_tmserver()
 
+        unit_added = getattr(self, '_save_action', None) == UNIT_ADDED
+        if (self._source_updated or self._target_updated or
+            self._comment_updated or self._from_update_stores or unit_added):
+            self.update_search_index()
+
+        trigram_fields = []
+        if self._source_updated or unit_added:
+            trigram_fields.append('source')
+        if self._target_updated or unit_added:
+            trigram_fields.append('target')
+        if trigram_fields and trigram_index.exists():
+            trigram_index.index_units([self], fields=trigram_fields)
+
         # done processing source/target update remove flag
         self._source_updated = False
         self._target_updated = False
@@ -805,6 +922,7 @@ class Unit(models.Model, base.TranslationUnit):
             if existing:
                 self.store.mark_dirty(CachedMethods.CHECKS)
                 self.qualitycheck_set.all().delete()
+                self.update_check_flags()
                 return True
 
             return False
@@ -841,7 +959,24 @@ class Unit(models.Model, base.TranslationUnit):
             self.store.mark_dirty(CachedMethods.CHECKS)
             self.qualitycheck_set.filter(name__in=existing).delete()
 
-        return result or bool(unmute_list) or bool(existing)
+        changed = result or bool(unmute_list) or bool(existing)
+        if changed:
+            self.update_check_flags()
+
+        return changed
+
+    def update_check_flags(self):
+        """Update the mask of active quality checks of the unit."""
+        flags = get_check_flags()
+        check_flags = 0
+        for name in self.get_active_qualitychecks() \
+                        .values_list('name', flat=True):
+            check_flags |= flags.get(name, 0)
+
+        if check_flags != self.check_flags:
+            self.check_flags = check_flags
+            Unit.simple_objects.filter(id=self.id) \
+                               .update(check_flags=check_flags)
 
     def get_qualitychecks(self):
         return self.qualitycheck_set.all()
@@ -851,7 +986,8 @@ class Unit(models.Model, base.TranslationUnit):
 
 ##################### TranslationUnit ############################
 
-    def update_tmserver(self):
+    def get_tmserver_doc(self):
+        """Return the document indexing this unit in the TM server."""
         obj = {
             'id': self.id,
             # 'revision' must be an integer for statistical queries to work
@@ -872,11 +1008,20 @@ class Unit(models.Model, base.TranslationUnit):
                 'email_md5': md5(self.submitted_by.email).hexdigest(),
             })
 
-        update_tmserver(self.store.translation_project.language.code, obj)
+        return obj
+
+    def update_tmserver(self):
+        update_tmserver(self.store.translation_project.language.code,
+                        self.get_tmserver_doc())
 
     def get_tm_suggestions(self):
         return get_tmsuggestions(self)
 
+    def update_search_index(self):
+        search_index = get_search_index()
+        if search_index is not None and search_index.exists():
+            search_index.index_units([self])
+
 ##################### TranslationUnit ############################
 
     def getnotes(self, origin=None):
@@ -1070,6 +1215,14 @@ class Unit(models.Model, base.TranslationUnit):
     def get_suggestions(self):
         return self.suggestion_set.pending().select_related('user').all()
 
+    def update_suggestion_count(self):
+        """Update the number of pending suggestions of the unit."""
+        suggestion_count = self.suggestion_set.pending().count()
+        if suggestion_count != self.suggestion_count:
+            self.suggestion_count = suggestion_count
+            Unit.simple_objects.filter(id=self.id) \
+                               .update(suggestion_count=suggestion_count)
+
     def add_suggestion(self, translation, user=None, touch=True,
                        similarity=None, mt_similarity=None):
         """Adds a new suggestion to the unit.
@@ -1126,6 +1279,7 @@ class Unit(models.Model, base.TranslationUnit):
             )
             sub.save()
 
+            self.update_suggestion_count()
             self.store.mark_dirty(CachedMethods.SUGGESTIONS,
                                   CachedMethods.LAST_ACTION)
             if touch:
@@ -1184,6 +1338,7 @@ class Unit(models.Model, base.TranslationUnit):
         self.reviewed_on = self.submitted_on
         self._log_user = reviewer
 
+        self.update_suggestion_count()
         self.store.mark_dirty(CachedMethods.SUGGESTIONS,
                               CachedMethods.LAST_ACTION)
         # Update timestamp
@@ -1210,6 +1365,7 @@ class Unit(models.Model, base.TranslationUnit):
         )
         sub.save()
 
+        self.update_suggestion_count()
         self.store.mark_dirty(CachedMethods.SUGGESTIONS,
                               CachedMethods.LAST_ACTION)
         # Update timestamp
@@ -1224,6 +1380,7 @@ class Unit(models.Model, base.TranslationUnit):
 
         check.false_positive = false_positive
         check.save()
+        self.update_check_flags()
 
         self.store.mark_dirty(CachedMethods.CHECKS,
                               CachedMethods.LAST_ACTION)
@@ -1293,6 +1450,48 @@ class Unit(models.Model, base.TranslationUnit):
 fs = PootleFileSystemStorage()
 
 
+def calc_wordcount_stats(units):
+    """Return the full wordcount statistics of `units`."""
+    ret = {
+        'total': 0,
+        'translated': 0,
+        'fuzzy': 0
+    }
+    res = units.order_by().values('state') \
+               .annotate(wordcount=models.Sum('source_wordcount'))
+    for item in res:
+        ret['total'] += item['wordcount']
+        if item['state'] == TRANSLATED:
+            ret['translated'] += item['wordcount']
+        elif item['state'] == FUZZY:
+            ret['fuzzy'] += item['wordcount']
+
+    return ret
+
+
+def calc_check_stats(checks):
+    """Return the quality check statistics from the `checks` queryset."""
+    queryset = checks.values('unit', 'name', 'category') \
+                     .order_by('unit', '-category')
+
+    saved_unit = None
+    result = {
+        'unit_critical_error_count': 0,
+        'checks': {},
+    }
+    for item in queryset:
+        if item['unit'] != saved_unit or saved_unit is None:
+            saved_unit = item['unit']
+            if item['category'] == Category.CRITICAL:
+                result['unit_critical_error_count'] += 1
+        if item['name'] in result['checks']:
+            result['checks'][item['name']] += 1
+        else:
+            result['checks'][item['name']] = 1
+
+    return result
+
+
 class StoreManager(models.Manager):
     use_for_related_fields = True
 
@@ -1396,6 +1595,8 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
 
     def __init__(self, *args, **kwargs):
         super(Store, self).__init__(*args, **kwargs)
+        self._original_location = (self.__dict__.get('pootle_path'),
+                                    self.__dict__.get('translation_project_id'))
 
     def __unicode__(self):
         return unicode(self.pootle_path)
@@ -1413,6 +1614,11 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
         if created:
             store_log(user='system', action=STORE_ADDED,
                       path=self.pootle_path, store=self.id)
+        elif self._original_location != (self.pootle_path,
+                                         self.translation_project_id):
+            self.unit_set.update(**self.get_units_location())
+        self._original_location = (self.pootle_path,
+                                   self.translation_project_id)
 
         if hasattr(self, '_units'):
             index = self.max_index() + 1
@@ -1468,6 +1674,17 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
             get_editor_filter(**kwargs),
         ])
 
+    def get_units_location(self):
+        """Return the location fields denormalized on the units of this
+        store, keyed by field name."""
+        tp = self.translation_project
+        return {
+            'translation_project_id': tp.id,
+            'project_id': tp.project_id,
+            'language_id': tp.language_id,
+            'store_path': self.pootle_path[len(tp.pootle_path):],
+        }
+
     def require_units(self):
         """Make sure file is parsed and units are created."""
         if self.state < PARSED and self.unit_set.count() == 0:
@@ -1489,18 +1706,29 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                 yield unit
 
     def get_matcher(self):
-        """builds a TM matcher from current translations and obsolete units"""
-        from translate.search import match
-        #FIXME: should we cache this?
-        matcher = match.matcher(
-            self,
-            max_candidates=1,
-            max_length=settings.FUZZY_MATCH_MAX_LENGTH,
-            min_similarity=settings.FUZZY_MATCH_MIN_SIMILARITY,
-            usefuzzy=True
-        )
-        matcher.extendtm(self.unit_set.filter(state=OBSOLETE))
-        matcher.addpercentage = False
+        """Returns a fuzzy index of current translations and obsolete units.
+
+        Indexes are cached until the store's units get a new revision or
+        are updated from disk. Each store has a single cache entry, which
+        is replaced when the index gets rebuilt.
+        """
+        cache_key = make_method_key(self, 'get_matcher', str(self.pk))
+        version = (self.get_max_unit_revision(), self.file_mtime)
+
+        cached = cache.get(cache_key)
+        if cached is not None:
+            revision, file_mtime, matcher = cached
+            if (revision, file_mtime) == version:
+                return matcher
+
+        matcher = FuzzyIndex(settings.FUZZY_MATCH_MAX_LENGTH,
+                             settings.FUZZY_MATCH_MIN_SIMILARITY)
+        units = self.unit_set.filter(target_length__gt=0)
+        matcher.extend(units.filter(state__gt=OBSOLETE).iterator())
+        matcher.extend(units.filter(state=OBSOLETE).iterator())
+        cache.set(cache_key, version + (matcher, ),
+                  settings.OBJECT_CACHE_TIMEOUT)
+
         return matcher
 
     def clean_stale_lock(self):
@@ -1574,13 +1802,47 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
             self.save()
             return
 
-    def _remove_obsolete(self, source):
-        """Removes an obsolete unit from the DB. This will usually be used
-        after fuzzy matching.
+    def _remove_obsolete(self, sources):
+        """Removes an obsolete unit from the DB for each of `sources`. This
+        will usually be used after fuzzy matching.
         """
-        obsolete_unit = self.findunit(source, obsolete=True)
-        if obsolete_unit:
-            obsolete_unit.delete()
+        source_hashes = [md5(source.encode("utf-8")).hexdigest()
+                         for source in sources]
+        if not source_hashes:
+            return
+
+        obsolete_units = {}
+        units = self.unit_set.filter(state=OBSOLETE,
+                                     source_hash__in=set(source_hashes))
+        for unit in units.iterator():
+            obsolete_units.setdefault(unit.source_hash, []).append(unit)
+
+        removed_units = []
+        for source_hash in source_hashes:
+            if obsolete_units.get(source_hash):
+                removed_units.append(obsolete_units[source_hash].pop(0))
+
+        if not removed_units:
+            return
+
+        lang = self.translation_project.language.code
+        for unit in removed_units:
+            action_log(user='system', action=UNIT_DELETED, lang=lang,
+                       unit=unit.id, translation='', path=self.pootle_path)
+
+        # Same as `Unit.flag_store_before_going_away()`, for all the units
+        # at once
+        self.mark_dirty(CachedMethods.WORDCOUNT_STATS,
+                        CachedMethods.LAST_ACTION,
+                        CachedMethods.LAST_UPDATED)
+        removed_ids = [unit.id for unit in removed_units]
+        if Suggestion.objects.pending().filter(unit__in=removed_ids).exists():
+            self.mark_dirty(CachedMethods.SUGGESTIONS)
+        if QualityCheck.objects.filter(unit__in=removed_ids,
+                                       false_positive=False).exists():
+            self.mark_dirty(CachedMethods.CHECKS)
+
+        Unit.objects.filter(id__in=removed_ids).delete()
 
     def get_file_mtime(self):
         disk_mtime = datetime.datetime \
@@ -1644,6 +1906,8 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
 
             if fuzzy:
                 matcher = self.get_matcher()
+                # Sources of the obsolete units used for fuzzy matching
+                matched_sources = []
 
             # Force a rebuild of the unit ID <-> DB ID index and get IDs for
             # in-DB (old) and on-disk (new) stores
@@ -1681,7 +1945,7 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                     if match_unit:
                         newunit._from_update_stores = True
                         newunit.save()
-                        self._remove_obsolete(match_unit.source)
+                        matched_sources.append(match_unit.source)
 
             common_dbids = set(self.dbid_index.get(uid)
                                for uid in old_ids & new_ids)
@@ -1703,6 +1967,11 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                 # keep them safe
                 common_dbids -= modified_units
 
+            # Submissions which don't affect scores are created in bulk once
+            # all the units have been updated
+            submissions = []
+            current_time = timezone.now()
+
             common_dbids = list(common_dbids)
             for unit in self.findid_bulk(common_dbids):
                 # Use the same (parent) object since units will accumulate
@@ -1725,12 +1994,11 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                     match_unit = unit.fuzzy_translate(matcher)
                     if match_unit:
                         changed = True
-                        self._remove_obsolete(match_unit.source)
+                        matched_sources.append(match_unit.source)
 
                 if changed:
                     changes['updated'] += 1
                     create_subs = {}
-                    current_time = timezone.now()
 
                     if unit._target_updated:
                         create_subs[SubmissionFields.TARGET] = \
@@ -1759,9 +2027,11 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                             old_value=create_subs[field][0],
                             new_value=create_subs[field][1]
                         )
-                        # FIXME: we can store these objects in a list and
-                        # `bulk_create()` them in a single go
-                        sub.save()
+                        # Score logs need the unit as it was before saving
+                        if sub.needs_scorelog():
+                            sub.save()
+                        else:
+                            submissions.append(sub)
 
                     # Set unit fields if target was updated
                     if SubmissionFields.TARGET in create_subs:
@@ -1772,6 +2042,11 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
 
                     unit.save()
 
+            Submission.objects.bulk_create(submissions)
+
+            if fuzzy:
+                self._remove_obsolete(matched_sources)
+
             self.file_mtime = disk_mtime
 
         finally:
@@ -1784,29 +2059,65 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                     self.get_max_unit_revision())
                 )
 
+    def is_po(self):
+        from translate.storage import po
+        return issubclass(self.get_file_class(), po.pofile)
+
+    def get_serialize_version(self):
+        """Return the version of the cached serialization of this store,
+        changing whenever its units or its on-disk file change."""
+        mtime = int(dateformat.format(self.file_mtime, "U"))
+        return "%d.%d" % (mtime, self.get_max_unit_revision())
+
+    def iterserialize(self):
+        """Yield the serialized store in chunks.
+
+        PO stores are written straight from the database, unless their
+        on-disk file holds data the database doesn't keep. Other formats
+        are rendered from their on-disk file."""
+        if self.is_po():
+            from .serializers import can_serialize_po, iterserialize_po
+            if can_serialize_po(self):
+                for chunk in iterserialize_po(self):
+                    yield chunk
+                return
+
+        path = self.pootle_path
+        self.file.store.updateheader(add=True, X_Pootle_Path=path)
+        rev = self.get_max_unit_revision()
+        self.file.store.updateheader(add=True, X_Pootle_Revision=rev)
+        yield str(self.file.store)
+
     def serialize(self):
         from django.core.cache import caches
         cache = caches["exports"]
-        mtime = int(dateformat.format(self.file_mtime, "U"))
+        version = self.get_serialize_version()
         path = self.pootle_path
 
-        ret = cache.get(path, version=mtime)
+        ret = cache.get(path, version=version)
         if not ret:
-            self.file.store.updateheader(add=True, X_Pootle_Path=path)
-            rev = self.get_max_unit_revision()
-            self.file.store.updateheader(add=True, X_Pootle_Revision=rev)
-            ret = str(self.file.store)
-            cache.set(path, ret, version=mtime)
+            ret = "".join(self.iterserialize())
+            cache.set(path, ret, version=version)
 
         return ret
 
     def sync(self, update_structure=False, conservative=True,
-             user=None, skip_missing=False, only_newer=True):
-        """Sync file with translations from DB."""
+             user=None, skip_missing=False, only_newer=True,
+             last_revision=None, modified_units=None, writer=None):
+        """Sync file with translations from DB.
+
+        :param last_revision: The maximum revision of the store units, if
+            already known.
+        :param modified_units: Units modified after the last sync, if
+            already known. Only used when syncing conservatively.
+        :param writer: A :class:`~pootle_store.fields.StoreFileWriter` to
+            save the file with. If unset, the file is saved synchronously.
+        """
         if skip_missing and not self.file.exists():
             return
 
-        last_revision = self.get_max_unit_revision()
+        if last_revision is None:
+            last_revision = self.get_max_unit_revision()
 
         #TODO only_newer -> not force
         if (only_newer and
@@ -1844,10 +2155,8 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
             return
 
         logging.info(u"Syncing %s", self.pootle_path)
-        self.require_dbid_index(update=True)
         disk_store = self.file.store
         old_ids = set(disk_store.getids())
-        new_ids = set(self.dbid_index.keys())
 
         file_changed = False
         changes = {
@@ -1857,6 +2166,10 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
             'added': 0,
         }
 
+        if update_structure or not conservative or modified_units is None:
+            self.require_dbid_index(update=True)
+            new_ids = set(self.dbid_index.keys())
+
         if update_structure:
             obsolete_units = (disk_store.findid(uid)
                               for uid in old_ids - new_ids)
@@ -1880,28 +2193,36 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                 changes['added'] += 1
                 file_changed = True
 
-        # Get units modified after last sync and before this sync started
-        filter_by = {
-            'revision__lte': last_revision,
-            'store': self,
-        }
-        # Sync all units if first sync
-        if self.last_sync_revision is not None:
-            filter_by.update({'revision__gt': self.last_sync_revision})
+        if conservative and modified_units is not None:
+            # Prefetched units are not obsolete, so they are all in the DB
+            # index already
+            units = [unit for unit in modified_units
+                     if unit.getid() in old_ids]
+        else:
+            # Get units modified after last sync and before this sync started
+            filter_by = {
+                'revision__lte': last_revision,
+                'store': self,
+            }
+            # Sync all units if first sync
+            if self.last_sync_revision is not None:
+                filter_by.update({'revision__gt': self.last_sync_revision})
 
-        modified_units = set(Unit.objects.filter(**filter_by)
-                                 .values_list('id', flat=True).distinct())
+            modified_dbids = set(Unit.objects.filter(**filter_by)
+                                     .values_list('id', flat=True).distinct())
 
-        common_dbids = set(self.dbid_index.get(uid)
-                           for uid in old_ids & new_ids)
+            common_dbids = set(self.dbid_index.get(uid)
+                               for uid in old_ids & new_ids)
 
-        if conservative:
-            # Sync only modified units
-            common_dbids &= modified_units
+            if conservative:
+                # Sync only modified units
+                common_dbids &= modified_dbids
 
-        common_dbids = list(common_dbids)
+            units = self.findid_bulk(list(common_dbids))
 
-        for unit in self.findid_bulk(common_dbids):
+        for unit in units:
+            # Use the same (parent) object to avoid querying it again
+            unit.store = self
             match = disk_store.findid(unit.getid())
             if match is not None:
                 changed = unit.sync(match)
@@ -1909,17 +2230,26 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                     changes['updated'] += 1
                     file_changed = True
 
+        def finish_sync():
+            self.file_mtime = self.get_file_mtime()
+            log(u"[sync] File saved; %s units in %s [revision: %d]" %
+                (get_change_str(changes), self.pootle_path, last_revision))
+
+            self.last_sync_revision = last_revision
+            self.save()
+
         #TODO conservative -> not overwrite
         if file_changed or not conservative:
             self.update_store_header(user=user)
-            self.file.savestore()
-            self.file_mtime = self.get_file_mtime()
+            if writer is None:
+                self.file.savestore()
+                finish_sync()
+            else:
+                writer.write(self.file, finish_sync)
+            return
 
-            log(u"[sync] File saved; %s units in %s [revision: %d]" %
-                (get_change_str(changes), self.pootle_path, last_revision))
-        else:
-            logging.info(u"[sync] nothing changed in %s [revision: %d]" %
-                          (self.pootle_path, last_revision))
+        logging.info(u"[sync] nothing changed in %s [revision: %d]" %
+                      (self.pootle_path, last_revision))
 
         self.last_sync_revision = last_revision
         self.save()
@@ -2042,47 +2372,15 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
 
     def _get_wordcount_stats(self):
         """calculate full wordcount statistics"""
-        ret = {
-            'total': 0,
-            'translated': 0,
-            'fuzzy': 0
-        }
-        res = self.units.values('state') \
-                        .annotate(wordcount=models.Sum('source_wordcount'))
-        for item in res:
-            ret['total'] += item['wordcount']
-            if item['state'] == TRANSLATED:
-                ret['translated'] = item['wordcount']
-            elif item['state'] == FUZZY:
-                ret['fuzzy'] = item['wordcount']
-
-        return ret
+        return calc_wordcount_stats(self.units)
 
     def _get_checks(self):
         try:
-            queryset = QualityCheck.objects.filter(unit__store=self,
-                                                   unit__state__gt=UNTRANSLATED,
-                                                   false_positive=False)
-
-            queryset = queryset.values('unit', 'name', 'category') \
-                               .order_by('unit', '-category')
-
-            saved_unit = None
-            result = {
-                'unit_critical_error_count': 0,
-                'checks': {},
-            }
-            for item in queryset:
-                if item['unit'] != saved_unit or saved_unit is None:
-                    saved_unit = item['unit']
-                    if item['category'] == Category.CRITICAL:
-                        result['unit_critical_error_count'] += 1
-                if item['name'] in result['checks']:
-                    result['checks'][item['name']] += 1
-                else:
-                    result['checks'][item['name']] = 1
-
-            return result
+            return calc_check_stats(QualityCheck.objects.filter(
+                unit__store=self,
+                unit__state__gt=UNTRANSLATED,
+                false_positive=False,
+            ))
         except Exception as e:
             logging.info(u"Error getting quality checks for %s\n%s",
                          self.name, e)
@@ -2137,6 +2435,18 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
         languages and projects. For stores do nothing"""
         return
 
+    def update_dirty_cache(self):
+        """Also update the same dirty cached stats of the virtual folders
+        having units in this store."""
+        if self._dirty_cache and 'virtualfolder' in settings.INSTALLED_APPS:
+            from virtualfolder.models import VirtualFolderTreeItem
+
+            for vf_treeitem in VirtualFolderTreeItem.get_for_store(self):
+                vf_treeitem.mark_dirty(*self._dirty_cache)
+                vf_treeitem.update_dirty_cache()
+
+        super(Store, self).update_dirty_cache()
+
     ### /TreeItem
 
 
@@ -2197,3 +2507,28 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
             if language.nplurals and language.pluralequation:
                 disk_store.updateheaderplural(language.nplurals,
                                               language.pluralequation)
+
+
+@receiver(post_delete, sender=Unit)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop the full-text index entry of the deleted unit `instance`."""
+    search_index = get_search_index()
+    if search_index is not None and search_index.exists():
+        search_index.remove_units([instance.id])
+
+
+@receiver(post_save, sender=Submission)
+def invalidate_timeline_cache(sender, instance, created, **kwargs):
+    """Drop the cached timeline of the unit `instance` was submitted for.
+
+    Timelines are keyed by the latest submission of the unit, so a new one
+    already makes the cached entry stale; this only frees it earlier.
+    """
+    if instance.unit_id is None:
+        return
+
+    submissions = Submission.objects.filter(unit=instance.unit_id)
+    if created:
+        submissions = submissions.filter(id__lt=instance.id)
+    latest_id = max_column(submissions, 'id', 0)
+    cache.delete(get_timeline_cache_key(instance.unit_id, latest_id))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Server-side result sets of the editor's unit queries.
+
+The sorted IDs of the units matching a filter are stored once in Redis as a
+sorted set (member: unit ID, score: position), so that the browser can page
+through them in windows and look up the position of a unit without running
+the query again.
+"""
+
+import hashlib
+import json
+
+from django_rq import get_connection
+
+from pootle.core.models import Revision
+
+
+RESULT_SET_PREFIX = "pootle:resultset:"
+
+# Result sets expire after this many seconds without being accessed
+RESULT_SET_TIMEOUT = 30 * 60
+
+# Number of IDs sent to the browser on each side of the cursor
+RESULT_SET_WINDOW = 500
+
+# GET parameters used for paging, which don't change the result set
+PAGING_PARAMS = ("initial", "uids", "count", "offset", "resultset", "_")
+
+# Number of members added to Redis per command when building a result set
+ZADD_CHUNK_SIZE = 1000
+
+
+def get_result_set_key(request, pootle_path):
+    """Return the result set key for the unit query described by
+    `request` on `pootle_path`.
+
+    The key accounts for the path, filter and sort parameters, the user
+    (who determines the visible projects and the `my-*` filters) and the
+    current revision, so any change to units leads to a new result set.
+    """
+    params = sorted((key, sorted(values))
+                    for key, values in request.GET.lists()
+                    if key not in PAGING_PARAMS)
+    data = json.dumps([pootle_path, params, request.profile.id,
+                       Revision.get()])
+    return hashlib.sha1(data).hexdigest()
+
+
+class ResultSet(object):
+    """Sorted list of unit IDs stored in Redis under `key`."""
+
+    def __init__(self, key):
+        self.key = key
+        self.r_con = get_connection()
+
+    @property
+    def redis_key(self):
+        return RESULT_SET_PREFIX + self.key
+
+    def exists(self):
+        return self.r_con.expire(self.redis_key, RESULT_SET_TIMEOUT)
+
+    def store(self, uids):
+        """Store the list of `uids`, replacing any previous contents.
+
+        Empty lists aren't stored, since Redis has no empty sorted sets.
+        """
+        tmp_key = self.redis_key + ":tmp"
+        pipe = self.r_con.pipeline()
+        pipe.delete(tmp_key)
+        for begin in range(0, len(uids), ZADD_CHUNK_SIZE):
+            args = []
+            for position, uid in enumerate(uids[begin:begin+ZADD_CHUNK_SIZE],
+                                           begin):
+                args.extend((position, uid))
+            pipe.execute_command("ZADD", tmp_key, *args)
+
+        if uids:
+            pipe.rename(tmp_key, self.redis_key)
+            pipe.expire(self.redis_key, RESULT_SET_TIMEOUT)
+        pipe.execute()
+
+    def count(self):
+        return self.r_con.zcard(self.redis_key)
+
+    def index(self, uid):
+        """Return the position of `uid` in the result set, or `None`."""
+        position = self.r_con.zscore(self.redis_key, uid)
+        if position is None:
+            return None
+
+        return int(position)
+
+    def slice(self, begin, end):
+        """Return the unit IDs from position `begin` up to `end`, not
+        included."""
+        begin = max(begin, 0)
+        if end <= begin:
+            return []
+
+        return map(int, self.r_con.zrange(self.redis_key, begin, end - 1))
+
+    def window(self, position, size=RESULT_SET_WINDOW):
+        """Return the `(offset, uids)` window of IDs around `position`."""
+        begin = max(position - size, 0)
+        return begin, self.slice(begin, position + size + 1)
+
+
+def get_result_set(request, pootle_path, get_uids, key=None):
+    """Return the result set of the unit query described by `request`,
+    calling `get_uids` to run the query only if it isn't stored yet.
+
+    :param key: key of a result set retrieved earlier. If it expired, a new
+        result set is built for the current state of the request.
+    """
+    if key:
+        result_set = ResultSet(key)
+        if result_set.exists():
+            return result_set
+
+    result_set = ResultSet(get_result_set_key(request, pootle_path))
+    if not result_set.exists():
+        result_set.store(get_uids())
+
+    return result_set
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Full-text index of units for the editor search.
+
+The index lives in its own table, using the full-text features of the
+database backend: an FTS4 virtual table on SQLite, `tsvector` columns with
+GIN indexes on PostgreSQL and `FULLTEXT` indexes on MySQL.
+
+The table is created by the `build_search_index` management command and kept
+up to date from `Unit.save()` and `Unit.delete()`. Searches fall back to
+`LIKE` queries when the index doesn't exist or can't answer a query.
+"""
+
+import logging
+import re
+
+from django.db import connection
+
+from django_rq import get_connection
+
+
+SEARCH_INDEX_TABLE = 'pootle_store_unit_search'
+
+#: Counter bumped whenever the index is built, so that processes which found
+#: no index check for it again
+SEARCH_INDEX_VERSION = 'pootle:search_index:version'
+
+#: Columns of the index, named after the search form's `sfields`
+SEARCH_FIELDS = ('source', 'target', 'notes', 'locations')
+
+# Only alphanumeric words can be looked up in the index: the backends split
+# text on punctuation, including underscores
+WORD_RE = re.compile(r'^[^\W_]+$', re.UNICODE)
+
+
+def get_unit_document(unit):
+    """Return the texts to index for `unit`, keyed by field."""
+    return {
+        'source': u'\n'.join(unit.source_f.strings),
+        'target': u'\n'.join(unit.target_f.strings),
+        'notes': u'\n'.join(filter(None, [unit.translator_comment,
+                                          unit.developer_comment])),
+        'locations': unit.locations or u'',
+    }
+
+
+class SearchIndex(object):
+    """Base class of the backend-specific search indexes."""
+
+    #: Words shorter than this aren't indexed by the backend
+    min_word_length = 1
+
+    #: Name of the column holding the unit ID
+    id_column = 'unit_id'
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._exists = None
+        self._version = None
+
+    def exists(self):
+        """Whether the index table exists. Once found, the table is assumed
+        to exist for the lifetime of the process; otherwise it's looked up
+        again whenever the index gets built."""
+        if self._exists:
+            return True
+
+        version = get_connection().get(SEARCH_INDEX_VERSION)
+        if self._exists is None or version != self._version:
+            cursor = self.connection.cursor()
+            table_names = self.connection.introspection.table_names(cursor)
+            self._exists = SEARCH_INDEX_TABLE in table_names
+            self._version = version
+
+        return self._exists
+
+    def reset(self):
+        self._exists = None
+
+    def mark_built(self):
+        """Let other processes know the index has been built."""
+        get_connection().incr(SEARCH_INDEX_VERSION)
+
+    def get_create_sql(self):
+        raise NotImplementedError
+
+    def create(self):
+        """Create the (empty) index, dropping any previous one."""
+        cursor = self.connection.cursor()
+        if self.exists():
+            cursor.execute('DROP TABLE %s' % SEARCH_INDEX_TABLE)
+        for sql in self.get_create_sql():
+            cursor.execute(sql)
+        self._exists = True
+
+    def get_insert_sql(self):
+        return 'INSERT INTO %s (%s, %s) VALUES (%%s, %s)' % (
+            SEARCH_INDEX_TABLE, self.id_column, ', '.join(SEARCH_FIELDS),
+            ', '.join(['%s'] * len(SEARCH_FIELDS)),
+        )
+
+    def index_units(self, units, replace=True):
+        """Add the index entries of `units`.
+
+        :param replace: whether to remove existing entries for `units`
+            first. Not needed when building the index from scratch.
+        """
+        units = list(units)
+        if not units:
+            return
+
+        if replace:
+            self.remove_units([unit.id for unit in units])
+
+        rows = []
+        for unit in units:
+            document = get_unit_document(unit)
+            rows.append([unit.id] + [document[field]
+                                     for field in SEARCH_FIELDS])
+        self.connection.cursor().executemany(self.get_insert_sql(), rows)
+
+    def remove_units(self, unit_ids):
+        unit_ids = list(unit_ids)
+        if not unit_ids:
+            return
+
+        self.connection.cursor().execute(
+            'DELETE FROM %s WHERE %s IN (%s)' % (
+                SEARCH_INDEX_TABLE, self.id_column,
+                ', '.join(['%s'] * len(unit_ids)),
+            ), unit_ids
+        )
+
+    def get_match_sql(self, field, words):
+        """Return the `(sql, params)` selecting the IDs of the units whose
+        `field` contains all `words`, as words or word prefixes."""
+        raise NotImplementedError
+
+    def can_search(self, words):
+        return (self.exists() and words and
+                all(WORD_RE.match(word) and
+                    len(word) >= self.min_word_length for word in words))
+
+    def filter(self, queryset, words, fields):
+        """Narrow `queryset` down to units with all `words` in any of
+        `fields`.
+
+        :return: the filtered queryset, or `None` if the index can't be
+            used for this search.
+        """
+        words = [word.lower() for word in words]
+        if not self.can_search(words):
+            return None
+
+        where = []
+        params = []
+        for field in SEARCH_FIELDS:
+            if field in fields:
+                sql, field_params = self.get_match_sql(field, words)
+                where.append('pootle_store_unit.id IN (%s)' % sql)
+                params.extend(field_params)
+
+        if not where:
+            return queryset.none()
+
+        return queryset.extra(where=['(%s)' % ' OR '.join(where)],
+                              params=params)
+
+
+class SQLiteSearchIndex(SearchIndex):
+    id_column = 'docid'
+
+    def get_create_sql(self):
+        return [
+            'CREATE VIRTUAL TABLE %s USING fts4(%s, tokenize=unicode61)' %
+            (SEARCH_INDEX_TABLE, ', '.join(SEARCH_FIELDS)),
+        ]
+
+    def get_match_sql(self, field, words):
+        query = u' '.join(u'%s:%s*' % (field, word) for word in words)
+        return ('SELECT docid FROM %s WHERE %s MATCH %%s' %
+                (SEARCH_INDEX_TABLE, SEARCH_INDEX_TABLE), [query])
+
+
+class PostgreSQLSearchIndex(SearchIndex):
+
+    def get_create_sql(self):
+        sql = [
+            'CREATE TABLE %s (unit_id integer PRIMARY KEY, %s)' % (
+                SEARCH_INDEX_TABLE,
+                ', '.join('%s tsvector' % field for field in SEARCH_FIELDS),
+            ),
+        ]
+        sql.extend(
+            'CREATE INDEX %s_%s ON %s USING gin(%s)' % (
+                SEARCH_INDEX_TABLE, field, SEARCH_INDEX_TABLE, field,
+            ) for field in SEARCH_FIELDS
+        )
+        return sql
+
+    def get_insert_sql(self):
+        return 'INSERT INTO %s (unit_id, %s) VALUES (%%s, %s)' % (
+            SEARCH_INDEX_TABLE, ', '.join(SEARCH_FIELDS),
+            ', '.join(["to_tsvector('simple', %s)"] * len(SEARCH_FIELDS)),
+        )
+
+    def get_match_sql(self, field, words):
+        query = u' & '.join(u'%s:*' % word for word in words)
+        return ("SELECT unit_id FROM %s WHERE %s @@ to_tsquery('simple', %%s)"
+                % (SEARCH_INDEX_TABLE, field), [query])
+
+
+class MySQLSearchIndex(SearchIndex):
+    # Default value of `innodb_ft_min_token_size`
+    min_word_length = 3
+
+    def get_create_sql(self):
+        return [
+            'CREATE TABLE %s (unit_id integer PRIMARY KEY, %s, %s) '
+            'ENGINE=InnoDB DEFAULT CHARSET=utf8' % (
+                SEARCH_INDEX_TABLE,
+                ', '.join('%s longtext' % field for field in SEARCH_FIELDS),
+                ', '.join('FULLTEXT (%s)' % field for field in SEARCH_FIELDS),
+            ),
+        ]
+
+    def get_match_sql(self, field, words):
+        query = u' '.join(u'+%s*' % word for word in words)
+        return ('SELECT unit_id FROM %s WHERE MATCH (%s) '
+                'AGAINST (%%s IN BOOLEAN MODE)' % (SEARCH_INDEX_TABLE, field),
+                [query])
+
+
+SEARCH_INDEXES = {
+    'sqlite': SQLiteSearchIndex,
+    'postgresql': PostgreSQLSearchIndex,
+    'mysql': MySQLSearchIndex,
+}
+
+_search_index = None
+
+
+def get_search_index():
+    """Return the search index for the database backend in use, or `None`
+    if the backend has no full-text support."""
+    global _search_index
+
+    if _search_index is None:
+        index_class = SEARCH_INDEXES.get(connection.vendor, None)
+        if index_class is None:
+            logging.debug(u"No search index for the %s database backend",
+                          connection.vendor)
+            return None
+        _search_index = index_class(connection)
+
+    return _search_index
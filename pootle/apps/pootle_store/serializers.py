@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Serialization of stores straight from the database.
+
+Building toolkit stores unit by unit and rendering them is the dominant cost
+of exports, so PO output is written here directly from ``Unit`` rows, one
+unit at a time, with the same quoting and layout the toolkit uses.
+
+The database doesn't keep PO flags other than ``fuzzy``, previous msgids or
+obsolete entries, so stores whose file carries any of them are still
+rendered from the on-disk file. Format flags such as ``c-format`` are the
+exception: they are regenerated by gettext tools, so they are dropped rather
+than preventing almost every extracted file from being written from the
+database.
+"""
+
+import os
+
+from translate.storage import po, pocommon
+from translate.storage.pypo import quoteforpo
+
+from pootle.core.parsepool import ParsePool
+
+from .fields import PLURAL_PLACEHOLDER, SEPARATOR
+from .util import FUZZY, OBSOLETE
+
+
+UNIT_FIELDS = ('source_f', 'target_f', 'context', 'locations',
+               'developer_comment', 'translator_comment', 'state')
+
+# Number of plural forms to write when the language doesn't define them
+DEFAULT_NPLURALS = 2
+
+#: Whether files hold data not kept in the database, keyed by path, along
+#: with the file mtime it was found for
+file_only_data = ParsePool('fileonlydata', 10000)
+
+
+def split_multistring(value):
+    """Return the list of strings stored in a `MultiStringField` database
+    value, and whether it is a plural."""
+    if not value:
+        return [u''], False
+
+    strings = value.split(SEPARATOR)
+    if strings[-1] == PLURAL_PLACEHOLDER:
+        return strings[:-1], True
+
+    return strings, len(strings) > 1
+
+
+def read_file_header(path):
+    """Parse the header of the PO file at `path` without parsing the rest
+    of the file.
+
+    :return: the header unit, or `None` if the file has no header.
+    """
+    lines = []
+    in_message = False
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                if in_message:
+                    break
+                continue
+
+            lines.append(line)
+            if not line.startswith('#'):
+                in_message = True
+
+    header_store = po.pofile(''.join(lines))
+    return header_store.header()
+
+
+def is_kept_flag(flag):
+    """Return whether the PO `flag` is either stored in the database or
+    safe to drop."""
+    return not flag or flag == 'fuzzy' or flag.endswith('-format')
+
+
+def has_file_only_data(path):
+    """Return whether the PO file at `path` holds data which is not stored
+    in the database: flags other than `fuzzy` and format flags, previous
+    msgids (``#|``) or obsolete units (``#~``)."""
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(('#|', '#~')):
+                return True
+
+            if line.startswith('#,'):
+                flags = [flag.strip() for flag in line[2:].split(',')]
+                if not all(is_kept_flag(flag) for flag in flags):
+                    return True
+
+    return False
+
+
+def can_serialize_po(store):
+    """Return whether `store` can be serialized from the database without
+    losing data kept in its on-disk file.
+
+    The file is only scanned again once it's modified.
+    """
+    if not store.file or not store.file.exists():
+        return True
+
+    path = store.file.path
+    mtime = os.path.getmtime(path)
+    cached = file_only_data.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, has_file_only_data(path))
+        file_only_data[path] = cached
+
+    return not cached[1]
+
+
+def get_header(store, revision):
+    """Return the serialized PO header for `store`."""
+    header_store = po.pofile()
+
+    header = None
+    if store.file and store.file.exists():
+        header = read_file_header(store.file.path)
+
+    if header is not None:
+        header_store.units = [header]
+    else:
+        language = store.translation_project.language
+        header_store.settargetlanguage(language.code)
+        if language.nplurals and language.pluralequation:
+            header_store.updateheaderplural(language.nplurals,
+                                            language.pluralequation)
+
+    # Output is always written as UTF-8. Fields are updated one at a time
+    # so new ones are appended in the same order the file-based output uses
+    header_store.updateheader(add=True,
+                              Content_Type='text/plain; charset=UTF-8')
+    header_store.updateheader(add=True, X_Pootle_Path=store.pootle_path)
+    header_store.updateheader(add=True, X_Pootle_Revision=revision)
+    return str(header_store)
+
+
+def _get_part(name, text):
+    polines = quoteforpo(text)
+    if not polines:
+        return u'%s ""\n' % name
+
+    return u'%s %s\n%s' % (name, polines[0],
+                           u''.join(line + u'\n' for line in polines[1:]))
+
+
+def serialize_unit(row, nplurals):
+    """Return the PO representation of a unit given as a `values()` row."""
+    lines = []
+
+    for field, prefix in (('translator_comment', u'# '),
+                          ('developer_comment', u'#. ')):
+        note = row[field]
+        if note and note.strip():
+            lines.extend(prefix + line + u'\n' for line in note.split(u'\n'))
+
+    for location in filter(None, (row['locations'] or u'').split(u'\n')):
+        if u' ' in location:
+            location = pocommon.quote_plus(location).decode('utf-8')
+        lines.append(u'#: %s\n' % location)
+
+    if row['state'] == FUZZY:
+        lines.append(u'#, fuzzy\n')
+
+    if row['context']:
+        lines.append(_get_part(u'msgctxt', row['context']))
+
+    source, is_plural = split_multistring(row['source_f'])
+    target = split_multistring(row['target_f'])[0]
+
+    lines.append(_get_part(u'msgid', source[0]))
+    if is_plural:
+        lines.append(_get_part(u'msgid_plural',
+                               source[1] if len(source) > 1 else u''))
+        target.extend([u''] * (nplurals - len(target)))
+        for i, text in enumerate(target):
+            lines.append(_get_part(u'msgstr[%d]' % i, text))
+    else:
+        lines.append(_get_part(u'msgstr', target[0]))
+
+    return u''.join(lines)
+
+
+def iterserialize_po(store, revision=None):
+    """Yield the PO serialization of `store` as UTF-8 encoded chunks, one
+    per unit, reading units straight from the database.
+
+    :param revision: the store revision to report in the header. If not
+        provided, it's retrieved from the database.
+    """
+    if revision is None:
+        revision = store.get_max_unit_revision()
+
+    nplurals = (store.translation_project.language.nplurals or
+                DEFAULT_NPLURALS)
+
+    yield get_header(store, revision)
+
+    rows = store.unit_set.filter(state__gt=OBSOLETE) \
+                         .order_by('index').values(*UNIT_FIELDS)
+    for row in rows.iterator():
+        yield (u'\n' + serialize_unit(row, nplurals)).encode('utf-8')
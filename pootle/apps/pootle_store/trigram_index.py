@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Trigram index of unit sources and targets.
+
+Word-based full-text indexes can't find substrings such as placeholders or
+markup (`%(count)s`, `{{name}}`). The trigrams of the lowercased source and
+target texts are stored as `UnitTrigram` postings, so that substring
+searches first look up the units having all the trigrams of the searched
+text, and only run `LIKE` comparisons against those candidates.
+
+The index is built by the `build_search_index` management command and kept
+up to date from `Unit.save()`.
+"""
+
+from django.db.models import Count
+
+from django_rq import get_connection
+
+
+#: Length of the indexed substrings
+N = 3
+
+#: Maximum number of trigrams looked up per searched text. Any subset of
+#: the trigrams still yields a superset of the matching units.
+MAX_TRIGRAMS = 32
+
+#: Counter bumped whenever the index is built, so that processes which found
+#: no index check for it again
+TRIGRAM_INDEX_VERSION = 'pootle:trigram_index:version'
+
+
+def normalize(text):
+    return text.lower()
+
+
+def get_trigrams(text):
+    """Return the set of trigrams of the normalized `text`."""
+    text = normalize(text)
+    return set(text[i:i+N] for i in range(len(text) - N + 1))
+
+
+def get_unit_texts(unit):
+    """Return the indexed texts of `unit`, keyed by field."""
+    return {
+        'source': u'\n'.join(unit.source_f.strings),
+        'target': u'\n'.join(unit.target_f.strings),
+    }
+
+
+class TrigramIndex(object):
+
+    def __init__(self):
+        self._exists = None
+        self._version = None
+
+    @property
+    def model(self):
+        from .models import UnitTrigram
+        return UnitTrigram
+
+    def exists(self):
+        """Whether the index has been built. Once found, the index is
+        assumed to exist for the lifetime of the process; otherwise it's
+        looked up again whenever the index gets built."""
+        if self._exists:
+            return True
+
+        version = get_connection().get(TRIGRAM_INDEX_VERSION)
+        if self._exists is None or version != self._version:
+            self._exists = self.model.objects.exists()
+            self._version = version
+
+        return self._exists
+
+    def reset(self):
+        self._exists = None
+
+    def mark_built(self):
+        """Let other processes know the index has been built."""
+        get_connection().incr(TRIGRAM_INDEX_VERSION)
+
+    def clear(self):
+        self.model.objects.all().delete()
+        self._exists = None
+
+    def index_units(self, units, fields=None, replace=True):
+        """Add the postings of `units` to the index.
+
+        :param fields: names of the fields to index, all of them by default.
+        :param replace: whether to remove existing postings for `units`
+            first. Not needed when building the index from scratch.
+        """
+        if fields is None:
+            fields = self.model.FIELDS.keys()
+        field_ids = [self.model.FIELDS[field] for field in fields]
+
+        units = list(units)
+        if not units or not field_ids:
+            return
+
+        if replace:
+            self.model.objects.filter(
+                unit__in=[unit.id for unit in units],
+                field__in=field_ids,
+            ).delete()
+
+        postings = []
+        for unit in units:
+            texts = get_unit_texts(unit)
+            for field in fields:
+                postings.extend(
+                    self.model(unit_id=unit.id, field=self.model.FIELDS[field],
+                               trigram=trigram)
+                    for trigram in get_trigrams(texts[field])
+                )
+        self.model.objects.bulk_create(postings)
+        self._exists = True
+
+    def can_search(self, text):
+        return len(text) >= N and self.exists()
+
+    def get_candidates(self, field, text):
+        """Return a queryset with the IDs of the units whose `field` has all
+        the trigrams of `text`.
+
+        Candidates are a superset of the units containing `text`, which
+        still need to be checked.
+        """
+        trigrams = sorted(get_trigrams(text))[:MAX_TRIGRAMS]
+        return self.model.objects.filter(
+            field=self.model.FIELDS[field],
+            trigram__in=trigrams,
+        ).values('unit').annotate(
+            trigram_count=Count('id'),
+        ).filter(
+            # Case and accent insensitive collations might merge trigrams
+            trigram_count__gte=len(trigrams),
+        ).values_list('unit', flat=True)
+
+    def filter(self, queryset, field, texts):
+        """Narrow `queryset` down to the candidate units having `texts` in
+        `field`, ignoring texts too short to be looked up.
+
+        Returns `queryset` unchanged if the index can't be used.
+        """
+        if field not in self.model.FIELDS:
+            return queryset
+
+        for text in texts:
+            if self.can_search(text):
+                queryset = queryset.filter(
+                    id__in=self.get_candidates(field, text),
+                )
+
+        return queryset
+
+
+trigram_index = TrigramIndex()
@@ -84,23 +84,67 @@ def calc_translated_wordcount(units):
     return translated['source_wordcount'] or 0
 
 
-def find_altsrcs(unit, alt_src_langs, store=None, project=None):
+#: Unit fields needed to display alternative sources
+ALTSRC_FIELDS = ('id', 'unitid_hash', 'store_path', 'source_f', 'target_f',
+                 'language')
+
+
+def _get_altsrcs_queryset(project, alt_src_langs):
+    """Return the translated units from `project` in `alt_src_langs`, with
+    only the fields needed to display them as alternative sources.
+
+    Lookups go through the `(project, unitid_hash, store_path)` index.
+    """
     from pootle_store.models import Unit
 
+    return Unit.simple_objects.filter(
+        project=project,
+        language__in=alt_src_langs,
+        state=TRANSLATED,
+    ).select_related('language').only(*ALTSRC_FIELDS)
+
+
+def find_altsrcs(unit, alt_src_langs, store=None, project=None):
     store = store or unit.store
     project = project or store.translation_project.project
 
-    altsrcs = Unit.objects.filter(
-                    unitid_hash=unit.unitid_hash,
-                    store__translation_project__project=project,
-                    store__translation_project__language__in=alt_src_langs,
-                    state=TRANSLATED) \
-                          .select_related(
-                                'store', 'store__translation_project',
-                                'store__translation_project__language')
+    altsrcs = _get_altsrcs_queryset(project, alt_src_langs).filter(
+        unitid_hash=unit.unitid_hash,
+    )
 
     if project.get_treestyle() == 'nongnu':
-        altsrcs = filter(lambda x: x.store.path == store.path, altsrcs)
+        altsrcs = altsrcs.filter(store_path=unit.store_path)
+
+    return altsrcs
+
+
+def find_altsrcs_bulk(units, alt_src_langs, project):
+    """Return the alternative sources of all `units` from `project`, keyed
+    by unit ID, using a single query."""
+    units = list(units)
+    altsrcs = dict((unit.id, []) for unit in units)
+    if not units:
+        return altsrcs
+
+    candidates = _get_altsrcs_queryset(project, alt_src_langs).filter(
+        unitid_hash__in=set(unit.unitid_hash for unit in units),
+    )
+
+    nongnu = project.get_treestyle() == 'nongnu'
+    if nongnu:
+        candidates = candidates.filter(
+            store_path__in=set(unit.store_path for unit in units),
+        )
+
+    candidates_by_hash = {}
+    for candidate in candidates:
+        candidates_by_hash.setdefault(candidate.unitid_hash, []) \
+                          .append(candidate)
+
+    for unit in units:
+        for candidate in candidates_by_hash.get(unit.unitid_hash, []):
+            if not nongnu or candidate.store_path == unit.store_path:
+                altsrcs[unit.id].append(candidate)
 
     return altsrcs
 
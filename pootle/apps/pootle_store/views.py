@@ -8,16 +8,19 @@
 # AUTHORS file for copyright and authorship information.
 
 import logging
+import re
 from itertools import groupby
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
 from django.db.models import Max, Q
 from django.http import HttpResponse, Http404
 from django.shortcuts import redirect, render
 from django.template import loader, RequestContext
-from django.utils.translation import to_locale, ugettext as _
+from django.utils.translation import get_language, to_locale, ugettext as _
 from django.utils.translation.trans_real import parse_accept_lang_header
 from django.utils import timezone
 from django.views.decorators.cache import never_cache
@@ -30,8 +33,11 @@ from pootle.core.dateparse import parse_datetime
 from pootle.core.decorators import (get_path_obj, get_resource,
                                     permission_required)
 from pootle.core.exceptions import Http400
-from pootle_app.models.permissions import check_user_permission
-from pootle_misc.checks import check_names
+from pootle.core.tmserver import search_many as get_tmsuggestions_bulk
+from pootle_app.models.permissions import (check_user_permission,
+                                           get_matching_permissions)
+from pootle_misc.aggregate import max_column
+from pootle_misc.checks import check_names, get_check_mask
 from pootle_misc.forms import make_search_form
 from pootle_misc.util import ajax_required, jsonify, to_int, get_date_interval
 from pootle_statistics.models import (Submission, SubmissionFields,
@@ -41,12 +47,16 @@ from .decorators import get_unit_context
 from .fields import to_python
 from .forms import (unit_comment_form_factory, unit_form_factory,
                     highlight_whitespace)
-from .models import Unit, SuggestionStates
+from .models import (QualityCheck, Suggestion, SuggestionStates, Unit,
+                     get_timeline_cache_key)
+from .resultsets import get_result_set
+from .search_index import get_search_index
+from .trigram_index import trigram_index
 from .signals import translation_submitted
 from .templatetags.store_tags import (highlight_diffs, pluralize_source,
                                       pluralize_target)
 from .util import (UNTRANSLATED, FUZZY, TRANSLATED, STATES_MAP,
-                   find_altsrcs)
+                   find_altsrcs, find_altsrcs_bulk)
 
 
 #: Mapping of allowed sorting criteria.
@@ -54,7 +64,7 @@ from .util import (UNTRANSLATED, FUZZY, TRANSLATED, STATES_MAP,
 #: will be used against the DB.
 ALLOWED_SORTS = {
     'units': {
-        'priority': 'priority',
+        'priority': '-priority',
         'oldest': 'submitted_on',
         'newest': '-submitted_on',
     },
@@ -69,10 +79,17 @@ ALLOWED_SORTS = {
 }
 
 
+#: Format of the result set keys accepted from the browser
+RESULT_SET_KEY_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
 #: List of fields from `ALLOWED_SORTS` that can be sorted by simply using
 #: `order_by(field)`
 SIMPLY_SORTED = ['units']
 
+#: Maximum number of units whose editing widgets are returned at once
+MAX_EDIT_UNITS = 20
+
 
 def get_alt_src_langs(request, user, translation_project):
     language = translation_project.language
@@ -114,13 +131,13 @@ def get_search_query(form, units_queryset):
     result = units_queryset.none()
 
     if 'source' in form.cleaned_data['sfields']:
-        subresult = units_queryset
+        subresult = trigram_index.filter(units_queryset, 'source', words)
         for word in words:
             subresult = subresult.filter(source_f__icontains=word)
         result = result | subresult
 
     if 'target' in form.cleaned_data['sfields']:
-        subresult = units_queryset
+        subresult = trigram_index.filter(units_queryset, 'target', words)
         for word in words:
             subresult = subresult.filter(target_f__icontains=word)
         result = result | subresult
@@ -150,11 +167,13 @@ def get_search_exact_query(form, units_queryset):
     result = units_queryset.none()
 
     if 'source' in form.cleaned_data['sfields']:
-        subresult = units_queryset.filter(source_f__contains=phrase)
+        subresult = trigram_index.filter(units_queryset, 'source', [phrase])
+        subresult = subresult.filter(source_f__contains=phrase)
         result = result | subresult
 
     if 'target' in form.cleaned_data['sfields']:
-        subresult = units_queryset.filter(target_f__contains=phrase)
+        subresult = trigram_index.filter(units_queryset, 'target', [phrase])
+        subresult = subresult.filter(target_f__contains=phrase)
         result = result | subresult
 
     if 'notes' in form.cleaned_data['sfields']:
@@ -181,9 +200,26 @@ def get_search_step_query(form, units_queryset):
         logging.debug(u"Using exact database search")
         return get_search_exact_query(form, units_queryset)
 
+    search_index = get_search_index()
+    if search_index is not None:
+        result = search_index.filter(units_queryset,
+                                     form.cleaned_data['search'].split(),
+                                     form.cleaned_data['sfields'])
+        if result is not None:
+            logging.debug(u"Using indexed database search")
+            return result
+
     return get_search_query(form, units_queryset)
 
 
+def _get_submitted_unit_ids(user):
+    """Returns a queryset of the IDs of units edited by `user`."""
+    return Submission.objects.filter(
+        submitter=user,
+        type__in=SubmissionTypes.EDIT_TYPES,
+    ).values('unit')
+
+
 def get_step_query(request, units_queryset):
     """Narrows down unit query to units matching conditions in GET."""
     if 'filter' in request.GET:
@@ -218,45 +254,71 @@ def get_step_query(request, units_queryset):
                     Q(state=UNTRANSLATED) | Q(state=FUZZY),
                 )
             elif unit_filter == 'suggestions':
-                match_queryset = units_queryset.filter(
-                        suggestion__state=SuggestionStates.PENDING
-                    ).distinct()
+                match_queryset = units_queryset.filter(suggestion_count__gt=0)
             elif unit_filter in ('my-suggestions', 'user-suggestions'):
-                match_queryset = units_queryset.filter(
-                        suggestion__state=SuggestionStates.PENDING,
-                        suggestion__user=user,
-                    ).distinct()
                 sort_on = 'suggestions'
+                if sort_by_param in ALLOWED_SORTS[sort_on]:
+                    # Sorting needs the matching suggestions joined
+                    match_queryset = units_queryset.filter(
+                            suggestion__state=SuggestionStates.PENDING,
+                            suggestion__user=user,
+                        ).distinct()
+                else:
+                    match_queryset = units_queryset.filter(
+                        suggestion_count__gt=0,
+                        id__in=Suggestion.objects.filter(
+                            state=SuggestionStates.PENDING,
+                            user=user,
+                        ).values('unit'),
+                    )
             elif unit_filter == 'user-suggestions-accepted':
                 match_queryset = units_queryset.filter(
-                        suggestion__state=SuggestionStates.ACCEPTED,
-                        suggestion__user=user,
-                    ).distinct()
+                    id__in=Suggestion.objects.filter(
+                        state=SuggestionStates.ACCEPTED,
+                        user=user,
+                    ).values('unit'),
+                )
             elif unit_filter == 'user-suggestions-rejected':
                 match_queryset = units_queryset.filter(
-                        suggestion__state=SuggestionStates.REJECTED,
-                        suggestion__user=user,
-                    ).distinct()
+                    id__in=Suggestion.objects.filter(
+                        state=SuggestionStates.REJECTED,
+                        user=user,
+                    ).values('unit'),
+                )
             elif unit_filter in ('my-submissions', 'user-submissions'):
-                match_queryset = units_queryset.filter(
-                        submission__submitter=user,
-                        submission__type__in=SubmissionTypes.EDIT_TYPES,
-                    ).distinct()
                 sort_on = 'submissions'
+                if sort_by_param in ALLOWED_SORTS[sort_on]:
+                    # Sorting needs the matching submissions joined
+                    match_queryset = units_queryset.filter(
+                            submission__submitter=user,
+                            submission__type__in=SubmissionTypes.EDIT_TYPES,
+                        ).distinct()
+                else:
+                    match_queryset = units_queryset.filter(
+                        id__in=_get_submitted_unit_ids(user),
+                    )
             elif (unit_filter in ('my-submissions-overwritten',
                                   'user-submissions-overwritten')):
                 match_queryset = units_queryset.filter(
-                        submission__submitter=user,
-                        submission__type__in=SubmissionTypes.EDIT_TYPES,
-                    ).exclude(submitted_by=user).distinct()
+                    id__in=_get_submitted_unit_ids(user),
+                ).exclude(submitted_by=user)
             elif unit_filter == 'checks' and 'checks' in request.GET:
                 checks = request.GET['checks'].split(',')
 
                 if checks:
-                    match_queryset = units_queryset.filter(
-                        qualitycheck__false_positive=False,
-                        qualitycheck__name__in=checks,
-                    ).distinct()
+                    check_mask = get_check_mask(checks)
+                    if check_mask is not None:
+                        match_queryset = units_queryset.extra(
+                            where=['pootle_store_unit.check_flags & %s <> 0'],
+                            params=[check_mask],
+                        )
+                    else:
+                        match_queryset = units_queryset.filter(
+                            id__in=QualityCheck.objects.filter(
+                                false_positive=False,
+                                name__in=checks,
+                            ).values('unit'),
+                        )
 
             if modified_since is not None:
                 datetime_obj = parse_datetime(modified_since)
@@ -275,25 +337,7 @@ def get_step_query(request, units_queryset):
             sort_by = ALLOWED_SORTS[sort_on].get(sort_by_param, None)
             if sort_by is not None:
                 if sort_on in SIMPLY_SORTED:
-                    if sort_by == 'priority':
-                        # TODO: Replace the following extra() with Coalesce
-                        # https://docs.djangoproject.com/en/1.8/ref/models/database-functions/#coalesce
-                        # once we drop support for Django<1.8.x:
-                        # .annotate(
-                        #     sort_by_field=Coalesce(
-                        #         Max("vfolders__priority"),
-                        #         Value(1)
-                        #     )
-                        # ).order_by("-sort_by_field")
-                        match_queryset = match_queryset.extra(select={'sort_by_field': """
-                            SELECT COALESCE(MAX(virtualfolder_virtualfolder.priority), 1)
-                            FROM virtualfolder_virtualfolder
-                            INNER JOIN virtualfolder_virtualfolder_units
-                            ON virtualfolder_virtualfolder.id = virtualfolder_virtualfolder_units.virtualfolder_id
-                            WHERE virtualfolder_virtualfolder_units.unit_id = pootle_store_unit.id
-                        """}).extra(order_by=['-sort_by_field'])
-                    else:
-                        match_queryset = match_queryset.order_by(sort_by)
+                    match_queryset = match_queryset.order_by(sort_by)
                 else:
                     # Omit leading `-` sign
                     if sort_by[0] == '-':
@@ -409,6 +453,33 @@ def _build_units_list(units, reverse=False):
     return return_units
 
 
+def _get_uid_list(step_queryset):
+    """Returns the list of unit IDs matching `step_queryset`, in order."""
+    sort_by_field = None
+    if len(step_queryset.query.order_by) == 1:
+        sort_by_field = step_queryset.query.order_by[0]
+
+    sort_on = None
+    for key, item in ALLOWED_SORTS.items():
+        if sort_by_field in item.values():
+            sort_on = key
+            break
+
+    if sort_by_field is None or sort_on == 'units':
+        return list(step_queryset.values_list('id', flat=True))
+
+    # Not using `values_list()` here because it doesn't know about all
+    # existing relations when `extra()` has been used before in the
+    # queryset. This affects annotated names such as those ending in
+    # `__max`, where Django thinks we're trying to lookup a field on a
+    # relationship field. That's why `sort_by_field` alias for `__max`
+    # is used here. This alias must be queried in
+    # `values('sort_by_field', 'id')` with `id` otherwise
+    # Django looks for `sort_by_field` field in the initial table.
+    # https://code.djangoproject.com/ticket/19434
+    return [u['id'] for u in step_queryset.values('id', 'sort_by_field')]
+
+
 @ajax_required
 def get_units(request):
     """Gets source and target texts and its metadata.
@@ -419,8 +490,14 @@ def get_units(request):
         The optional `count` GET parameter defines the chunk size to
         consider. The user's preference will be used by default.
 
-        When the `initial` GET parameter is present, a sorted list of
-        the result set ids will be returned too.
+        When the `initial` GET parameter is present, the IDs of the
+        matching units are stored server-side as a result set, and the
+        response includes its key (`resultSet`), its length (`total`) and a
+        window of its sorted IDs (`uIds`) starting at position `offset`.
+
+        Subsequent requests can pass the `resultset` key and the `offset`
+        of the current unit to get a new window of IDs without running the
+        query again.
     """
     pootle_path = request.GET.get('path', None)
     if pootle_path is None:
@@ -441,50 +518,35 @@ def get_units(request):
     chunk_size = request.GET.get('count', limit)
     uids_param = filter(None, request.GET.get('uids', '').split(u','))
     uids = filter(None, map(to_int, uids_param))
+    result_set_key = request.GET.get('resultset', '')
+    if not RESULT_SET_KEY_RE.match(result_set_key):
+        result_set_key = None
+    offset = request.GET.get('offset', None)
+    if offset is not None:
+        offset = to_int(offset)
 
     units = []
     unit_groups = []
-    uid_list = []
-
-    if is_initial_request:
-        sort_by_field = None
-        if len(step_queryset.query.order_by) == 1:
-            sort_by_field = step_queryset.query.order_by[0]
-
-        sort_on = None
-        for key, item in ALLOWED_SORTS.items():
-            if sort_by_field in item.values():
-                sort_on = key
-                break
+    result_set = None
 
-        if sort_by_field is None or sort_on == 'units':
-            uid_list = list(step_queryset.values_list('id', flat=True))
-        else:
-            # Not using `values_list()` here because it doesn't know about all
-            # existing relations when `extra()` has been used before in the
-            # queryset. This affects annotated names such as those ending in
-            # `__max`, where Django thinks we're trying to lookup a field on a
-            # relationship field. That's why `sort_by_field` alias for `__max`
-            # is used here. This alias must be queried in
-            # `values('sort_by_field', 'id')` with `id` otherwise
-            # Django looks for `sort_by_field` field in the initial table.
-            # https://code.djangoproject.com/ticket/19434
-            uid_list = [u['id'] for u in step_queryset.values('id', 'sort_by_field')]
+    if is_initial_request or result_set_key is not None:
+        result_set = get_result_set(request, pootle_path,
+                                    lambda: _get_uid_list(step_queryset),
+                                    key=result_set_key)
 
+    if is_initial_request:
         if len(uids) == 1:
-            try:
-                uid = uids[0]
-                index = uid_list.index(uid)
-                begin = max(index - chunk_size, 0)
-                end = min(index + chunk_size + 1, len(uid_list))
-                uids = uid_list[begin:end]
-            except ValueError:
-                raise Http404  # `uid` not found in `uid_list`
-        else:
-            count = 2 * chunk_size
-            uids = uid_list[:count]
+            offset = result_set.index(uids[0])
+            if offset is None:
+                raise Http404  # `uid` not found in the result set
+
+            uids = result_set.slice(offset - chunk_size,
+                                    offset + chunk_size + 1)
+        elif offset is None:
+            offset = 0
+            uids = result_set.slice(0, 2 * chunk_size)
 
-    if not units and uids:
+    if uids:
         units = step_queryset.filter(id__in=uids)
 
     units_by_path = groupby(units, lambda x: x.store.pootle_path)
@@ -494,8 +556,16 @@ def get_units(request):
     response = {
         'unitGroups': unit_groups,
     }
-    if uid_list:
-        response['uIds'] = uid_list
+    if result_set is not None and offset is not None:
+        total = result_set.count()
+        if total:
+            window_offset, window = result_set.window(offset)
+            response.update({
+                'resultSet': result_set.key,
+                'total': total,
+                'offset': window_offset,
+                'uIds': window,
+            })
 
     return HttpResponse(jsonify(response), content_type="application/json")
 
@@ -526,12 +596,8 @@ def get_more_context(request, unit):
     return HttpResponse(response, status=rcode, content_type="application/json")
 
 
-@never_cache
-@get_unit_context('view')
-def timeline(request, unit):
-    """Returns a JSON-encoded string including the changes to the unit
-    rendered in HTML.
-    """
+def _get_timeline_context(unit):
+    """Returns the template context of the timeline of `unit`."""
     timeline = Submission.objects.filter(unit=unit, field__in=[
         SubmissionFields.TARGET, SubmissionFields.STATE,
         SubmissionFields.COMMENT, SubmissionFields.NONE
@@ -610,14 +676,46 @@ def timeline(request, unit):
 
     context['entries_group'] = entries_group
 
+    return context
+
+
+@never_cache
+@get_unit_context('view')
+def timeline(request, unit):
+    """Returns a JSON-encoded string including the changes to the unit
+    rendered in HTML.
+
+    Both the timeline data and its rendered fragment, per UI language, are
+    cached until a new submission is saved for the unit.
+    """
+    latest_submission_id = max_column(unit.submission_set.all(), 'id', 0)
+    cache_key = get_timeline_cache_key(unit.id, latest_submission_id)
+    cached_timeline = cache.get(cache_key)
+    if cached_timeline is None:
+        cached_timeline = {
+            'context': _get_timeline_context(unit),
+            'fragments': {},
+        }
+        cache.set(cache_key, cached_timeline, settings.OBJECT_CACHE_TIMEOUT)
+
+    context = cached_timeline['context']
+
     if request.is_ajax():
         # The client will want to confirm that the response is relevant for
         # the unit on screen at the time of receiving this, so we add the uid.
         json = {'uid': unit.id}
 
-        t = loader.get_template('editor/units/xhr_timeline.html')
-        c = RequestContext(request, context)
-        json['timeline'] = t.render(c).replace('\n', '')
+        language_code = get_language()
+        fragment = cached_timeline['fragments'].get(language_code)
+        if fragment is None:
+            t = loader.get_template('editor/units/xhr_timeline.html')
+            c = RequestContext(request, context)
+            fragment = t.render(c).replace('\n', '')
+            cached_timeline['fragments'][language_code] = fragment
+            cache.set(cache_key, cached_timeline,
+                      settings.OBJECT_CACHE_TIMEOUT)
+
+        json['timeline'] = fragment
 
         response = jsonify(json)
         return HttpResponse(response, content_type="application/json")
@@ -695,21 +793,40 @@ def save_comment(request, unit):
     return HttpResponse(response, status=rcode, content_type="application/json")
 
 
-@never_cache
-@ajax_required
-@get_unit_context('view')
-def get_edit_unit(request, unit):
-    """Given a store path ``pootle_path`` and unit id ``uid``, gathers all the
-    necessary information to build the editing widget.
+def _get_editor_permissions(user, directory):
+    """Return the permission flags of `user` in `directory` used to build
+    the editing widget."""
+    if user.is_superuser:
+        permissions = ['administrate']
+    else:
+        permissions = get_matching_permissions(user, directory)
 
-    :return: A templatised editing widget is returned within the ``editor``
-             variable and paging information is also returned if the page
-             number has changed.
+    def has_permission(codename):
+        return 'administrate' in permissions or codename in permissions
+
+    return {
+        'cantranslate': has_permission('translate'),
+        'cansuggest': has_permission('suggest'),
+        'canreview': has_permission('review'),
+        'is_admin': has_permission('administrate'),
+    }
+
+
+def _get_edit_unit_json(request, unit, permissions, altsrcs, tm_suggestions):
+    """Return the data needed to build the editing widget of `unit`.
+
+    :param permissions: editor permission flags as returned by
+        :func:`_get_editor_permissions`.
+    :param altsrcs: alternative source units of `unit`.
+    :param tm_suggestions: TM suggestions for `unit`.
     """
     json = {}
 
-    translation_project = request.translation_project
+    store = unit.store
+    directory = store.parent
+    translation_project = store.translation_project
     language = translation_project.language
+    project = translation_project.project
 
     if unit.hasplural():
         snplurals = len(unit.source.strings)
@@ -721,14 +838,9 @@ def get_edit_unit(request, unit):
     comment_form_class = unit_comment_form_factory(language)
     comment_form = comment_form_class({}, instance=unit, request=request)
 
-    store = unit.store
-    directory = store.parent
-    user = request.profile
-    alt_src_langs = get_alt_src_langs(request, user, translation_project)
-    project = translation_project.project
-
-    # Retrieve the unit top priority, if any.
-    priority = unit.vfolders.aggregate(priority=Max('priority'))['priority']
+    # Units out of virtual folders have the default priority, which isn't
+    # displayed
+    priority = unit.priority if unit.priority != 1 else None
 
     template_vars = {
         'unit': unit,
@@ -737,30 +849,24 @@ def get_edit_unit(request, unit):
         'priority': priority,
         'store': store,
         'directory': directory,
-        'profile': user,
+        'profile': request.profile,
         'user': request.user,
         'project': project,
         'language': language,
-        'source_language': translation_project.project.source_language,
-        'cantranslate': check_user_permission(user, "translate", directory),
-        'cansuggest': check_user_permission(user, "suggest", directory),
-        'canreview': check_user_permission(user, "review", directory),
-        'is_admin': check_user_permission(user, 'administrate', directory),
-        'altsrcs': find_altsrcs(unit, alt_src_langs, store=store,
-                                project=project),
+        'source_language': project.source_language,
+        'altsrcs': altsrcs,
     }
+    template_vars.update(permissions)
 
-    if translation_project.project.is_terminology or store.is_terminology:
+    if project.is_terminology or store.is_terminology:
         t = loader.get_template('editor/units/term_edit.html')
     else:
         t = loader.get_template('editor/units/edit.html')
     c = RequestContext(request, template_vars)
     json['editor'] = t.render(c)
-    json['tm_suggestions'] = unit.get_tm_suggestions()
+    json['tm_suggestions'] = tm_suggestions
     json['is_obsolete'] = unit.isobsolete()
 
-    rcode = 200
-
     # Return context rows if filtering is applied but
     # don't return any if the user has asked not to have it
     current_filter = request.GET.get('filter', 'all')
@@ -769,14 +875,105 @@ def get_edit_unit(request, unit):
     if ((_is_filtered(request) or current_filter not in ('all',)) and
         show_ctx == 'true'):
         # TODO: review if this first 'if' branch makes sense
-        if translation_project.project.is_terminology or store.is_terminology:
+        if project.is_terminology or store.is_terminology:
             json['ctx'] = _filter_ctx_units(store.units, unit, 0)
         else:
             ctx_qty = int(request.COOKIES.get('ctxQty', 1))
             json['ctx'] = _filter_ctx_units(store.units, unit, ctx_qty)
 
+    return json
+
+
+@never_cache
+@ajax_required
+@get_unit_context('view')
+def get_edit_unit(request, unit):
+    """Given a store path ``pootle_path`` and unit id ``uid``, gathers all the
+    necessary information to build the editing widget.
+
+    :return: A templatised editing widget is returned within the ``editor``
+             variable and paging information is also returned if the page
+             number has changed.
+    """
+    translation_project = request.translation_project
+    user = request.profile
+    alt_src_langs = get_alt_src_langs(request, user, translation_project)
+
+    json = _get_edit_unit_json(
+        request, unit,
+        permissions=_get_editor_permissions(user, unit.store.parent),
+        altsrcs=find_altsrcs(unit, alt_src_langs, store=unit.store,
+                             project=translation_project.project),
+        tm_suggestions=unit.get_tm_suggestions(),
+    )
+
     response = jsonify(json)
-    return HttpResponse(response, status=rcode, content_type="application/json")
+    return HttpResponse(response, content_type="application/json")
+
+
+@never_cache
+@ajax_required
+def get_edit_units(request):
+    """Batch version of :func:`get_edit_unit`, used to prefetch the editing
+    widgets of the units to be opened next.
+
+    Units are given as a comma-separated list of IDs in the ``uids`` GET
+    parameter. Permissions and alternative source languages are resolved
+    once per directory and translation project, and alternative sources and
+    TM suggestions are retrieved in bulk.
+
+    :return: The data returned by :func:`get_edit_unit` for each unit, keyed
+             by unit ID within the ``units`` variable. Units the user can't
+             view are left out.
+    """
+    uids_param = filter(None, request.GET.get('uids', '').split(u','))
+    uids = filter(None, map(to_int, uids_param))[:MAX_EDIT_UNITS]
+    if not uids:
+        raise Http400(_('Arguments missing.'))
+
+    User = get_user_model()
+    user = User.get(request.user)
+    request.profile = user
+
+    units = Unit.objects.select_related(
+        'store__parent',
+        'store__translation_project__language',
+        'store__translation_project__project',
+    ).filter(id__in=uids)
+    units = sorted(units,
+                   key=lambda unit: unit.store.translation_project_id)
+
+    visible_units = []
+    altsrcs = {}
+    for unused, tp_units in groupby(
+            units, key=lambda unit: unit.store.translation_project_id):
+        tp_units = list(tp_units)
+        translation_project = tp_units[0].store.translation_project
+        if not translation_project.is_accessible_by(user):
+            continue
+
+        alt_src_langs = get_alt_src_langs(request, user, translation_project)
+        altsrcs.update(find_altsrcs_bulk(tp_units, alt_src_langs,
+                                         translation_project.project))
+        visible_units.extend(tp_units)
+
+    tm_suggestions = get_tmsuggestions_bulk(visible_units)
+
+    permissions = {}
+    json = {}
+    for unit in visible_units:
+        directory = unit.store.parent
+        if directory.id not in permissions:
+            permissions[directory.id] = _get_editor_permissions(user,
+                                                                directory)
+
+        json[unit.id] = _get_edit_unit_json(request, unit,
+                                            permissions[directory.id],
+                                            altsrcs[unit.id],
+                                            tm_suggestions[unit.id])
+
+    response = jsonify({'units': json})
+    return HttpResponse(response, content_type="application/json")
 
 
 @get_unit_context('view')
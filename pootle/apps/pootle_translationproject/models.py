@@ -10,40 +10,31 @@
 import logging
 import os
 
-from translate.misc.lru import LRUCachingDict
 from translate.storage.base import ParseError
 
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.db import models, IntegrityError
-from django.db.models import Q
+from django.db.models import Max, Q
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 
 from pootle_app.project_tree import does_not_exist
-from pootle.core.mixins import CachedTreeItem, CachedMethods
+from pootle.core.mixins import CachedTreeItem
 from pootle.core.url_helpers import get_editor_filter, split_pootle_path
 from pootle_app.models.directory import Directory
 from pootle_language.models import Language
 from pootle_misc.checks import excluded_filters, ENChecker
+from pootle_misc.match import Matcher, get_term_index
 from pootle_project.models import Project
-from pootle_store.models import (Store, Unit, PARSED)
+from pootle_store.fields import StoreFileWriter
+from pootle_store.models import (Unit, PARSED)
 from pootle_store.util import (absolute_real_path, relative_real_path,
                                OBSOLETE)
 
 
-class TranslationProjectNonDBState(object):
-
-    def __init__(self, parent):
-        self.parent = parent
-
-        # Terminology matcher
-        self.termmatcher = None
-        self.termmatchermtime = None
-
-
 def create_or_resurrect_translation_project(language, project):
     tp = create_translation_project(language, project)
     if tp is not None:
@@ -152,9 +143,6 @@ class TranslationProject(models.Model, CachedTreeItem):
     creation_time = models.DateTimeField(auto_now_add=True, db_index=True,
                                          editable=False, null=True)
 
-    _non_db_state_cache = LRUCachingDict(settings.PARSE_POOL_SIZE,
-            settings.PARSE_POOL_CULL_FREQUENCY)
-
     objects = TranslationProjectManager()
 
     class Meta:
@@ -200,18 +188,6 @@ class TranslationProject(models.Model, CachedTreeItem):
                                  errorhandler=self.filtererrorhandler,
                                  languagecode=self.language.code)
 
-    @property
-    def non_db_state(self):
-        if not hasattr(self, "_non_db_state"):
-            try:
-                self._non_db_state = self._non_db_state_cache[self.id]
-            except KeyError:
-                self._non_db_state = TranslationProjectNonDBState(self)
-                self._non_db_state_cache[self.id] = \
-                        TranslationProjectNonDBState(self)
-
-        return self._non_db_state
-
     @property
     def units(self):
         self.require_units()
@@ -253,6 +229,11 @@ class TranslationProject(models.Model, CachedTreeItem):
 
         if created:
             self.scan_files()
+        else:
+            # Keep the location denormalized on units in sync
+            Unit.simple_objects.filter(translation_project=self).exclude(
+                project=self.project_id, language=self.language_id,
+            ).update(project=self.project_id, language=self.language_id)
 
     def delete(self, *args, **kwargs):
         directory = self.directory
@@ -292,12 +273,65 @@ class TranslationProject(models.Model, CachedTreeItem):
             store.update(overwrite=overwrite)
 
     def sync(self, conservative=True, skip_missing=False, only_newer=True):
-        """Sync unsaved work on all stores to disk"""
+        """Sync unsaved work on all stores to disk.
+
+        Revisions and modified units of all the stores are retrieved at once,
+        and files are saved by a pool of threads while the next stores are
+        being processed.
+        """
         stores = self.stores.live().exclude(file='').filter(state__gte=PARSED)
-        for store in stores.iterator():
-            store.sync(update_structure=not conservative,
-                       conservative=conservative,
-                       skip_missing=skip_missing, only_newer=only_newer)
+        revisions = dict(
+            Unit.objects.filter(store__in=stores).order_by()
+                        .values_list('store').annotate(Max('revision'))
+        )
+
+        stores = [
+            store for store in stores.iterator()
+            if not (only_newer and store.last_sync_revision is not None and
+                    store.last_sync_revision >= revisions.get(store.id, 0))
+        ]
+        if not stores:
+            return
+
+        modified_units = None
+        if conservative:
+            modified_units = self.get_modified_units(stores, revisions)
+
+        writer = StoreFileWriter(settings.POOTLE_SYNC_WORKERS)
+        try:
+            for store in stores:
+                kwargs = {}
+                if modified_units is not None:
+                    kwargs['modified_units'] = modified_units.get(store.id, [])
+                store.sync(update_structure=not conservative,
+                           conservative=conservative,
+                           skip_missing=skip_missing, only_newer=only_newer,
+                           last_revision=revisions.get(store.id, 0),
+                           writer=writer, **kwargs)
+        finally:
+            writer.close()
+
+    def get_modified_units(self, stores, revisions):
+        """Return the non-obsolete units of `stores` modified after their
+        last sync, grouped by store ID, using a single query."""
+        last_sync_revisions = [store.last_sync_revision for store in stores]
+        units = Unit.objects.filter(store__in=[store.id for store in stores],
+                                    state__gt=OBSOLETE)
+        if None not in last_sync_revisions:
+            units = units.filter(revision__gt=min(last_sync_revisions))
+
+        last_sync_revisions = dict((store.id, store.last_sync_revision)
+                                   for store in stores)
+        modified_units = {}
+        for unit in units.iterator():
+            last_sync_revision = last_sync_revisions[unit.store_id]
+            if ((last_sync_revision is not None and
+                 unit.revision <= last_sync_revision) or
+                unit.revision > revisions.get(unit.store_id, 0)):
+                continue
+            modified_units.setdefault(unit.store_id, []).append(unit)
+
+        return modified_units
 
     def require_units(self):
         """Makes sure all stores are parsed"""
@@ -374,40 +408,25 @@ class TranslationProject(models.Model, CachedTreeItem):
 
     def gettermmatcher(self):
         """Returns the terminology matcher."""
-        terminology_stores = Store.objects.none()
-        mtime = None
+        terminology_stores = []
 
         if not self.is_terminology_project:
             # Get global terminology first
             try:
                 termproject = TranslationProject.objects \
                         .get_terminology_project(self.language_id)
-                mtime = termproject.get_cached_value(CachedMethods.MTIME)
-                terminology_stores = termproject.stores.live()
+                terminology_stores.extend(termproject.stores.live().iterator())
             except TranslationProject.DoesNotExist:
                 pass
 
             local_terminology = self.stores.live().filter(
                     name__startswith='pootle-terminology')
-            for store in local_terminology.iterator():
-                if mtime is None:
-                    mtime = store.get_cached_value(CachedMethods.MTIME)
-                else:
-                    mtime = max(mtime, store.get_cached_value(CachedMethods.MTIME))
-
-            terminology_stores = terminology_stores | local_terminology
+            terminology_stores.extend(local_terminology.iterator())
 
-        if mtime is None:
+        if not terminology_stores:
             return
 
-        if mtime != self.non_db_state.termmatchermtime:
-            from pootle_misc.match import Matcher
-            self.non_db_state.termmatcher = Matcher(
-                    terminology_stores.iterator(),
-            )
-            self.non_db_state.termmatchermtime = mtime
-
-        return self.non_db_state.termmatcher
+        return Matcher([get_term_index(store) for store in terminology_stores])
 
     ###########################################################################
 
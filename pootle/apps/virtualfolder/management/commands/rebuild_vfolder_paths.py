@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import os
+
+# This must be run before importing Django.
+os.environ['DJANGO_SETTINGS_MODULE'] = 'pootle.settings'
+
+from django.core.management.base import NoArgsCommand
+
+from virtualfolder.models import rebuild_paths_index
+
+
+class Command(NoArgsCommand):
+    help = "Rebuild the index of paths having virtual folder units."
+
+    def handle_noargs(self, **options):
+        rebuild_paths_index()
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def set_unit_priority(apps, schema_editor):
+    Unit = apps.get_model('pootle_store', 'Unit')
+    VirtualFolder = apps.get_model('virtualfolder', 'VirtualFolder')
+
+    # Going through vfolders by increasing priority leaves each unit with
+    # the highest one
+    for vfolder in VirtualFolder.objects.order_by('priority').iterator():
+        Unit.objects.filter(vfolders=vfolder).update(priority=vfolder.priority)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pootle_store', '0005_unit_priority'),
+        ('virtualfolder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_unit_priority),
+    ]
@@ -7,17 +7,290 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+import re
+import time
+
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models import Count, Max, Q
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
+from django_rq import get_connection
+
 from pootle.core.markup import get_markup_filter_name, MarkupField
-from pootle_app.models import Directory
-from pootle_language.models import Language
-from pootle_project.models import Project
-from pootle_store.models import Store, Unit
+from pootle.core.mixins import CachedTreeItem
+from pootle_store.models import (LOCKED, QualityCheck, Store, Suggestion,
+                                 SuggestionStates, Unit, calc_check_stats,
+                                 calc_wordcount_stats)
+from pootle_store.util import OBSOLETE, UNTRANSLATED
+from pootle_translationproject.models import TranslationProject
+
+
+# Number of units whose priority is recomputed per query
+PRIORITY_CHUNK_SIZE = 500
+
+# Number of unit memberships inserted or deleted per query
+MEMBERSHIP_CHUNK_SIZE = 500
+
+# Location placeholders, which stand for any language or project code
+PLACEHOLDERS_RE = re.compile(r'(\{LANG\}|\{PROJ\})')
+
+# Cache key holding the version of the virtual folder rules, which changes
+# whenever virtual folders are modified
+RULES_VERSION_KEY = 'pootle:virtualfolder:rules:version'
+
+# Redis sorted set with the number of virtual folder memberships of the units
+# below each directory and store path
+POOTLE_VFOLDER_PATHS = 'pootle:vfolders:paths'
+
+# Seconds the paths index is kept before being built again. Memberships
+# removed by cascading deletions of units, stores or projects are not
+# subtracted from it until then.
+PATHS_INDEX_TIMEOUT = 60 * 60
+
+# Characters with a special meaning in the regular expressions of all the
+# supported DB backends
+REGEX_SPECIAL_CHARS_RE = re.compile(r'([.^$*+?()\[\]{}|\\])')
+
+
+def get_path_regex(path):
+    """Return a regular expression matching the pootle paths `path` expands
+    to, for use in `__regex` lookups.
+
+    Placeholders match a single path segment. They are not expanded to the
+    existing language and project codes: units only exist in the stores of
+    existing translation projects anyway.
+    """
+    return u"".join(
+        u"[^/]+" if PLACEHOLDERS_RE.match(part)
+        else REGEX_SPECIAL_CHARS_RE.sub(r'\\\1', part)
+        for part in PLACEHOLDERS_RE.split(path) if part
+    )
+
+
+def update_units_priority(unit_ids):
+    """Recompute the priority stored on the given units, which is the
+    highest priority of the virtual folders they belong to."""
+    unit_ids = list(unit_ids)
+    default = Unit._meta.get_field('priority').default
+
+    for begin in range(0, len(unit_ids), PRIORITY_CHUNK_SIZE):
+        chunk = unit_ids[begin:begin+PRIORITY_CHUNK_SIZE]
+
+        priorities = VirtualFolder.units.through.objects.filter(
+            unit__in=chunk,
+        ).values('unit').annotate(
+            priority=Max('virtualfolder__priority'),
+        ).order_by()
+
+        units_by_priority = {default: set(chunk)}
+        for row in priorities:
+            units_by_priority[default].discard(row['unit'])
+            units_by_priority.setdefault(row['priority'], set()) \
+                             .add(row['unit'])
+
+        for priority, ids in units_by_priority.iteritems():
+            if ids:
+                Unit.simple_objects.filter(id__in=ids) \
+                                   .exclude(priority=priority) \
+                                   .update(priority=priority)
+
+
+def get_parent_paths(pootle_path):
+    """Return `pootle_path` along with the paths of all its parents."""
+    parts = pootle_path.split(u"/")
+    return ([u"/".join(parts[:i]) + u"/" for i in range(1, len(parts))] +
+            [pootle_path])
+
+
+def get_path_counts(counts):
+    """Return the membership counts of all the directory and store paths.
+
+    :param counts: a dictionary of membership counts keyed by store path.
+    """
+    path_counts = {}
+    for store_path, count in counts.iteritems():
+        for path in get_parent_paths(store_path):
+            path_counts[path] = path_counts.get(path, 0) + count
+
+    return path_counts
+
+
+def incr_paths_index(counts):
+    """Add the given number of memberships to the paths index.
+
+    :param counts: a dictionary of membership counts keyed by store path.
+    """
+    r_con = get_connection()
+    with r_con.pipeline() as pipe:
+        for path, count in get_path_counts(counts).iteritems():
+            if count:
+                pipe.zincrby(POOTLE_VFOLDER_PATHS, path, count)
+        pipe.zscore(POOTLE_VFOLDER_PATHS, u"")
+        results = pipe.execute()
+
+    if results[-1] is None:
+        # The index expired meanwhile, don't keep a partial one around
+        r_con.delete(POOTLE_VFOLDER_PATHS)
+
+
+def update_paths_index(unit_ids, increment=1):
+    """Update the paths index after adding `increment` memberships to each
+    of the given units."""
+    unit_ids = list(unit_ids)
+    r_con = get_connection()
+    if not r_con.exists(POOTLE_VFOLDER_PATHS):
+        # It will be built from scratch on its first use
+        return
+
+    counts = {}
+    for begin in range(0, len(unit_ids), MEMBERSHIP_CHUNK_SIZE):
+        rows = Unit.simple_objects.filter(
+            id__in=unit_ids[begin:begin+MEMBERSHIP_CHUNK_SIZE],
+        ).values_list('store__pootle_path').annotate(count=Count('id')) \
+         .order_by()
+        for store_path, count in rows:
+            counts[store_path] = counts.get(store_path, 0) + count * increment
+
+    incr_paths_index(counts)
+
+
+def rebuild_paths_index():
+    """Build the paths index from all the virtual folder memberships."""
+    counts = dict(
+        VirtualFolder.units.through.objects
+                     .values_list('unit__store__pootle_path')
+                     .annotate(count=Count('id')).order_by()
+    )
+
+    # Replace the index atomically. It always holds an empty path, so that
+    # it exists even when no path has virtual folder units.
+    tmp_key = POOTLE_VFOLDER_PATHS + ':rebuild'
+    with get_connection().pipeline() as pipe:
+        pipe.delete(tmp_key)
+        pipe.zincrby(tmp_key, u"", 0)
+        for path, count in get_path_counts(counts).iteritems():
+            pipe.zincrby(tmp_key, path, count)
+        pipe.rename(tmp_key, POOTLE_VFOLDER_PATHS)
+        pipe.expire(POOTLE_VFOLDER_PATHS, PATHS_INDEX_TIMEOUT)
+        pipe.execute()
+
+
+def has_vfolder_units(pootle_path):
+    """Whether any virtual folder has units in `pootle_path`, looked up in
+    the paths index."""
+    with get_connection().pipeline() as pipe:
+        pipe.exists(POOTLE_VFOLDER_PATHS)
+        pipe.zscore(POOTLE_VFOLDER_PATHS, pootle_path)
+        exists, count = pipe.execute()
+
+    if not exists:
+        rebuild_paths_index()
+        count = get_connection().zscore(POOTLE_VFOLDER_PATHS, pootle_path)
+
+    return count is not None and count > 0
+
+
+def get_rules_version():
+    version = cache.get(RULES_VERSION_KEY)
+    if version is None:
+        cache.add(RULES_VERSION_KEY, time.time(), None)
+        version = cache.get(RULES_VERSION_KEY)
+
+    return version
+
+
+class RulesMatcher(object):
+    """Match store paths against the filter rules of all virtual folders.
+
+    Rules are compiled once, and the virtual folders matching a path are
+    remembered, so that relating many units of the same store is cheap.
+    """
+
+    # Number of matched paths to remember
+    max_paths = 1000
+
+    def __init__(self, vfolders, version=None):
+        self.version = version
+
+        self.dir_rules = []
+        self.file_rules = []
+        for vfolder in vfolders:
+            for dir_regex, file_regex in vfolder.get_rule_regexes():
+                self.dir_rules.append((vfolder.id, re.compile(dir_regex)))
+                if file_regex is not None:
+                    self.file_rules.append((vfolder.id,
+                                            re.compile(file_regex)))
+
+        self._paths = {}
+
+    def match(self, pootle_path):
+        """Return a tuple with the sets of IDs of the virtual folders whose
+        rules match `pootle_path` as a directory and as a store."""
+        if pootle_path not in self._paths:
+            if len(self._paths) >= self.max_paths:
+                self._paths.clear()
+
+            self._paths[pootle_path] = (
+                set(vf_id for vf_id, regex in self.dir_rules
+                    if regex.match(pootle_path)),
+                set(vf_id for vf_id, regex in self.file_rules
+                    if regex.match(pootle_path)),
+            )
+
+        return self._paths[pootle_path]
+
+
+_rules_matcher = None
+
+
+def get_rules_matcher():
+    """Return the rules matcher of this process, rebuilt whenever virtual
+    folders change."""
+    global _rules_matcher
+
+    version = get_rules_version()
+    if _rules_matcher is None or _rules_matcher.version != version:
+        _rules_matcher = RulesMatcher(VirtualFolder.objects.all(), version)
+
+    return _rules_matcher
+
+
+def relate_units(store, units):
+    """Relate the given new units of `store` to the virtual folders matching
+    them.
+
+    :param units: a list of `(id, state)` tuples.
+    """
+    dir_vf_ids, file_vf_ids = get_rules_matcher().match(store.pootle_path)
+    if store.obsolete:
+        file_vf_ids = set()
+
+    Membership = VirtualFolder.units.through
+    memberships = []
+    related_ids = []
+    for unit_id, state in units:
+        vf_ids = dir_vf_ids
+        if state > OBSOLETE:
+            vf_ids = dir_vf_ids | file_vf_ids
+
+        memberships.extend(Membership(virtualfolder_id=vf_id, unit_id=unit_id)
+                           for vf_id in vf_ids)
+        if vf_ids:
+            related_ids.append(unit_id)
+
+    if memberships:
+        Membership.objects.bulk_create(memberships,
+                                       batch_size=MEMBERSHIP_CHUNK_SIZE)
+        update_units_priority(related_ids)
+        if get_connection().exists(POOTLE_VFOLDER_PATHS):
+            incr_paths_index({store.pootle_path: len(memberships)})
+
+        for vf_treeitem in VirtualFolderTreeItem.get_for_store(store):
+            vf_treeitem.update_all_cache()
 
 
 class VirtualFolder(models.Model):
@@ -63,18 +336,6 @@ class VirtualFolder(models.Model):
         unique_together = ('name', 'location')
         ordering = ['-priority', 'name']
 
-    @classmethod
-    def get_matching_for(cls, pootle_path):
-        """Return the matching virtual folders in the given pootle path.
-
-        Not all the applicable virtual folders have matching filtering rules.
-        This method further restricts the list of applicable virtual folders to
-        retrieve only those with filtering rules that actually match.
-        """
-        return VirtualFolder.objects.filter(
-            units__store__pootle_path__startswith=pootle_path
-        ).distinct()
-
     def __unicode__(self):
         return ": ".join([self.name, self.location])
 
@@ -84,29 +345,64 @@ class VirtualFolder(models.Model):
 
         self.name = self.name.lower()
 
+        old_priority = None
+        if self.pk is not None:
+            old_priority = VirtualFolder.objects.filter(pk=self.pk) \
+                                                .values_list('priority',
+                                                             flat=True) \
+                                                .first()
+
         super(VirtualFolder, self).save(*args, **kwargs)
 
-        # Clean any existing relationship between units and this vfolder.
-        self.units.clear()
+        # Only apply the differences between the current and new relations.
+        Membership = VirtualFolder.units.through
+        memberships = Membership.objects.filter(virtualfolder=self)
+        old_unit_ids = set(memberships.values_list('unit_id', flat=True))
+        new_unit_ids = self.get_unit_ids()
+
+        removed_ids = list(old_unit_ids - new_unit_ids)
+        for begin in range(0, len(removed_ids), MEMBERSHIP_CHUNK_SIZE):
+            memberships.filter(
+                unit__in=removed_ids[begin:begin+MEMBERSHIP_CHUNK_SIZE],
+            ).delete()
+
+        added_ids = new_unit_ids - old_unit_ids
+        Membership.objects.bulk_create(
+            [Membership(virtualfolder_id=self.id, unit_id=unit_id)
+             for unit_id in added_ids],
+            batch_size=MEMBERSHIP_CHUNK_SIZE,
+        )
+
+        # Units that left or joined this vfolder need their priority updated,
+        # and all of them if the priority of this vfolder changed.
+        if self.priority != old_priority:
+            update_units_priority(old_unit_ids | new_unit_ids)
+        else:
+            update_units_priority(added_ids.union(removed_ids))
+
+        update_paths_index(added_ids)
+        update_paths_index(removed_ids, increment=-1)
+
+        if added_ids or removed_ids:
+            changed_ids = list(added_ids.union(removed_ids))
+            tp_ids = set()
+            for begin in range(0, len(changed_ids), MEMBERSHIP_CHUNK_SIZE):
+                tp_ids.update(Unit.simple_objects.filter(
+                    id__in=changed_ids[begin:begin+MEMBERSHIP_CHUNK_SIZE],
+                ).values_list('translation_project', flat=True).distinct())
 
-        # Recreate relationships between this vfolder and units.
-        for location in self.get_all_pootle_paths():
-            for filename in self.filter_rules.split(","):
-                vf_file = "".join([location, filename])
+            for tp in TranslationProject.objects.filter(id__in=tp_ids):
+                VirtualFolderTreeItem(self, tp).update_all_cache()
 
-                qs = Store.objects.live().filter(pootle_path=vf_file)
+    def delete(self, *args, **kwargs):
+        unit_ids = list(self.units.values_list('id', flat=True))
+        for vf_treeitem in self.get_treeitems():
+            vf_treeitem.clear_all_cache(children=False, parents=False)
 
-                if qs.exists():
-                    self.units.add(*qs[0].units.all())
-                else:
-                    if not vf_file.endswith("/"):
-                        vf_file += "/"
+        super(VirtualFolder, self).delete(*args, **kwargs)
 
-                    if Directory.objects.filter(pootle_path=vf_file).exists():
-                        qs = Unit.objects.filter(
-                            store__pootle_path__startswith=vf_file
-                        )
-                        self.units.add(*qs)
+        update_units_priority(unit_ids)
+        update_paths_index(unit_ids, increment=-1)
 
     def clean_fields(self):
         """Validate virtual folder fields."""
@@ -117,47 +413,138 @@ class VirtualFolder(models.Model):
             raise ValidationError(u'The "/" location is not allowed. Use '
                                   u'"/{LANG}/{PROJ}/" instead.')
 
-    def get_all_pootle_paths(self):
-        """Return a list with all the locations this virtual folder applies.
+    def get_treeitems(self):
+        """Return the tree items holding the stats of this virtual folder in
+        each translation project it has units in."""
+        tp_ids = self.units.values_list('translation_project', flat=True) \
+                           .order_by().distinct()
 
-        If the virtual folder location has no {LANG} nor {PROJ} placeholders
-        then the list only contains its location. If any of the placeholders is
-        present, then they get expanded to match all the existing languages and
-        projects.
+        return [VirtualFolderTreeItem(self, tp) for tp in
+                TranslationProject.objects.filter(id__in=tp_ids)]
+
+    def get_rule_regexes(self):
+        """Return a list of `(dir_regex, file_regex)` tuples with the regular
+        expressions matching the pootle paths of each filter rule.
+
+        `dir_regex` matches the beginning of the paths of the stores below the
+        directory the rule might refer to, and `file_regex` matches the whole
+        path of the store it might refer to. `file_regex` is `None` for rules
+        ending with a slash.
         """
         # Locations like /project/<my_proj>/ are not handled correctly. So
         # rewrite them.
-        if self.location.startswith("/projects/"):
-            self.location = self.location.replace("/projects/", "/{LANG}/")
-
-        if "{LANG}" in self.location and "{PROJ}" in self.location:
-            locations = []
-            for lang in Language.objects.all():
-                temp = self.location.replace("{LANG}", lang.code)
-                for proj in Project.objects.all():
-                    locations.append(temp.replace("{PROJ}", proj.code))
-            return locations
-        elif "{LANG}" in self.location:
-            try:
-                project = Project.objects.get(code=self.location.split("/")[2])
-                languages = project.languages.iterator()
-            except:
-                languages = Language.objects.iterator()
-
-            return [self.location.replace("{LANG}", lang.code)
-                    for lang in languages]
-        elif "{PROJ}" in self.location:
-            try:
-                projects = Project.objects.filter(
-                    translationproject__language__code=self.location.split("/")[1]
-                ).iterator()
-            except:
-                projects = Project.objects.iterator()
-
-            return [self.location.replace("{PROJ}", proj.code)
-                    for proj in projects]
-
-        return [self.location]
+        location = self.location
+        if location.startswith("/projects/"):
+            location = location.replace("/projects/", "/{LANG}/")
+
+        regexes = []
+        for filename in self.filter_rules.split(","):
+            vf_file = "".join([location, filename])
+
+            if vf_file.endswith("/"):
+                regexes.append((u"^" + get_path_regex(vf_file), None))
+            else:
+                regexes.append((u"^%s/" % get_path_regex(vf_file),
+                                u"^%s$" % get_path_regex(vf_file)))
+
+        return regexes
+
+    def get_unit_ids(self):
+        """Return the set of IDs of the units matched by this virtual folder.
+
+        Each filter rule matches either a live store or all the stores below a
+        directory, in any of the locations this virtual folder applies. Units
+        are retrieved using a single query per filter rule.
+        """
+        unit_ids = set()
+        for dir_regex, file_regex in self.get_rule_regexes():
+            lookup = Q(store__pootle_path__regex=dir_regex)
+            if file_regex is not None:
+                lookup |= Q(
+                    store__pootle_path__regex=file_regex,
+                    store__obsolete=False,
+                    state__gt=OBSOLETE,
+                )
+
+            unit_ids.update(Unit.simple_objects.filter(lookup)
+                                               .values_list('id', flat=True))
+
+        return unit_ids
+
+
+class VirtualFolderTreeItem(CachedTreeItem):
+    """Stats of the units of a virtual folder in a translation project.
+
+    These are leaf tree items: their stats are not added to the stats of any
+    directory, since the units are already counted in their stores.
+    """
+
+    def __init__(self, vfolder, translation_project):
+        super(VirtualFolderTreeItem, self).__init__()
+        self.vfolder = vfolder
+        self.translation_project = translation_project
+
+    @classmethod
+    def get_for_store(cls, store):
+        """Return the tree items of the virtual folders having units in
+        `store`."""
+        vfolders = VirtualFolder.objects.filter(units__store=store).distinct()
+
+        return [cls(vfolder, store.translation_project)
+                for vfolder in vfolders]
+
+    @property
+    def code(self):
+        return self.vfolder.name
+
+    @property
+    def pootle_path(self):
+        return u"/vfolders/%d%s" % (self.vfolder.id,
+                                   self.translation_project.pootle_path)
+
+    @property
+    def units(self):
+        return Unit.simple_objects.filter(
+            vfolders=self.vfolder,
+            translation_project=self.translation_project,
+            state__gt=OBSOLETE,
+        )
+
+    ### TreeItem
+
+    def get_cachekey(self):
+        return self.pootle_path
+
+    def all_pootle_paths(self):
+        # Not part of the directory tree, so there are no parents to register
+        # as dirty
+        return [self.get_cachekey()]
+
+    def _get_wordcount_stats(self):
+        return calc_wordcount_stats(self.units)
+
+    def _get_checks(self):
+        return calc_check_stats(QualityCheck.objects.filter(
+            unit__vfolders=self.vfolder,
+            unit__translation_project=self.translation_project,
+            unit__state__gt=UNTRANSLATED,
+            false_positive=False,
+        ))
+
+    def _get_suggestion_count(self):
+        return Suggestion.objects.filter(
+            unit__vfolders=self.vfolder,
+            unit__translation_project=self.translation_project,
+            unit__state__gt=OBSOLETE,
+            state=SuggestionStates.PENDING,
+        ).count()
+
+    ### /TreeItem
+
+
+@receiver([post_delete, post_save], sender=VirtualFolder)
+def invalidate_rules_matcher(sender, instance, **kwargs):
+    cache.delete(RULES_VERSION_KEY)
 
 
 @receiver(post_save, sender=Unit)
@@ -168,18 +555,36 @@ def relate_unit(sender, instance, created=False, **kwargs):
     some of their units might be matched by the filters of any of the
     previously existing virtual folders, so this signal handler relates those
     new units to the virtual folders they belong to, if any.
+
+    Units created while their store is being parsed or updated are related
+    all at once when the store gets unlocked.
     """
     if not created:
         return
 
-    pootle_path = instance.store.pootle_path
+    store = instance.store
+    if store.state == LOCKED:
+        if not hasattr(store, '_new_vfolder_unit_ids'):
+            store._new_vfolder_unit_ids = []
+        store._new_vfolder_unit_ids.append(instance.id)
+        return
+
+    relate_units(store, [(instance.id, instance.state)])
+
+
+@receiver(post_save, sender=Store)
+def relate_new_store_units(sender, instance, **kwargs):
+    unit_ids = getattr(instance, '_new_vfolder_unit_ids', None)
+    if instance.state == LOCKED or not unit_ids:
+        return
+
+    del instance._new_vfolder_unit_ids
 
-    for vf in VirtualFolder.objects.iterator():
-        for location in vf.get_all_pootle_paths():
-            if not pootle_path.startswith(location):
-                continue
+    # Retrieve the current states, skipping any units removed meanwhile
+    units = []
+    for begin in range(0, len(unit_ids), MEMBERSHIP_CHUNK_SIZE):
+        units.extend(Unit.simple_objects.filter(
+            id__in=unit_ids[begin:begin+MEMBERSHIP_CHUNK_SIZE],
+        ).values_list('id', 'state'))
 
-            for filename in vf.filter_rules.split(","):
-                if pootle_path == "".join([location, filename]):
-                    vf.units.add(instance)
-                    break
+    relate_units(instance, units)
@@ -9,7 +9,7 @@
 
 from django.utils.translation import ugettext_lazy as _
 
-from virtualfolder.models import VirtualFolder
+from virtualfolder.models import has_vfolder_units
 
 
 HEADING_CHOICES = [
@@ -92,7 +92,7 @@ def make_generic_item(path_obj, **kwargs):
 def make_directory_item(directory):
     filters = {}
 
-    if VirtualFolder.get_matching_for(directory.pootle_path).count():
+    if has_vfolder_units(directory.pootle_path):
         # The directory has virtual folders, so append priority sorting to URL.
         filters['sort'] = 'priority'
 
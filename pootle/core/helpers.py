@@ -18,7 +18,7 @@ from pootle_misc.forms import make_search_form
 from pootle_misc.stats import get_translation_states
 from pootle_store.models import Store, Unit
 from pootle_store.views import get_step_query
-from virtualfolder.models import VirtualFolder
+from virtualfolder.models import has_vfolder_units
 
 from .url_helpers import get_path_parts, get_previous_url
 
@@ -147,7 +147,7 @@ def get_overview_context(request):
     filters = {}
 
     if (not isinstance(resource_obj, Store) and
-        VirtualFolder.get_matching_for(request.pootle_path).count()):
+        has_vfolder_units(request.pootle_path)):
         filters['sort'] = 'priority'
 
     url_action_continue = resource_obj.get_translate_url(state='incomplete',
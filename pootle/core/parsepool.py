@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""In-process pools for parsed translation stores and other expensive
+objects, bounded by entry count and by their estimated memory footprint."""
+
+import logging
+import sys
+import threading
+from collections import OrderedDict
+
+
+# Rough in-memory overhead of a single parsed unit (object, dicts, lists)
+UNIT_OVERHEAD = 1024
+
+# Parsed stores usually take several times their on-disk size in memory
+FILE_SIZE_FACTOR = 4
+
+
+_pools = OrderedDict()
+
+
+def get_pools():
+    """Return the list of registered parse pools."""
+    return _pools.values()
+
+
+def get_pool_stats():
+    """Return the counters of all the registered parse pools."""
+    return [pool.stats() for pool in get_pools()]
+
+
+def estimate_units_size(units):
+    """Estimate the memory used by a sequence of toolkit units."""
+    size = 0
+    for unit in units:
+        size += UNIT_OVERHEAD
+        for text in (unit.source, unit.target):
+            if text:
+                size += sys.getsizeof(text)
+    return size
+
+
+class ParsePool(object):
+    """Thread-safe LRU mapping that evicts its least recently used entries
+    whenever it holds more than `max_entries` items or its entries are
+    estimated to take more than `max_bytes` bytes.
+
+    :param name: Name used to identify the pool in the admin dashboard.
+    :param max_entries: Maximum number of entries. `0` means unbounded.
+    :param max_bytes: Maximum estimated size in bytes. `0` means unbounded.
+    :param sizeof: Callable returning the estimated size of a value.
+    """
+
+    def __init__(self, name, max_entries=0, max_bytes=0, sizeof=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or sys.getsizeof
+
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        _pools[name] = self
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value, size = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                raise
+
+            self._entries[key] = (value, size)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        size = self._get_size(value)
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, size)
+            self.bytes += size
+            self._cull(keep=key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            if not self._discard(key):
+                raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def resize(self, key):
+        """Re-estimate the size of the value stored for `key`, needed
+        after it was modified in place. The entry also becomes the most
+        recently used one, so culling evicts older entries first."""
+        with self._lock:
+            try:
+                value, old_size = self._entries.pop(key)
+            except KeyError:
+                return
+
+            size = self._get_size(value)
+            self._entries[key] = (value, size)
+            self.bytes += size - old_size
+            self._cull(keep=key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _get_size(self, value):
+        try:
+            return max(int(self.sizeof(value)), 0)
+        except Exception:
+            logging.exception(u"Cannot estimate size of %r in parse pool %s",
+                              value, self.name)
+            return 0
+
+    def _discard(self, key):
+        try:
+            value, size = self._entries.pop(key)
+        except KeyError:
+            return False
+
+        self.bytes -= size
+        return True
+
+    def _is_full(self):
+        return ((self.max_entries and len(self._entries) > self.max_entries) or
+                (self.max_bytes and self.bytes > self.max_bytes))
+
+    def _cull(self, keep=None):
+        """Evict least recently used entries until the pool is within its
+        bounds. The `keep` entry is never evicted, so a single oversized
+        value is still cached until something else replaces it."""
+        while self._is_full() and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._discard(key)
+            self.evictions += 1
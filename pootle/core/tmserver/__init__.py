@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Translation memory server.
+
+TM documents are indexed and searched by the engine set in the `ENGINE`
+param of the ``POOTLE_TM_SERVER`` setting:
+
+- `pootle.core.tmserver.es.ElasticsearchEngine` (the default) uses an
+  Elasticsearch index.
+- `pootle.core.tmserver.local.LocalEngine` stores the TM in the database.
+
+Search results are cached per language and source text until new documents
+are indexed for the language.
+
+Engines are created on first use, once per process. Calls to them go
+through a circuit breaker: while the TM server keeps failing, searches
+return no suggestions right away and indexing is postponed.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+from django_rq import get_connection, job
+
+from pootle_misc.util import import_func
+
+from .breaker import CircuitBreaker
+
+
+logger = logging.getLogger(__name__)
+
+#: Redis list of the documents waiting to be indexed
+POOTLE_TM_QUEUE = 'pootle:tmserver:queue'
+#: Redis key set while a job flushing the queue is pending
+POOTLE_TM_FLUSH_SCHEDULED = 'pootle:tmserver:flush_scheduled'
+#: Redis lock held while a batch is being indexed
+POOTLE_TM_FLUSH_LOCK = 'pootle:tmserver:flush_lock'
+
+#: Seconds after which the flush lock expires if its holder didn't release it
+FLUSH_LOCK_TIMEOUT = 600
+#: Seconds writers over the queue limit wait for the flush lock
+FLUSH_LOCK_WAIT = 1
+
+#: Attempts made to index a batch before putting it back in the queue
+MAX_ATTEMPTS = 3
+#: Seconds to wait before the first retry, doubled on every attempt
+RETRY_DELAY = 1
+
+#: Consecutive failures after which the TM server is no longer called
+MAX_FAILURES = 3
+#: Seconds to wait before calling a failing TM server again
+RESET_TIMEOUT = 30
+
+DEFAULT_ENGINE = 'pootle.core.tmserver.es.ElasticsearchEngine'
+
+
+def get_params():
+    params = getattr(settings, 'POOTLE_TM_SERVER', None)
+
+    if params is not None:
+        return params['default']
+
+    return None
+
+
+class TMServerUnavailable(Exception):
+    """The TM server failed too many times to be called again yet."""
+
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+circuit_breaker = CircuitBreaker(MAX_FAILURES, RESET_TIMEOUT)
+
+
+def get_engine():
+    """Return the configured TM engine, or `None` if there is none or it
+    can't be used.
+
+    Engines are shared by the threads of a process, but forked processes
+    (such as RQ jobs) create their own.
+    """
+    global _engine, _engine_pid, circuit_breaker
+
+    if _engine is None or _engine_pid != os.getpid():
+        params = get_params()
+        if params is None:
+            return None
+
+        engine_class = import_func(params.get('ENGINE', DEFAULT_ENGINE))
+        if not engine_class.is_available():
+            return None
+
+        with _engine_lock:
+            if _engine is None or _engine_pid != os.getpid():
+                _engine = engine_class(params)
+                _engine_pid = os.getpid()
+                circuit_breaker = CircuitBreaker(MAX_FAILURES, RESET_TIMEOUT)
+
+    return _engine
+
+
+def reset_engine():
+    """Forget the current engine."""
+    global _engine
+    _engine = None
+
+
+def update(language, obj):
+    """Queue `obj` to be indexed in the TM of `language`.
+
+    Documents are sent to the TM server in batches by an RQ job. If the
+    queue grows over ``POOTLE_TM_QUEUE_MAX_LENGTH`` because the job can't
+    keep up, a batch is indexed from the calling process before returning,
+    unless the TM server is failing or another process is already sending a
+    batch. Errors doing so are logged, never raised.
+    """
+    if get_engine() is None:
+        return
+
+    r_con = get_connection()
+    length = r_con.rpush(POOTLE_TM_QUEUE,
+                         json.dumps({'language': language, 'doc': obj}))
+
+    max_length = settings.POOTLE_TM_QUEUE_MAX_LENGTH
+    # Trial calls to a failing TM server are left to the RQ job
+    if max_length and length > max_length and not circuit_breaker.is_open:
+        try:
+            flush_batch(r_con, blocking_timeout=FLUSH_LOCK_WAIT)
+        except Exception:
+            logger.warning('TM server indexing failed, postponing it',
+                           exc_info=True)
+
+    if r_con.set(POOTLE_TM_FLUSH_SCHEDULED, 1, nx=True,
+                 ex=settings.RQ_QUEUES['default']['DEFAULT_TIMEOUT']):
+        flush_queue.delay()
+
+
+def index_documents(items):
+    """Index the `(language, doc)` pairs of `items` in a single request,
+    retrying when the TM server can't be reached.
+
+    Only the last version of documents appearing more than once is sent.
+
+    :raise TMServerUnavailable: if the TM server is still deemed unhealthy.
+    """
+    docs = OrderedDict()
+    for language, doc in items:
+        key = (language, doc['id'])
+        docs.pop(key, None)
+        docs[key] = doc
+
+    if not docs:
+        return
+
+    items = [(language, doc) for (language, doc_id), doc in docs.iteritems()]
+    engine = get_engine()
+    if not circuit_breaker.allow():
+        raise TMServerUnavailable
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            engine.index(items)
+        except Exception:
+            circuit_breaker.failure()
+            if attempt + 1 == MAX_ATTEMPTS or circuit_breaker.is_open:
+                raise
+
+            logger.warning('TM server indexing failed, retrying',
+                           exc_info=True)
+            time.sleep(RETRY_DELAY * 2 ** attempt)
+        else:
+            circuit_breaker.success()
+            break
+
+    for language in set(language for language, doc in items):
+        cache.delete(get_cache_version_key(language))
+
+
+def flush_batch(r_con=None, blocking_timeout=None):
+    """Index the next batch of queued documents and return its length.
+
+    Batches are indexed one at a time across processes, so that documents
+    are indexed in the order they were queued and an older version of a
+    document never overwrites a newer one.
+
+    If the TM server can't be reached, the batch is put back at the head of
+    the queue and the error raised.
+
+    :param blocking_timeout: seconds to wait for another process to finish
+        indexing its batch, forever by default. Nothing is indexed if it's
+        still busy after that.
+    """
+    r_con = r_con or get_connection()
+    batch_size = settings.POOTLE_TM_BATCH_SIZE
+
+    lock = r_con.lock(POOTLE_TM_FLUSH_LOCK, timeout=FLUSH_LOCK_TIMEOUT,
+                      blocking_timeout=blocking_timeout)
+    if not lock.acquire():
+        return 0
+
+    try:
+        with r_con.pipeline() as pipe:
+            pipe.lrange(POOTLE_TM_QUEUE, 0, batch_size - 1)
+            pipe.ltrim(POOTLE_TM_QUEUE, batch_size, -1)
+            batch = pipe.execute()[0]
+
+        if not batch:
+            return 0
+
+        items = []
+        for data in batch:
+            data = json.loads(data)
+            items.append((data['language'], data['doc']))
+
+        try:
+            index_documents(items)
+        except Exception:
+            r_con.lpush(POOTLE_TM_QUEUE, *reversed(batch))
+            raise
+    finally:
+        lock.release()
+
+    return len(batch)
+
+
+@job('default', timeout=18000)
+def flush_queue():
+    """RQ job indexing all the queued documents."""
+    r_con = get_connection()
+    r_con.delete(POOTLE_TM_FLUSH_SCHEDULED)
+
+    while flush_batch(r_con):
+        pass
+
+
+def get_cache_version_key(language):
+    return 'pootle:tmserver:version:%s' % language
+
+
+def get_cache_key(language, text):
+    """Return the key caching the TM hits for `text` in `language`.
+
+    Keys embed a per-language version, replaced whenever documents are
+    indexed for the language, so that stale results are never returned.
+    """
+    version_key = get_cache_version_key(language)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time(), None)
+        version = cache.get(version_key)
+
+    return 'pootle:tmserver:%s:%s:%s' % (
+        language, version, md5(text.encode('utf-8')).hexdigest(),
+    )
+
+
+def get_language(unit):
+    return unit.store.translation_project.language.code
+
+
+def get_suggestions(unit, hits):
+    """Return the TM suggestions for `unit` out of the `hits` of the engine,
+    grouping identical translations."""
+    counter = {}
+    res = []
+
+    for hit in hits:
+        if str(unit.id) == str(hit['id']):
+            continue
+
+        if hit['target'] not in counter:
+            counter[hit['target']] = 1
+            res.append({
+                'unit_id': hit['id'],
+                'source': hit['source'],
+                'target': hit['target'],
+                'project': hit['project'],
+                'path': hit['path'],
+                'username': hit['username'],
+                'fullname': hit['fullname'],
+                'email_md5': hit['email_md5'],
+            })
+        else:
+            counter[hit['target']] += 1
+
+    for item in res:
+        item['count'] = counter[item['target']]
+
+    return res
+
+
+def search(unit):
+    return search_many([unit])[unit.id]
+
+
+def search_many(units):
+    """Return the TM suggestions for all `units`, keyed by unit ID.
+
+    Units whose results aren't cached are looked up at once. If the TM
+    server fails or is deemed unhealthy, they get no suggestions.
+    """
+    units = list(units)
+    engine = get_engine()
+    if engine is None:
+        return dict((unit.id, None) for unit in units)
+
+    keys = dict((unit.id, get_cache_key(get_language(unit),
+                                        unicode(unit.source)))
+                for unit in units)
+    hits = cache.get_many(set(keys.values()))
+
+    missing = OrderedDict()
+    for unit in units:
+        if keys[unit.id] not in hits:
+            missing[keys[unit.id]] = (get_language(unit),
+                                      unicode(unit.source))
+
+    if missing:
+        results = None
+        if circuit_breaker.allow():
+            try:
+                results = engine.search_many(missing.values())
+            except Exception:
+                circuit_breaker.failure()
+                logger.warning('TM server search failed', exc_info=True)
+            else:
+                circuit_breaker.success()
+
+        if results is not None:
+            new_hits = dict(zip(missing.keys(), results))
+            cache.set_many(new_hits, settings.OBJECT_CACHE_TIMEOUT)
+        else:
+            new_hits = dict((key, []) for key in missing)
+        hits.update(new_hits)
+
+    return dict((unit.id, get_suggestions(unit, hits[keys[unit.id]]))
+                for unit in units)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+
+class BaseTMEngine(object):
+    """Base class of the TM engines.
+
+    Engines store TM documents, the dictionaries built by
+    `Unit.get_tmserver_doc()`, in a separate TM per language and return
+    the documents similar to a source text as search hits.
+
+    :param params: the ``POOTLE_TM_SERVER['default']`` setting.
+    """
+
+    def __init__(self, params):
+        self.params = params
+
+    @classmethod
+    def is_available(cls):
+        """Whether the dependencies of the engine are installed."""
+        return True
+
+    def clear(self):
+        """Remove all the documents."""
+        raise NotImplementedError
+
+    def index(self, items):
+        """Add or replace the documents of the `(language, doc)` pairs of
+        `items`."""
+        raise NotImplementedError
+
+    def search(self, language, text):
+        """Return the documents relevant to the source `text` in the TM of
+        `language`, most relevant first."""
+        raise NotImplementedError
+
+    def search_many(self, queries):
+        """Return the search hits for each of the `(language, text)` pairs of
+        `queries`."""
+        return [self.search(language, text) for language, text in queries]
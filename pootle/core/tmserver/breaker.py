@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import threading
+import time
+
+
+class CircuitBreaker(object):
+    """Stop calling a failing service for a while.
+
+    After `max_failures` consecutive failures the breaker opens and
+    `allow()` returns `False` for `reset_timeout` seconds. Then a single
+    trial call is allowed: the breaker closes again if it succeeds, and
+    stays open for another `reset_timeout` seconds otherwise.
+    """
+
+    def __init__(self, max_failures=3, reset_timeout=30):
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """Whether the service can be called now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+
+            if time.time() - self.opened_at < self.reset_timeout:
+                return False
+
+            # Let one trial call through, and keep others out meanwhile
+            self.opened_at = time.time()
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                self.opened_at = time.time()
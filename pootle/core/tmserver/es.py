@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+from __future__ import absolute_import
+
+import logging
+
+try:
+    from elasticsearch import Elasticsearch as ES
+except:
+    ES = None
+
+from .base import BaseTMEngine
+
+
+logger = logging.getLogger(__name__)
+
+#: Default seconds to wait for a search response
+DEFAULT_TIMEOUT = 2
+#: Default number of connections kept open to the server, per process
+DEFAULT_MAX_CONNECTIONS = 10
+#: Seconds to wait for a bulk indexing response
+BULK_TIMEOUT = 60
+
+
+class ElasticsearchEngine(BaseTMEngine):
+    """TM stored in an Elasticsearch index, using a document type per
+    language.
+
+    Params: `HOST`, `PORT`, `INDEX_NAME`, `MIN_SCORE`, the minimum
+    Elasticsearch score of the returned hits, `TIMEOUT`, the seconds to
+    wait for search responses (2 by default) and `MAX_CONNECTIONS`, the size
+    of the connection pool (10 by default).
+
+    The index is created when first used.
+    """
+
+    def __init__(self, params):
+        super(ElasticsearchEngine, self).__init__(params)
+
+        self.index_name = params['INDEX_NAME']
+        self.es = ES(
+            [{'host': params['HOST'], 'port': params['PORT']}, ],
+            timeout=params.get('TIMEOUT', DEFAULT_TIMEOUT),
+            maxsize=params.get('MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS),
+            # Failures are retried by the callers, if at all
+            max_retries=0,
+        )
+        self._index_exists = False
+
+    def ensure_index(self):
+        if not self._index_exists:
+            if not self.es.indices.exists(self.index_name):
+                self.es.indices.create(self.index_name)
+            self._index_exists = True
+
+    @classmethod
+    def is_available(cls):
+        return ES is not None
+
+    def clear(self):
+        self.es.indices.delete(index=self.index_name, ignore=404)
+        self.es.indices.create(index=self.index_name)
+        self._index_exists = True
+
+    def index(self, items):
+        body = []
+        for language, doc in items:
+            body.append({
+                'index': {
+                    '_index': self.index_name,
+                    '_type': language,
+                    '_id': doc['id'],
+                },
+            })
+            body.append(doc)
+
+        self.ensure_index()
+        response = self.es.bulk(body=body, request_timeout=BULK_TIMEOUT)
+        if response.get('errors'):
+            for item in response['items']:
+                if 'error' in item['index']:
+                    logger.error('Could not index unit %s in the TM server: '
+                                 '%s', item['index']['_id'],
+                                 item['index']['error'])
+
+    def get_query(self, text):
+        return {"query": {"match": {'source': text}}}
+
+    def get_hits(self, es_res):
+        return [hit['_source'] for hit in es_res['hits']['hits']
+                if hit['_score'] >= self.params['MIN_SCORE']]
+
+    def search(self, language, text):
+        self.ensure_index()
+        es_res = self.es.search(index=self.index_name,
+                                doc_type=language,
+                                body=self.get_query(text))
+
+        return self.get_hits(es_res)
+
+    def search_many(self, queries):
+        body = []
+        for language, text in queries:
+            body.append({
+                'index': self.index_name,
+                'type': language,
+            })
+            body.append(self.get_query(text))
+
+        if not body:
+            return []
+
+        self.ensure_index()
+        responses = self.es.msearch(body=body)['responses']
+
+        return [self.get_hits(es_res) for es_res in responses]
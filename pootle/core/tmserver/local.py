@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""TM engine storing the TM in the database.
+
+Documents are stored as `TMUnit` rows, along with `TMTrigram` postings for
+the trigrams of their source text. Searches look up the TM units sharing
+enough trigrams with the searched text among those whose length could
+reach the minimum similarity, then rank them by edit distance.
+"""
+
+from __future__ import absolute_import
+
+import math
+
+from django.db import transaction
+from django.db.models import Count
+
+from pootle.core.utils.distance import get_similarity
+from pootle_store.models import TMTrigram, TMUnit
+from pootle_store.trigram_index import N, get_trigrams
+
+from .base import BaseTMEngine
+
+
+#: Default minimum similarity of the returned hits, in percent
+DEFAULT_MIN_SCORE = 75
+
+#: Maximum number of TM units compared to the searched text
+MAX_CANDIDATES = 100
+
+#: Maximum number of hits returned per search
+MAX_RESULTS = 10
+
+#: Fields of `TMUnit` returned as document fields
+DOC_FIELDS = ('id', 'source', 'target', 'revision', 'project', 'path',
+              'username', 'fullname', 'email_md5')
+
+
+class LocalEngine(BaseTMEngine):
+    """TM stored in the Pootle database.
+
+    Params: `MIN_SCORE`, the minimum similarity in percent of the returned
+    hits (75 by default).
+    """
+
+    @property
+    def min_score(self):
+        return self.params.get('MIN_SCORE', DEFAULT_MIN_SCORE)
+
+    def clear(self):
+        TMTrigram.objects.all().delete()
+        TMUnit.objects.all().delete()
+
+    def index(self, items):
+        tm_units = []
+        trigrams = []
+        for language, doc in items:
+            length = len(doc['source'])
+            tm_units.append(TMUnit(
+                language=language,
+                source_length=length,
+                **dict((field, doc[field]) for field in DOC_FIELDS)
+            ))
+            trigrams.extend(
+                TMTrigram(tm_unit_id=doc['id'], language=language,
+                          source_length=length, trigram=trigram)
+                for trigram in get_trigrams(doc['source'])
+            )
+
+        ids = [tm_unit.id for tm_unit in tm_units]
+        with transaction.atomic():
+            TMTrigram.objects.filter(tm_unit__in=ids).delete()
+            TMUnit.objects.filter(id__in=ids).delete()
+            TMUnit.objects.bulk_create(tm_units)
+            TMTrigram.objects.bulk_create(trigrams)
+
+    def get_candidates(self, language, text):
+        """Return the TM units of `language` that might be similar enough
+        to `text`.
+
+        Candidates can't differ in length from `text` by more than the
+        allowed number of edits, and each edit removes at most `N`
+        trigrams, so candidates must share all the other trigrams.
+        """
+        ratio = self.min_score / 100.0
+        min_length = int(math.ceil(len(text) * ratio))
+        max_length = int(len(text) / ratio) if ratio else len(text) * 2
+        tm_units = TMUnit.objects.filter(language=language)
+
+        trigrams = get_trigrams(text)
+        if not trigrams:
+            return tm_units.filter(source=text)
+
+        max_distance = int((1 - ratio) * max_length)
+        rows = TMTrigram.objects.filter(
+            language=language,
+            trigram__in=trigrams,
+            source_length__range=(min_length, max_length),
+        ).values('tm_unit').annotate(
+            shared=Count('id'),
+        ).filter(
+            shared__gte=max(1, len(trigrams) - N * max_distance),
+        ).order_by('-shared')[:MAX_CANDIDATES]
+
+        return tm_units.filter(id__in=[row['tm_unit'] for row in rows])
+
+    def search(self, language, text):
+        if not text:
+            return []
+
+        hits = []
+        ratio = self.min_score / 100.0
+        for tm_unit in self.get_candidates(language, text):
+            length = max(len(text), len(tm_unit.source))
+            score = get_similarity(text, tm_unit.source,
+                                   limit=int((1 - ratio) * length))
+            if score >= self.min_score:
+                hits.append((score, tm_unit))
+
+        hits.sort(key=lambda (score, tm_unit): (-score, -tm_unit.revision))
+
+        return [dict((field, getattr(tm_unit, field)) for field in DOC_FIELDS)
+                for score, tm_unit in hits[:MAX_RESULTS]]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+try:
+    from Levenshtein import distance as levenshtein
+except ImportError:
+    levenshtein = None
+
+
+def get_distance(a, b, limit):
+    """Return the edit distance between `a` and `b`, or `limit + 1` if it
+    is greater than `limit`.
+
+    Only the cells within `limit` of the diagonal are computed.
+    """
+    too_far = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return too_far
+
+    if levenshtein is not None:
+        return min(levenshtein(a, b), too_far)
+
+    previous = [i if i <= limit else too_far for i in range(len(a) + 1)]
+    for j in range(1, len(b) + 1):
+        current = [too_far] * (len(a) + 1)
+        if j <= limit:
+            current[0] = j
+
+        first = max(1, j - limit)
+        last = min(len(a), j + limit)
+        for i in range(first, last + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[i] = min(previous[i] + 1, current[i - 1] + 1,
+                             previous[i - 1] + cost, too_far)
+
+        if min(current[first - 1:last + 1]) > limit:
+            return too_far
+
+        previous = current
+
+    return previous[len(a)]
+
+
+def get_similarity(a, b, limit=None):
+    """Return the similarity of `a` and `b` in percent, based on their edit
+    distance. Distances over `limit` yield `0`."""
+    length = max(len(a), len(b))
+    if not length:
+        return 100
+
+    if limit is None:
+        limit = length
+
+    distance = get_distance(a, b, limit)
+    if distance > limit:
+        return 0
+
+    return 100 * (1 - float(distance) / length)
@@ -25,6 +25,21 @@ collections.UnitSet = Backbone.Collection.extend({
     this.chunkSize = opts.chunkSize;
     this.uIds = [];
     this.total = 0;
+    this.resultSet = null;
+  },
+
+  /* Stores a window of the result set's unit IDs starting at `offset`.
+   * IDs outside of the windows retrieved so far are left undefined. */
+  setIds: function (resultSet, total, offset, uIds) {
+    if (resultSet !== this.resultSet) {
+      this.uIds = [];
+      this.resultSet = resultSet;
+    }
+    this.total = total;
+
+    for (var i=0; i<uIds.length; i++) {
+      this.uIds[offset + i] = uIds[i];
+    }
   },
 
   comparator: function (unit) {
@@ -77,6 +77,10 @@ PTL.editor = {
     this.ctxStep= 1;
     this.preventNavigation = false;
 
+    /* Editing widgets fetched ahead of time, keyed by unit ID */
+    this.prefetchedEditors = {};
+    this.prefetchSize = 5;
+
     this.isLoading = true;
     this.showActivity();
 
@@ -1227,7 +1231,7 @@ PTL.editor = {
         }
       }
 
-      uIds = this.units.uIds.slice(begin, end);
+      uIds = _.compact(this.units.uIds.slice(begin, end));
       uIds = _.difference(uIds, fetchedIds);
 
       if (!uIds.length) {
@@ -1235,6 +1239,9 @@ PTL.editor = {
       }
 
       reqData.uids = uIds.join(',');
+      // Also retrieve the window of IDs around the current unit
+      reqData.resultset = this.units.resultSet;
+      reqData.offset = uIndex;
     }
 
     $.extend(reqData, this.getReqData());
@@ -1245,12 +1252,18 @@ PTL.editor = {
       dataType: 'json',
       cache: false,
       success: function (data) {
-        if (data.uIds) {
+        if (opts.initial) {
           // Clear old data and add new results
           PTL.editor.units.reset();
+          PTL.editor.units.uIds = [];
+          PTL.editor.units.total = 0;
+          PTL.editor.units.resultSet = null;
+          PTL.editor.prefetchedEditors = {};
+        }
 
-          PTL.editor.units.uIds = data.uIds;
-          PTL.editor.units.total = data.uIds.length;
+        if (data.uIds) {
+          PTL.editor.units.setIds(data.resultSet, data.total, data.offset,
+                                  data.uIds);
         }
 
         // Store view units in the client
@@ -1298,30 +1311,40 @@ PTL.editor = {
         uid = currentUnit.id,
         editUrl = l(['/xhr/units/', uid, '/edit/'].join('')),
         widget = '',
-        ctx = {before: [], after: []};
+        ctx = {before: [], after: []},
+        processData;
 
-    $.ajax({
-      url: editUrl,
-      async: false,
-      dataType: 'json',
-      success: function (data) {
-        PTL.editor.tmData = data.tm_suggestions || null;
-        widget = data.editor;
+    processData = function (data) {
+      PTL.editor.tmData = data.tm_suggestions || null;
+      widget = data.editor;
 
-        PTL.editor.updateNav();
+      PTL.editor.updateNav();
 
-        currentUnit.set('isObsolete', data.is_obsolete);
+      currentUnit.set('isObsolete', data.is_obsolete);
 
-        if (data.ctx) {
-          // Initialize context gap to the maximum context rows available
-          PTL.editor.ctxGap = Math.max(data.ctx.before.length,
-                                       data.ctx.after.length);
-          ctx.before = data.ctx.before;
-          ctx.after = data.ctx.after;
-        }
-      },
-      error: PTL.editor.error
-    });
+      if (data.ctx) {
+        // Initialize context gap to the maximum context rows available
+        PTL.editor.ctxGap = Math.max(data.ctx.before.length,
+                                     data.ctx.after.length);
+        ctx.before = data.ctx.before;
+        ctx.after = data.ctx.after;
+      }
+    };
+
+    if (this.prefetchedEditors.hasOwnProperty(uid)) {
+      processData(this.prefetchedEditors[uid]);
+      delete this.prefetchedEditors[uid];
+    } else {
+      $.ajax({
+        url: editUrl,
+        async: false,
+        dataType: 'json',
+        success: processData,
+        error: PTL.editor.error
+      });
+    }
+
+    this.prefetchEditors();
 
     eClass += currentUnit.get('isfuzzy') ? " fuzzy-unit" : "";
     eClass += PTL.editor.filter !== 'all' ? " with-ctx" : "";
@@ -1341,6 +1364,31 @@ PTL.editor = {
     return editUnit;
   },
 
+  /* Fetches the editing widgets of the units following the current one */
+  prefetchEditors: function () {
+    var uIndex = this.units.uIds.indexOf(this.units.getCurrent().id),
+        uIds = _.compact(this.units.uIds.slice(uIndex + 1,
+                                               uIndex + 1 + this.prefetchSize));
+
+    uIds = _.reject(uIds, function (uId) {
+      return this.prefetchedEditors.hasOwnProperty(uId);
+    }, this);
+
+    if (!uIds.length) {
+      return;
+    }
+
+    $.ajax({
+      url: l('/xhr/units/edit/'),
+      data: {uids: uIds.join(',')},
+      dataType: 'json',
+      cache: false,
+      success: function (data) {
+        $.extend(PTL.editor.prefetchedEditors, data.units);
+      }
+    });
+  },
+
   /* Pushes translation submissions and moves to the next unit */
   submit: function (e) {
     e.preventDefault();
@@ -1564,9 +1612,33 @@ PTL.editor = {
 
       if (index && !isNaN(index) && index > 0 &&
           index <= this.units.total) {
-        var uId = this.units.uIds[index-1],
-            newHash = utils.updateHashPart('unit', uId);
-        $.history.load(newHash);
+        var uId = this.units.uIds[index-1];
+
+        if (uId !== undefined) {
+          $.history.load(utils.updateHashPart('unit', uId));
+          return;
+        }
+
+        // The ID at `index` hasn't been retrieved yet
+        $.ajax({
+          url: l('/xhr/units/'),
+          data: $.extend({
+            path: this.settings.pootlePath,
+            resultset: this.units.resultSet,
+            offset: index - 1
+          }, this.getReqData()),
+          dataType: 'json',
+          cache: false,
+          success: function (data) {
+            if (data.uIds) {
+              PTL.editor.units.setIds(data.resultSet, data.total,
+                                      data.offset, data.uIds);
+              uId = PTL.editor.units.uIds[index-1];
+              uId && $.history.load(utils.updateHashPart('unit', uId));
+            }
+          },
+          error: PTL.editor.error
+        });
       }
     }
   },
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+from pootle.core.parsepool import ParsePool
+
+
+def test_parsepool_evicts_by_bytes():
+    """Tests least recently used entries are evicted by total size."""
+    pool = ParsePool('test-bytes', max_entries=10, max_bytes=100, sizeof=len)
+
+    pool['a'] = 'x' * 40
+    pool['b'] = 'x' * 40
+    assert pool.bytes == 80
+
+    # Touch 'a' so that 'b' becomes the least recently used entry
+    assert pool['a'] == 'x' * 40
+
+    pool['c'] = 'x' * 40
+    assert 'a' in pool
+    assert 'b' not in pool
+    assert 'c' in pool
+    assert pool.bytes == 80
+    assert pool.evictions == 1
+
+    # An oversized entry is kept on its own
+    pool['d'] = 'x' * 200
+    assert len(pool) == 1
+    assert pool.bytes == 200
+    assert pool.evictions == 3
+
+
+def test_parsepool_evicts_by_entries():
+    """Tests least recently used entries are evicted by number."""
+    pool = ParsePool('test-entries', max_entries=2, sizeof=len)
+
+    pool['a'] = 'a'
+    pool['b'] = 'b'
+    pool['c'] = 'c'
+    assert 'a' not in pool
+    assert len(pool) == 2
+
+
+def test_parsepool_counters():
+    """Tests hits, misses and sizes are accounted."""
+    pool = ParsePool('test-counters', max_bytes=100, sizeof=len)
+
+    with pytest.raises(KeyError):
+        pool['missing']
+    assert pool.get('missing') is None
+
+    value = ['x'] * 10
+    pool['a'] = value
+    assert pool['a'] is value
+
+    value.extend(['x'] * 10)
+    pool.resize('a')
+    assert pool.bytes == 20
+
+    pool['a'] = 'x' * 5
+    assert pool.bytes == 5
+
+    del pool['a']
+    assert pool.bytes == 0
+
+    stats = pool.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['evictions'] == 0
+    assert stats['entries'] == 0
+
+
+def test_parsepool_resize_oldest():
+    """Tests growing the least recently used entry evicts the others."""
+    pool = ParsePool('test-resize', max_bytes=100, sizeof=len)
+
+    value = ['x'] * 30
+    pool['a'] = value
+    pool['b'] = ['x'] * 30
+    pool['c'] = ['x'] * 30
+
+    value.extend(['x'] * 30)
+    pool.resize('a')
+    assert 'a' in pool
+    assert 'b' not in pool
+    assert 'c' in pool
+    assert pool.bytes == 90
+    assert pool.evictions == 1
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import json
+import threading
+
+import pytest
+
+from pootle.core import tmserver
+from pootle.core.tmserver import breaker as breaker_module
+from pootle.core.tmserver.base import BaseTMEngine
+from pootle.core.tmserver.breaker import CircuitBreaker
+from pootle.core.tmserver.local import LocalEngine
+from pootle.core.utils.distance import get_distance
+
+
+class RecordingEngine(BaseTMEngine):
+    """Records the documents sent to the TM server."""
+
+    def __init__(self, fail=False):
+        super(RecordingEngine, self).__init__({})
+        self.fail = fail
+        self.requests = []
+
+    def index(self, items):
+        if self.fail:
+            raise IOError('TM server unreachable')
+
+        self.requests.append(items)
+
+
+@pytest.fixture
+def tm_queue(monkeypatch, settings):
+    monkeypatch.setattr(tmserver, 'RETRY_DELAY', 0)
+    monkeypatch.setattr(tmserver, 'circuit_breaker', CircuitBreaker())
+    settings.POOTLE_TM_BATCH_SIZE = 2
+
+    r_con = tmserver.get_connection()
+    r_con.delete(tmserver.POOTLE_TM_QUEUE)
+
+    def _enqueue(*docs):
+        for language, doc_id, target in docs:
+            r_con.rpush(tmserver.POOTLE_TM_QUEUE, json.dumps({
+                'language': language,
+                'doc': {'id': doc_id, 'target': target},
+            }))
+
+    return _enqueue
+
+
+def test_flush_batch(tm_queue, monkeypatch):
+    """Tests queued documents are indexed in deduplicated batches."""
+    engine = RecordingEngine()
+    monkeypatch.setattr(tmserver, 'get_engine', lambda: engine)
+    tm_queue(('af', 1, u'een'), ('af', 1, u'twee'), ('fr', 1, u'un'))
+
+    assert tmserver.flush_batch() == 2
+    assert engine.requests == [[('af', {'id': 1, 'target': u'twee'})]]
+
+    assert tmserver.flush_batch() == 1
+    assert tmserver.flush_batch() == 0
+    assert len(engine.requests) == 2
+
+
+def test_flush_batch_failure(tm_queue, monkeypatch):
+    """Tests batches are put back in the queue when indexing fails."""
+    engine = RecordingEngine(fail=True)
+    monkeypatch.setattr(tmserver, 'get_engine', lambda: engine)
+    tm_queue(('af', 1, u'een'), ('af', 2, u'twee'), ('af', 3, u'drie'))
+
+    with pytest.raises(IOError):
+        tmserver.flush_batch()
+
+    r_con = tmserver.get_connection()
+    queued = [json.loads(data)['doc']['id']
+              for data in r_con.lrange(tmserver.POOTLE_TM_QUEUE, 0, -1)]
+    assert queued == [1, 2, 3]
+
+
+def test_flush_batch_serialized(tm_queue, monkeypatch):
+    """Tests batches aren't indexed while another process indexes one."""
+    engine = RecordingEngine()
+    monkeypatch.setattr(tmserver, 'get_engine', lambda: engine)
+    tm_queue(('af', 1, u'een'))
+
+    r_con = tmserver.get_connection()
+    r_con.delete(tmserver.POOTLE_TM_FLUSH_LOCK)
+    lock = r_con.lock(tmserver.POOTLE_TM_FLUSH_LOCK, timeout=10)
+    assert lock.acquire()
+
+    # Writers give up waiting after a while
+    assert tmserver.flush_batch(blocking_timeout=0.1) == 0
+
+    flusher = threading.Thread(target=tmserver.flush_batch)
+    flusher.start()
+    flusher.join(0.5)
+    assert flusher.is_alive()
+    assert r_con.llen(tmserver.POOTLE_TM_QUEUE) == 1
+
+    lock.release()
+    flusher.join(5)
+    assert not flusher.is_alive()
+    assert engine.requests == [[('af', {'id': 1, 'target': u'een'})]]
+
+
+@pytest.mark.django_db
+def test_update_failing_server(tm_queue, monkeypatch, settings,
+                               af_tutorial_po, system):
+    """Tests saving units doesn't fail nor wait when the queue is over its
+    limit and the TM server can't be reached."""
+    engine = RecordingEngine(fail=True)
+    calls = []
+
+    def index(items):
+        calls.append(items)
+        return RecordingEngine.index(engine, items)
+    engine.index = index
+
+    monkeypatch.setattr(tmserver, 'get_engine', lambda: engine)
+    monkeypatch.setattr(tmserver.flush_queue, 'delay', lambda: None)
+    settings.POOTLE_TM_QUEUE_MAX_LENGTH = 1
+    tm_queue(('af', 0, u'nul'))
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    unit = af_tutorial_po.units[0]
+    unit.target = u'Eerste vertaling'
+    unit.save()
+    assert len(calls) == tmserver.MAX_ATTEMPTS
+    assert tmserver.circuit_breaker.is_open
+
+    # The TM server is no longer called while it's deemed unhealthy
+    unit.target = u'Tweede vertaling'
+    unit.save()
+    assert len(calls) == tmserver.MAX_ATTEMPTS
+
+    # Nothing was lost
+    r_con = tmserver.get_connection()
+    queued = [json.loads(data)['doc']
+              for data in r_con.lrange(tmserver.POOTLE_TM_QUEUE, 0, -1)]
+    assert queued[0]['id'] == 0
+    assert queued[-1]['id'] == unit.id
+    assert queued[-1]['target'] == u'Tweede vertaling'
+
+
+def test_get_distance():
+    """Tests edit distances are only computed up to a limit."""
+    assert get_distance(u'kitten', u'sitting', 5) == 3
+    assert get_distance(u'kitten', u'sitting', 2) == 3
+    assert get_distance(u'kitten', u'kitten', 0) == 0
+    assert get_distance(u'kitten', u'kit', 2) == 3
+
+
+@pytest.mark.django_db
+def test_local_engine_search():
+    """Tests the local engine returns the similar sources of a language,
+    most similar first."""
+    def make_doc(doc_id, source, target):
+        return {
+            'id': doc_id, 'source': source, 'target': target, 'revision': 1,
+            'project': u'Tutorial', 'path': u'/af/tutorial/tutorial.po',
+            'username': u'', 'fullname': u'', 'email_md5': u'',
+        }
+
+    engine = LocalEngine({'MIN_SCORE': 75})
+    engine.index([
+        ('af', make_doc(1, u'Open the file', u'Maak die lêer oop')),
+        ('af', make_doc(2, u'Open the files', u'Maak die lêers oop')),
+        ('af', make_doc(3, u'Close the window', u'Maak die venster toe')),
+        ('fr', make_doc(4, u'Open the file', u'Ouvrir le fichier')),
+    ])
+
+    hits = engine.search('af', u'Open the file')
+    assert [hit['id'] for hit in hits] == [1, 2]
+    assert hits[0]['target'] == u'Maak die lêer oop'
+
+    # Documents are replaced when indexed again
+    engine.index([('af', make_doc(2, u'Save the file', u'Stoor die lêer'))])
+    assert [hit['id'] for hit in engine.search('af', u'Open the files')] == [1]
+
+
+def test_circuit_breaker(monkeypatch):
+    """Tests the breaker opens after repeated failures and lets a trial
+    call through once the reset timeout expires."""
+    now = [1000]
+    monkeypatch.setattr(breaker_module.time, 'time', lambda: now[0])
+    breaker = CircuitBreaker(max_failures=2, reset_timeout=30)
+
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.success()
+    assert breaker.allow()
+
+
+class FailingEngine(BaseTMEngine):
+
+    def __init__(self):
+        super(FailingEngine, self).__init__({})
+        self.calls = 0
+
+    def search(self, language, text):
+        self.calls += 1
+        raise IOError('TM server unreachable')
+
+
+@pytest.mark.django_db
+def test_search_unhealthy_server(af_tutorial_po, monkeypatch):
+    """Tests searches return no suggestions without calling the TM server
+    while it is deemed unhealthy."""
+    engine = FailingEngine()
+    monkeypatch.setattr(tmserver, 'get_engine', lambda: engine)
+    monkeypatch.setattr(tmserver, 'circuit_breaker',
+                        CircuitBreaker(max_failures=2))
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    unit = af_tutorial_po.units[0]
+
+    for i in range(3):
+        assert tmserver.search(unit) == []
+
+    assert engine.calls == 2
@@ -231,3 +231,13 @@ def test_broken_entities():
     ]
 
     do_test(check, tests)
+
+
+def test_check_flag_bits():
+    """Tests each tracked check has its own bit of the signed 64-bit mask."""
+    from pootle_misc.checks import CHECK_FLAG_BITS, check_names
+
+    bits = CHECK_FLAG_BITS.values()
+    assert len(set(bits)) == len(bits)
+    assert all(0 <= bit < 63 for bit in bits)
+    assert set(CHECK_FLAG_BITS) <= set(check_names)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+from io import BytesIO
+from zipfile import ZipFile
+
+import pytest
+
+
+@pytest.mark.django_db
+def test_iterzip_stores(af_tutorial_po, af_tutorial_subdir_po):
+    """Tests streamed ZIP archives contain all the serialized stores."""
+    from import_export.utils import iterzip_stores
+
+    stores = [af_tutorial_po, af_tutorial_subdir_po]
+    for store in stores:
+        store.update(overwrite=False, only_newer=False)
+
+    chunks = list(iterzip_stores(stores, "af-tutorial", workers=0))
+    # One chunk per store plus the central directory
+    assert len(chunks) == len(stores) + 1
+
+    with ZipFile(BytesIO("".join(chunks)), "r") as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["af-tutorial" + store.pootle_path
+                                 for store in stores]
+        for store in stores:
+            assert (zf.read("af-tutorial" + store.pootle_path) ==
+                    store.serialize())
+
+
+@pytest.mark.django_db
+def test_import_file_job(af_tutorial_po, nobody):
+    """Tests uploaded files are imported and their progress reported."""
+    from django_rq import get_connection
+
+    from import_export.utils import (POOTLE_IMPORT_PREFIX, ImportStatus,
+                                     get_import_status, import_file_job,
+                                     set_import_file_status)
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    unit = af_tutorial_po.units[0]
+    contents = af_tutorial_po.serialize().replace(
+        'msgid "%s"\nmsgstr ""' % unit.source,
+        'msgid "%s"\nmsgstr "Welkom"' % unit.source,
+    )
+
+    import_id = "0" * 32
+    get_connection().hset(POOTLE_IMPORT_PREFIX + import_id, "user",
+                          nobody.id)
+    set_import_file_status(import_id, "af.po", ImportStatus.QUEUED)
+    set_import_file_status(import_id, "bad.po", ImportStatus.QUEUED)
+
+    status = get_import_status(import_id)
+    assert status["total"] == 2
+    assert not status["finished"]
+
+    import_file_job(import_id, "af.po", contents)
+    import_file_job(import_id, "bad.po", "msgid \"\"\nmsgstr \"\"\n")
+
+    status = get_import_status(import_id)
+    get_connection().delete(POOTLE_IMPORT_PREFIX + import_id)
+
+    assert status["user"] == nobody.id
+    assert status["finished"]
+    assert status["done"] == 1
+    assert status["failed"] == 1
+    assert [f["name"] for f in status["files"]] == [u"af.po", u"bad.po"]
+    assert "X-Pootle-Path" in status["files"][1]["error"]
+
+    assert af_tutorial_po.units[0].target == u"Welkom"
+
+
+@pytest.mark.django_db
+def test_iterzip_stores_zip64(monkeypatch, af_tutorial_po,
+                              af_tutorial_subdir_po):
+    """Tests archives going over the ZIP size and entry limits are written
+    with ZIP64 extensions instead of failing halfway through the stream."""
+    import zipfile
+
+    from import_export.utils import iterzip_stores
+
+    stores = [af_tutorial_po, af_tutorial_subdir_po]
+    for store in stores:
+        store.update(overwrite=False, only_newer=False)
+
+    # Force the ZIP64 code paths with tiny limits
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 16)
+    monkeypatch.setattr(zipfile, "ZIP_FILECOUNT_LIMIT", 1)
+
+    data = "".join(iterzip_stores(stores, "af-tutorial", workers=0))
+
+    with ZipFile(BytesIO(data), "r") as zf:
+        assert zf.testzip() is None
+        assert len(zf.namelist()) == len(stores)
+        for store in stores:
+            assert (zf.read("af-tutorial" + store.pootle_path) ==
+                    store.serialize())
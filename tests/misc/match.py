@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+from pootle_misc.match import Matcher, TermIndex
+
+
+def test_matcher_prefix_and_overlap():
+    """Tests terms are matched by word prefix, preferring longer terms."""
+    index = TermIndex()
+    index.add(1, u'File', u'Fitxer')
+    index.add(2, u'file manager', u'gestor de fitxers')
+    index.add(3, u'manager', u'gestor')
+    index.add(4, u'open', u'obrir')
+    index.add(5, u'open', u'obre')
+    matcher = Matcher([index])
+
+    matches = matcher.matches(u'Open the Files Manager')
+    assert [(term.source, term.target) for term in matches] == [
+        (u'open', u'obrir'),
+        (u'open', u'obre'),
+        (u'file manager', u'gestor de fitxers'),
+    ]
+
+    assert matcher.matches(u'Profile') == []
+    assert matcher.matches(u'op') == []
+
+
+def test_term_index_remove():
+    """Tests removed terms are no longer matched."""
+    index = TermIndex()
+    index.add(1, u'file manager', u'gestor de fitxers')
+    index.add(2, u'file', u'fitxer')
+    size = index.size
+
+    index.remove(1)
+    assert len(index) == 1
+    assert index.size < size
+    assert index.root.children[u'file'].children == {}
+
+    matches = Matcher([index]).matches(u'file manager')
+    assert [term.target for term in matches] == [u'fitxer']
+
+    # Re-adding a unit replaces its previous entry
+    index.add(2, u'folder', u'carpeta')
+    assert Matcher([index]).matches(u'file manager') == []
+    assert index.root.children.keys() == [u'folder']
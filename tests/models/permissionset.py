@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ..factories import UserFactory
+from ..fixtures.models.permission_set import _require_permission_set
+
+
+@pytest.mark.django_db
+def test_permission_resolver(project_foo, root, view, suggest, translate):
+    """Tests the permission set of the closest directory applies, with
+    project-wide permission sets taking precedence over language-wide ones.
+    """
+    from pootle_app.models.permissions import PermissionResolver
+
+    foo_user = UserFactory.create(username='foo')
+    _require_permission_set(foo_user, root, [view])
+    _require_permission_set(foo_user, project_foo.directory, [suggest])
+
+    def resolve(pootle_path):
+        permissions = PermissionResolver('foo').resolve(pootle_path)
+        if permissions is None:
+            return None
+        return sorted(permissions)
+
+    assert resolve('/') == ['view']
+    assert resolve('/af/') == ['view']
+    assert resolve('/projects/foo/') == ['suggest']
+    assert resolve('/af/foo/') == ['suggest']
+    assert resolve('/af/foo/subdir/') == ['suggest']
+    assert resolve('/af/bar/') == ['view']
+    assert PermissionResolver('bar').resolve('/af/foo/') is None
+
+
+@pytest.mark.django_db
+def test_permissions_invalidation(project_foo, view, suggest):
+    """Tests permissions are resolved without queries until any permission
+    set changes."""
+    from pootle_app.models.permissions import get_permissions_by_username
+
+    foo_user = UserFactory.create(username='foo')
+    permission_set = _require_permission_set(foo_user, project_foo.directory,
+                                             [view])
+    directory = project_foo.directory
+
+    assert get_permissions_by_username('foo', directory).keys() == ['view']
+    with CaptureQueriesContext(connection) as queries:
+        get_permissions_by_username('foo', directory)
+    assert len(queries) == 0
+
+    permission_set.positive_permissions.add(suggest)
+    assert (sorted(get_permissions_by_username('foo', directory)) ==
+            ['suggest', 'view'])
+
+
+@pytest.mark.django_db
+def test_permissions_invalidation_cascade(project_foo, view):
+    """Tests permission sets deleted along with their user are dropped."""
+    from pootle_app.models.permissions import get_permissions_by_username
+
+    foo_user = UserFactory.create(username='foo')
+    _require_permission_set(foo_user, project_foo.directory, [view])
+    directory = project_foo.directory
+
+    assert get_permissions_by_username('foo', directory).keys() == ['view']
+
+    foo_user.delete()
+    UserFactory.create(username='foo')
+    assert get_permissions_by_username('foo', directory) is None
@@ -180,3 +180,34 @@ def test_root_hide_permissions(nobody, default, admin, hide, view,
     assert items_equal(Project.accessible_by_user(nobody), ALL_PROJECTS)
     assert items_equal(Project.accessible_by_user(foo_user), ALL_PROJECTS)
     assert items_equal(Project.accessible_by_user(bar_user), ALL_PROJECTS)
+
+
+@pytest.mark.django_db
+def test_warm_accessible_projects(nobody, default, view, hide,
+                                  project_foo, project_bar, root):
+    """Tests accessible projects are cached in bulk, and retrieved without
+    queries until permission sets change."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    foo_user = UserFactory.create(username='foo')
+    bar_user = UserFactory.create(username='bar')
+
+    _require_permission_set(default, root, [view])
+    foo_ps = _require_permission_set(foo_user, project_foo.directory)
+
+    with CaptureQueriesContext(connection) as queries:
+        Project.warm_accessible_by_user(['foo', 'bar'])
+    # Project codes plus the permissions of all the users at once
+    assert len(queries) == 2
+
+    with CaptureQueriesContext(connection) as queries:
+        assert items_equal(Project.accessible_by_user(foo_user),
+                           [project_foo.code, project_bar.code])
+        assert items_equal(Project.accessible_by_user(bar_user),
+                           [project_foo.code, project_bar.code])
+    assert len(queries) == 0
+
+    foo_ps.negative_permissions.add(hide)
+    assert items_equal(Project.accessible_by_user(foo_user),
+                       [project_bar.code])
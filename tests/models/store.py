@@ -66,3 +66,205 @@ def test_sync(fr_tutorial_remove_sync_po):
     assert not store.file.exists()
     store.sync()
     assert store.file.exists()
+
+
+def _get_units_data(store):
+    return [
+        (unit.source, unit.target, unit.getcontext(), unit.isfuzzy(),
+         unit.getnotes(origin='translator'),
+         unit.getnotes(origin='developer'), unit.getlocations())
+        for unit in store.units if not unit.isheader()
+    ]
+
+
+@pytest.mark.django_db
+def test_serialize_roundtrip(af_tutorial_po):
+    """Tests the PO serialized from the DB matches the synced on-disk file."""
+    from translate.storage import po
+
+    from pootle_store.util import FUZZY
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+
+    units = list(af_tutorial_po.units)
+    plural_unit = [unit for unit in units if unit.hasplural()][0]
+    plural_unit.target = [u'%d lêer sal afgelaai word',
+                          u'%d lêers sal afgelaai word']
+    plural_unit.save()
+
+    fuzzy_unit = units[0]
+    fuzzy_unit.target = u'Welkom "by" \\ Pootle\nMet \t tabs'
+    fuzzy_unit.state = FUZZY
+    fuzzy_unit.translator_comment = u'Eerste lyn\nTweede lyn'
+    fuzzy_unit.save()
+
+    af_tutorial_po.sync(conservative=False)
+
+    disk_store = po.pofile(str(af_tutorial_po.file.store))
+    db_store = po.pofile(af_tutorial_po.serialize())
+
+    assert _get_units_data(db_store) == _get_units_data(disk_store)
+
+    header = db_store.parseheader()
+    assert header['X-Pootle-Path'] == af_tutorial_po.pootle_path
+    assert (int(header['X-Pootle-Revision']) ==
+            af_tutorial_po.get_max_unit_revision())
+    assert (header['Project-Id-Version'] ==
+            disk_store.parseheader()['Project-Id-Version'])
+
+
+@pytest.mark.django_db
+def test_serialize_no_file(af_tutorial_po):
+    """Tests stores are serialized from the DB even without on-disk file."""
+    from django.core.cache import caches
+    from translate.storage import po
+
+    # Earlier tests may have cached this path for the same file mtime
+    caches['exports'].clear()
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    expected = _get_units_data(po.pofile(str(af_tutorial_po.file.store)))
+
+    file_path = af_tutorial_po.file.path
+    os.rename(file_path, file_path + '.bak')
+    try:
+        db_store = po.pofile(af_tutorial_po.serialize())
+    finally:
+        os.rename(file_path + '.bak', file_path)
+
+    assert _get_units_data(db_store) == expected
+    assert db_store.gettargetlanguage() == 'af'
+
+
+def _serialize_from_file(store):
+    """Render `store` from its on-disk file, as `serialize()` used to."""
+    store.file.store.updateheader(add=True, X_Pootle_Path=store.pootle_path)
+    store.file.store.updateheader(add=True,
+                                  X_Pootle_Revision=store.get_max_unit_revision())
+    return str(store.file.store)
+
+
+@pytest.mark.django_db
+def test_serialize_same_bytes(af_tutorial_po):
+    """Tests the PO serialized from the DB matches the former file-based
+    output byte by byte."""
+    from django.core.cache import caches
+
+    caches['exports'].clear()
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    af_tutorial_po.sync(conservative=False)
+
+    assert af_tutorial_po.serialize() == _serialize_from_file(af_tutorial_po)
+
+
+FILE_ONLY_PO = r'''msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\n"
+"Content-Transfer-Encoding: 8bit\n"
+
+#: main.c
+#, c-format, no-wrap
+msgid "%d files"
+msgstr "%d lêers"
+
+#, fuzzy
+#| msgid "Old source"
+msgid "New source"
+msgstr "Ou bron"
+
+#~ msgid "Removed"
+#~ msgstr "Verwyder"
+'''
+
+
+@pytest.mark.django_db
+def test_serialize_file_only_data(afrikaans_tutorial, system):
+    """Tests stores whose file carries flags, previous msgids or obsolete
+    units are still serialized from their on-disk file."""
+    from django.core.cache import caches
+
+    from pootle_store.models import Store
+    from pootle_store.serializers import has_file_only_data
+
+    caches['exports'].clear()
+    name = 'file_only.po'
+    file_path = os.path.join(afrikaans_tutorial.abs_real_path, name)
+    with open(file_path, 'w') as f:
+        f.write(FILE_ONLY_PO)
+
+    try:
+        assert has_file_only_data(file_path)
+
+        store = Store.objects.create(file=file_path,
+                                     parent=afrikaans_tutorial.directory,
+                                     name=name,
+                                     translation_project=afrikaans_tutorial)
+        store.update(overwrite=False, only_newer=False)
+
+        output = store.serialize()
+        assert output == _serialize_from_file(store)
+        for text in ('#, c-format, no-wrap', '#| msgid "Old source"',
+                     '#~ msgid "Removed"'):
+            assert text in output
+    finally:
+        os.remove(file_path)
+
+
+def test_has_file_only_data():
+    """Tests format flags don't prevent serializing from the DB."""
+    import tempfile
+
+    from pootle_store.serializers import has_file_only_data
+
+    fd, file_path = tempfile.mkstemp(suffix='.po')
+    os.close(fd)
+    try:
+        with open(file_path, 'w') as f:
+            f.write('#, fuzzy, c-format\nmsgid "%d files"\nmsgstr ""\n\n'
+                    '#, no-python-format\nmsgid "100%"\nmsgstr ""\n')
+        assert not has_file_only_data(file_path)
+
+        with open(file_path, 'w') as f:
+            f.write('#, c-format, no-wrap\nmsgid "%d files"\nmsgstr ""\n')
+        assert has_file_only_data(file_path)
+    finally:
+        os.remove(file_path)
+
+
+@pytest.mark.django_db
+def test_fuzzy_matcher(af_tutorial_po):
+    """Tests fuzzy matchers are cached until the store's units change and
+    that obsolete units used for matching can be removed."""
+    from django.core.cache import cache
+
+    from pootle.core.cache import make_method_key
+    from pootle_store.models import Unit
+    from pootle_store.util import OBSOLETE, TRANSLATED
+
+    cache.clear()
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+
+    def get_match_targets(text):
+        matcher = af_tutorial_po.get_matcher()
+        return [unicode(match.target) for match in matcher.matches(text)]
+
+    unit = af_tutorial_po.findid(u'fish')
+    unit.target = u'vis'
+    unit.state = TRANSLATED
+    unit.save()
+    assert get_match_targets(u'fishy') == [u'vis']
+    assert get_match_targets(u'fishes') == []
+
+    # A new translation gets a new revision, so the matcher is rebuilt and
+    # replaces the cached one
+    unit.target = u'vissie'
+    unit.save()
+    assert get_match_targets(u'fishy') == [u'vissie']
+    cache_key = make_method_key(af_tutorial_po, 'get_matcher',
+                                str(af_tutorial_po.pk))
+    assert cache.get(cache_key)[0] == af_tutorial_po.get_max_unit_revision()
+
+    unit.state = OBSOLETE
+    unit.save()
+    af_tutorial_po._remove_obsolete([u'fish', u'test'])
+    assert not Unit.objects.filter(id=unit.id).exists()
+    assert af_tutorial_po.findid(u'test') is not None
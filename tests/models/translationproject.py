@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+
+@pytest.mark.django_db
+def test_sync_modified_units(settings, af_tutorial_po):
+    """Tests that units modified in the DB are written to disk when syncing
+    the translation project with a pool of writer threads."""
+    from pootle_store.models import Store
+
+    settings.POOTLE_SYNC_WORKERS = 2
+
+    tp = af_tutorial_po.translation_project
+    path = af_tutorial_po.file.path
+    with open(path, 'rb') as f:
+        original = f.read()
+
+    try:
+        af_tutorial_po.update(overwrite=False, only_newer=False)
+        tp.sync(conservative=True, only_newer=False)
+
+        unit = af_tutorial_po.units[0]
+        unit.target = u'Gesinkroniseer'
+        unit.save()
+
+        tp.sync(conservative=True)
+
+        store = Store.objects.get(pk=af_tutorial_po.pk)
+        assert store.last_sync_revision == store.get_max_unit_revision()
+        with open(path, 'rb') as f:
+            assert 'msgstr "Gesinkroniseer"' in f.read()
+    finally:
+        with open(path, 'wb') as f:
+            f.write(original)
@@ -202,3 +202,239 @@ def test_add_suggestion(af_tutorial_po, system):
     assert sugg is not None
     assert added
     assert len(untranslated_unit.get_suggestions()) == 1
+
+
+@pytest.mark.django_db
+def test_search_index(af_tutorial_po):
+    """Tests the full-text index is built and kept up to date on save."""
+    from django.core.management import call_command
+
+    from django.db import connection
+
+    from pootle_misc.forms import make_search_form
+    from pootle_store.search_index import SEARCH_INDEX_TABLE, get_search_index
+    from pootle_store.views import get_search_step_query
+
+    def search(text, sfields):
+        form = make_search_form({'search': text, 'sfields': sfields})
+        assert form.is_valid()
+        return list(get_search_step_query(form, af_tutorial_po.units))
+
+    def is_indexed(unit_id):
+        cursor = connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM %s WHERE %s = %%s' %
+                       (SEARCH_INDEX_TABLE, search_index.id_column),
+                       [unit_id])
+        return cursor.fetchone()[0] > 0
+
+    search_index = get_search_index()
+    # Stands for another process, which looked the index up before it was
+    # built
+    other_index = search_index.__class__(connection)
+    try:
+        assert not other_index.exists()
+
+        call_command('build_search_index')
+        assert search_index.exists()
+        assert other_index.exists()
+
+        unit = af_tutorial_po.units[0]
+        assert unit not in search(u'Gesinkroniseer', ['target'])
+
+        unit.target = u'Gesinkroniseerde lêers'
+        unit.save()
+        assert search(u'gesinkron LÊERS', ['target']) == [unit]
+        assert search(u'gesinkron', ['source']) == []
+
+        # Words the index can't look up fall back to LIKE queries
+        assert search_index.filter(af_tutorial_po.units, [u'%s'],
+                                   ['target']) is None
+
+        unit_id = unit.id
+        assert is_indexed(unit_id)
+        unit.delete()
+        assert not is_indexed(unit_id)
+    finally:
+        # The index table is dropped along with the test transaction
+        search_index.reset()
+
+
+@pytest.mark.django_db
+def test_trigram_index(af_tutorial_po):
+    """Tests substring searches are narrowed down by the trigram index."""
+    from django.core.management import call_command
+
+    from pootle_misc.forms import make_search_form
+    from pootle_store.search_index import get_search_index
+    from pootle_store.trigram_index import TrigramIndex, trigram_index
+    from pootle_store.views import get_search_step_query
+
+    def search(text, soptions=()):
+        form = make_search_form({'search': text, 'sfields': ['target'],
+                                 'soptions': list(soptions)})
+        assert form.is_valid()
+        return list(get_search_step_query(form, af_tutorial_po.units))
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+
+    # Stands for another process, which looked the index up before it was
+    # built
+    other_index = TrigramIndex()
+    try:
+        assert not other_index.exists()
+
+        call_command('build_search_index')
+        assert trigram_index.exists()
+        assert other_index.exists()
+
+        unit = af_tutorial_po.units[0]
+        unit.target = u'Daar is %(count)s {{Name}} lêers'
+        unit.save()
+
+        candidates = trigram_index.get_candidates('target', u'(COUNT)s')
+        assert list(candidates) == [unit.id]
+
+        assert search(u'{{name}}') == [unit]
+        assert search(u'%(count)s {{Name}}', ['exact']) == [unit]
+        assert search(u'{{naam}}', ['exact']) == []
+    finally:
+        get_search_index().reset()
+        trigram_index.reset()
+
+
+@pytest.mark.django_db
+def test_filter_flags(af_tutorial_po, system):
+    """Tests the denormalized suggestion count and check flags are kept up
+    to date and used by the editor filters."""
+    from django.test.client import RequestFactory
+
+    from pootle_misc.checks import get_check_flags
+    from pootle_store.models import Unit
+    from pootle_store.views import get_step_query
+
+    def get_filtered(**params):
+        request = RequestFactory().get('/', params)
+        request.profile = system
+        return list(get_step_query(request, af_tutorial_po.units))
+
+    unit = af_tutorial_po.units[0]
+    tp = af_tutorial_po.translation_project
+
+    sugg, added = unit.add_suggestion(u'Voorstel')
+    assert Unit.objects.get(id=unit.id).suggestion_count == 1
+    assert get_filtered(filter='suggestions') == [unit]
+
+    unit.reject_suggestion(sugg, tp, system)
+    assert Unit.objects.get(id=unit.id).suggestion_count == 0
+    assert get_filtered(filter='suggestions') == []
+
+    unit.target = u'%s ' % unit.source
+    unit.save()
+    checks = list(unit.get_active_qualitychecks()
+                      .values_list('name', flat=True))
+    assert checks
+
+    flags = get_check_flags()
+    check_flags = Unit.objects.get(id=unit.id).check_flags
+    assert check_flags == reduce(lambda mask, name: mask | flags[name],
+                                 checks, 0)
+    assert unit in get_filtered(filter='checks', checks=checks[0])
+
+    check = unit.get_active_qualitychecks().get(name=checks[0])
+    unit.toggle_qualitycheck(check.id, True, system)
+    assert not Unit.objects.get(id=unit.id).check_flags & flags[checks[0]]
+    assert unit not in get_filtered(filter='checks', checks=checks[0])
+
+
+@pytest.mark.django_db
+def test_delete_unknown_checks_flags(monkeypatch, af_tutorial_po, system):
+    """Tests deleting checks which are no longer known clears their flags."""
+    from pootle_misc.checks import check_names, get_check_flags
+    from pootle_store import models
+    from pootle_store.models import QualityCheck, Unit
+
+    unit = af_tutorial_po.units[0]
+    unit.target = u'%s ' % unit.source
+    unit.save()
+    name = unit.get_active_qualitychecks().values_list('name', flat=True)[0]
+    flag = get_check_flags()[name]
+    assert Unit.objects.get(id=unit.id).check_flags & flag
+
+    monkeypatch.setattr(models, 'check_names',
+                        dict((key, value) for key, value in
+                             check_names.iteritems() if key != name))
+    QualityCheck.delete_unknown_checks()
+
+    assert not unit.get_qualitychecks().filter(name=name).exists()
+    assert not Unit.objects.get(id=unit.id).check_flags & flag
+
+
+@pytest.mark.django_db
+def test_get_for_path(af_tutorial_po, af_tutorial_subdir_po, admin):
+    """Tests units are looked up by path through their denormalized
+    location."""
+    from pootle_store.models import Unit
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+
+    # Copy a unit over, as other tests remove the subdir file
+    unit = af_tutorial_po.units[0]
+    unit.id = None
+    unit.store = af_tutorial_subdir_po
+    unit.save()
+
+    tp = af_tutorial_subdir_po.translation_project
+    assert unit.translation_project == tp
+    assert unit.project == tp.project
+    assert unit.language == tp.language
+    assert unit.store_path == 'subdir/tutorial.po'
+
+    def get_for_path(pootle_path):
+        return set(Unit.objects.get_for_path(pootle_path, admin))
+
+    all_units = (set(af_tutorial_po.units) |
+                 set(af_tutorial_subdir_po.units))
+    assert get_for_path('/af/tutorial/') == all_units
+    assert get_for_path('/af/') == all_units
+    assert get_for_path('/projects/tutorial/') == all_units
+    assert (get_for_path('/af/tutorial/subdir/') ==
+            set(af_tutorial_subdir_po.units))
+    assert (get_for_path('/projects/tutorial/tutorial.po') ==
+            set(af_tutorial_po.units))
+    assert get_for_path('/af/tutorial/missing/') == set()
+
+
+@pytest.mark.django_db
+def test_find_altsrcs(af_tutorial_po, french_tutorial):
+    """Tests alternative sources are looked up through the equivalence
+    index, in bulk too."""
+    from pootle_store.models import Store
+    from pootle_store.util import (TRANSLATED, find_altsrcs,
+                                   find_altsrcs_bulk)
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    units = list(af_tutorial_po.units[:2])
+    project = af_tutorial_po.translation_project.project
+
+    fr_store, created = Store.objects.get_or_create(
+        parent=french_tutorial.directory,
+        name=af_tutorial_po.name,
+        translation_project=french_tutorial,
+    )
+    fr_unit = af_tutorial_po.units[0]
+    fr_unit.id = None
+    fr_unit.store = fr_store
+    fr_unit.target = u'Bonjour'
+    fr_unit.state = TRANSLATED
+    fr_unit.save()
+
+    languages = [french_tutorial.language]
+    altsrcs = list(find_altsrcs(units[0], languages, project=project))
+    assert altsrcs == [fr_unit]
+    assert altsrcs[0].target == u'Bonjour'
+    assert altsrcs[0].language == french_tutorial.language
+
+    assert find_altsrcs_bulk(units, languages, project) == {
+        units[0].id: [fr_unit],
+        units[1].id: [],
+    }
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+
+@pytest.mark.django_db
+def test_unit_priority(af_tutorial_po):
+    """Tests the priority stored on units follows their virtual folders."""
+    from pootle_store.models import Unit
+    from virtualfolder.models import VirtualFolder
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    unit_ids = [unit.id for unit in af_tutorial_po.units]
+
+    def get_priorities():
+        return set(Unit.objects.filter(id__in=unit_ids)
+                               .values_list('priority', flat=True))
+
+    assert get_priorities() == set([1])
+
+    vfolder = VirtualFolder.objects.create(
+        name='important', location='/{LANG}/tutorial/',
+        filter_rules='tutorial.po', priority=5,
+    )
+    assert get_priorities() == set([5])
+
+    other_vfolder = VirtualFolder.objects.create(
+        name='other', location='/af/tutorial/',
+        filter_rules='tutorial.po', priority=3,
+    )
+    assert get_priorities() == set([5])
+
+    vfolder.priority = 2
+    vfolder.save()
+    assert get_priorities() == set([3])
+
+    other_vfolder.delete()
+    assert get_priorities() == set([2])
+
+    vfolder.filter_rules = 'missing.po'
+    vfolder.save()
+    assert get_priorities() == set([1])
+
+
+@pytest.mark.django_db
+def test_unit_membership(af_tutorial_po):
+    """Tests the units of virtual folders follow their filter rules, and
+    that unchanged relations are kept when saving them."""
+    from virtualfolder.models import VirtualFolder
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    unit_ids = set(unit.id for unit in af_tutorial_po.units)
+
+    vfolder = VirtualFolder.objects.create(
+        name='membership', location='/{LANG}/{PROJ}/',
+        filter_rules='tutorial',
+    )
+    memberships = VirtualFolder.units.through.objects.filter(
+        virtualfolder=vfolder,
+    )
+    assert not memberships.exists()
+
+    vfolder.filter_rules = 'tutorial.po'
+    vfolder.save()
+    assert set(vfolder.units.values_list('id', flat=True)) == unit_ids
+    membership_ids = set(memberships.values_list('id', flat=True))
+
+    vfolder.filter_rules = 'tutorial.po,tutorial.p?'
+    vfolder.save()
+    assert set(memberships.values_list('id', flat=True)) == membership_ids
+
+    vfolder.filter_rules = 'tutorial.p?'
+    vfolder.save()
+    assert not memberships.exists()
+
+
+@pytest.mark.django_db
+def test_relate_new_units(af_tutorial_po):
+    """Tests units created after virtual folders are related to them."""
+    from pootle_store.models import Unit
+    from virtualfolder.models import VirtualFolder, get_rules_matcher
+
+    store_vfolder = VirtualFolder.objects.create(
+        name='store', location='/{LANG}/{PROJ}/',
+        filter_rules='tutorial.po', priority=3,
+    )
+    dir_vfolder = VirtualFolder.objects.create(
+        name='dir', location='/af/',
+        filter_rules='tutorial/', priority=2,
+    )
+    VirtualFolder.objects.create(
+        name='other', location='/{LANG}/{PROJ}/',
+        filter_rules='tutorial.pot,subdir',
+    )
+    assert (get_rules_matcher().match(af_tutorial_po.pootle_path) ==
+            (set([dir_vfolder.id]), set([store_vfolder.id])))
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    units = af_tutorial_po.units
+    assert len(units) > 0
+    for unit in units:
+        assert (set(unit.vfolders.values_list('name', flat=True)) ==
+                set(['store', 'dir']))
+    assert (set(Unit.objects.filter(store=af_tutorial_po)
+                            .values_list('priority', flat=True)) == set([3]))
+
+
+@pytest.mark.django_db
+def test_vfolder_stats(af_tutorial_po):
+    """Tests virtual folders keep cached stats per translation project,
+    marked as dirty along with the stats of their stores."""
+    from pootle_store.util import TRANSLATED
+    from virtualfolder.models import VirtualFolder
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    vfolder = VirtualFolder.objects.create(
+        name='stats', location='/{LANG}/{PROJ}/',
+        filter_rules='tutorial.po',
+    )
+
+    vf_treeitems = vfolder.get_treeitems()
+    assert ([vf_treeitem.translation_project for vf_treeitem in vf_treeitems]
+            == [af_tutorial_po.translation_project])
+    vf_treeitem = vf_treeitems[0]
+
+    vf_treeitem.refresh_stats()
+    stats = vf_treeitem.get_stats(include_children=False)
+    assert stats['total'] == af_tutorial_po._get_wordcount_stats()['total']
+    assert stats['suggestions'] == af_tutorial_po._get_suggestion_count()
+    assert (stats['critical'] ==
+            af_tutorial_po._get_checks()['unit_critical_error_count'])
+
+    dirty_score = vf_treeitem.get_dirty_score() or 0
+    unit = af_tutorial_po.findid(u'fish')
+    unit.target = u'vis'
+    unit.state = TRANSLATED
+    unit.save()
+    assert vf_treeitem.get_dirty_score() > dirty_score
+
+    vf_treeitem.refresh_stats()
+    stats = vf_treeitem.get_stats(include_children=False)
+    assert (stats['translated'] ==
+            af_tutorial_po._get_wordcount_stats()['translated'])
+
+
+@pytest.mark.django_db
+def test_paths_index(af_tutorial_po):
+    """Tests the paths having virtual folder units are kept in an index."""
+    from django.core.management import call_command
+    from django_rq import get_connection
+
+    from virtualfolder.models import (POOTLE_VFOLDER_PATHS, VirtualFolder,
+                                      has_vfolder_units, incr_paths_index)
+
+    get_connection().delete(POOTLE_VFOLDER_PATHS)
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    paths = ['/', '/af/', '/af/tutorial/', '/af/tutorial/tutorial.po']
+
+    def get_matching_paths():
+        return [path for path in paths + ['/fr/', '/af/tutorial/subdir/']
+                if has_vfolder_units(path)]
+
+    assert get_matching_paths() == []
+
+    vfolder = VirtualFolder.objects.create(
+        name='paths', location='/{LANG}/{PROJ}/',
+        filter_rules='tutorial.po',
+    )
+    assert get_matching_paths() == paths
+
+    # Results are the same when building the index from scratch
+    get_connection().delete(POOTLE_VFOLDER_PATHS)
+    assert get_matching_paths() == paths
+
+    # Deleting units doesn't update the index until it's rebuilt
+    af_tutorial_po.unit_set.all().delete()
+    assert get_matching_paths() == paths
+    assert get_connection().ttl(POOTLE_VFOLDER_PATHS) > 0
+    call_command('rebuild_vfolder_paths')
+    assert get_matching_paths() == []
+
+    # Counts added after the index expired don't leave a partial index
+    get_connection().delete(POOTLE_VFOLDER_PATHS)
+    incr_paths_index({af_tutorial_po.pootle_path: 1})
+    assert not get_connection().exists(POOTLE_VFOLDER_PATHS)
+
+    vfolder.filter_rules = 'missing.po'
+    vfolder.save()
+    assert get_matching_paths() == []
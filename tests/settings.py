@@ -36,6 +36,10 @@ CACHES = {
         'LOCATION': 'redis://127.0.0.1:6379/1',
         'TIMEOUT': None,
     },
+    'exports': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pootle-tests-exports'
+    },
 }
 
 
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Pootle contributors.
+#
+# This file is a part of the Pootle project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import json
+
+import pytest
+
+from django.core.urlresolvers import reverse
+
+
+HEADERS = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+@pytest.mark.django_db
+def test_get_units_result_set(monkeypatch, admin_client, af_tutorial_po):
+    """Tests the IDs of the matching units are stored as a result set,
+    which later requests page through without running the query again."""
+    from pootle.core.models import Revision
+    from pootle_store import views
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+
+    # Start from a revision no earlier result set was stored for
+    Revision.initialize()
+    Revision.incr()
+
+    expected = list(af_tutorial_po.units.values_list('id', flat=True))
+
+    url = reverse('pootle-xhr-units')
+    params = {
+        'path': af_tutorial_po.pootle_path,
+        'filter': 'all',
+        'initial': 'true',
+    }
+    response = admin_client.get(url, params, **HEADERS)
+    data = json.loads(response.content)
+    assert data['total'] == len(expected)
+    assert data['offset'] == 0
+    assert data['uIds'] == expected
+
+    # Result sets are looked up by key and position, without querying
+    def fail(step_queryset):
+        raise AssertionError("The result set query was run again")
+    monkeypatch.setattr(views, '_get_uid_list', fail)
+
+    response = admin_client.get(url, dict(params, uids=expected[-1]),
+                                **HEADERS)
+    data = json.loads(response.content)
+    assert data['uIds'] == expected
+
+    response = admin_client.get(url, {
+        'path': af_tutorial_po.pootle_path,
+        'filter': 'all',
+        'resultset': data['resultSet'],
+        'offset': 1,
+        'uids': expected[1],
+    }, **HEADERS)
+    data = json.loads(response.content)
+    assert data['offset'] == 0
+    assert data['total'] == len(expected)
+    assert len(data['unitGroups']) == 1
+
+
+@pytest.mark.django_db
+def test_get_edit_units(admin_client, af_tutorial_po):
+    """Tests the editing widgets of several units are returned at once,
+    matching those returned unit by unit."""
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    uids = list(af_tutorial_po.units.values_list('id', flat=True)[:3])
+
+    url = reverse('pootle-xhr-units-edit-batch')
+    response = admin_client.get(url, {'uids': ','.join(map(str, uids))},
+                                **HEADERS)
+    assert response.status_code == 200
+    data = json.loads(response.content)['units']
+    assert sorted(map(int, data.keys())) == sorted(uids)
+
+    for uid in uids:
+        response = admin_client.get(reverse('pootle-xhr-units-edit',
+                                            args=[uid]), **HEADERS)
+        assert json.loads(response.content) == data[str(uid)]
+
+    response = admin_client.get(url, {'uids': ''}, **HEADERS)
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_timeline_cache(monkeypatch, admin_client, af_tutorial_po, admin):
+    """Tests unit timelines are cached until a new submission is saved."""
+    from django.core.cache import cache
+    from django.utils import timezone
+
+    from pootle_statistics.models import (Submission, SubmissionFields,
+                                          SubmissionTypes)
+    from pootle_store import views
+    from pootle_store.models import get_timeline_cache_key
+
+    af_tutorial_po.update(overwrite=False, only_newer=False)
+    unit = af_tutorial_po.units[0]
+    url = reverse('pootle-xhr-units-timeline', args=[unit.id])
+
+    # Unit and submission IDs are reused across tests, unlike the cache
+    cache.clear()
+
+    response = admin_client.get(url, **HEADERS)
+    timeline = json.loads(response.content)['timeline']
+
+    cache_key = get_timeline_cache_key(
+        unit.id, max([0] + [sub.id for sub in unit.submission_set.all()]),
+    )
+    cached_timeline = cache.get(cache_key)
+    assert cached_timeline is not None
+
+    get_timeline_context = views._get_timeline_context
+
+    def fail(unit):
+        raise AssertionError("The timeline was built again")
+    monkeypatch.setattr(views, '_get_timeline_context', fail)
+
+    response = admin_client.get(url, **HEADERS)
+    assert json.loads(response.content)['timeline'] == timeline
+
+    monkeypatch.setattr(views, '_get_timeline_context', get_timeline_context)
+
+    Submission.objects.create(
+        creation_time=timezone.now(),
+        translation_project=af_tutorial_po.translation_project,
+        submitter=admin,
+        unit=unit,
+        store=af_tutorial_po,
+        field=SubmissionFields.TARGET,
+        type=SubmissionTypes.NORMAL,
+        new_value=u'Nuwe vertaling',
+    )
+    assert cache.get(cache_key) is None
+
+    # A request which read the timeline before the submission was saved
+    # writes it back afterwards
+    cache.set(cache_key, cached_timeline)
+
+    response = admin_client.get(url, **HEADERS)
+    assert u'Nuwe vertaling' in json.loads(response.content)['timeline']